@@ -0,0 +1,123 @@
+"""
+Import Time Benchmark
+
+This script measures the startup cost of each MenSans module: the time to import it in a
+fresh interpreter, and the heavy dependencies that the import loads. Each measurement runs
+in its own subprocess, so modules never share a warm import cache.
+
+Functions:
+    - import_time: Measure the import of one module in a fresh interpreter.
+    - run: Measure every module.
+
+Typical usage example:
+
+    python benchmarks/import_times.py --repeat 5 --output imports.json
+"""
+
+from typing import List
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+default_modules = [
+    'pipeline.pipeline',
+    'features_computation.time',
+    'features_computation.frequency',
+    'features_computation.streaming',
+    'features_computation.store',
+    'features_computation.feature_pipeline',
+    'features_computation.covariance',
+    'signal_processing.checkpoint',
+    'signal_processing.preprocessing',
+    'signal_processing.cohort',
+    'visualization.plot_globals',
+    'visualization.montage',
+    'visualization.topomap',
+    'visualization.raw_plots',
+    'visualization.frequency_plots',
+]
+heavy_dependencies = [
+    'pandas','scipy.signal','neurodsp','mne.io','matplotlib.pyplot','seaborn','plotly'
+]
+
+_probe = """
+import sys, time
+import numpy
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter()-start
+print(elapsed)
+print(','.join(name for name in {heavy!r} if name in sys.modules))
+"""
+
+def import_time(module:str,repeat:int=5)->dict:
+    """
+    Measure the import of one module in a fresh interpreter.
+
+    numpy is imported before the clock starts, since every module needs it.
+
+    Args:
+        module (str): The dotted module name.
+        repeat (int, optional): The number of fresh interpreters. Default is 5.
+
+    Returns:
+        dict: The 'time_min' and 'time_median' of the import, in seconds, and the heavy
+        dependencies it 'loaded'.
+    """
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable,'-c',_probe.format(module=module,heavy=heavy_dependencies)],
+            cwd=repository,capture_output=True,text=True,check=True
+            ).stdout.splitlines()
+        times.append(float(output[0]))
+        loaded = [name for name in output[1].split(',') if name]
+    return {'time_min':min(times),'time_median':statistics.median(times),'loaded':loaded}
+
+def run(modules:List[str],repeat:int=5)->dict:
+    """
+    Measure every module.
+
+    Args:
+        modules (List[str]): The dotted module names.
+        repeat (int, optional): The number of fresh interpreters per module. Default is 5.
+
+    Returns:
+        dict: The environment under 'meta' and the measurement of each module under 'results'.
+    """
+    results = {}
+    for module in modules:
+        results[module] = import_time(module,repeat)
+        print(
+            f"{module:<40} {results[module]['time_min']*1e3:8.1f} ms  "
+            f"{', '.join(results[module]['loaded']) or '-'}"
+            )
+    meta = {
+        'date':datetime.datetime.now().isoformat(timespec='seconds'),
+        'python':platform.python_version(),
+        'platform':platform.platform(),
+        'repeat':repeat,
+    }
+    return {'meta':meta,'results':results}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--modules',nargs='+',default=default_modules,help='modules to import')
+    parser.add_argument('--repeat',type=int,default=5,help='fresh interpreters per module')
+    parser.add_argument('--output',default=None,help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    results = run(args.modules,args.repeat)
+    if args.output is not None:
+        with open(args.output,'w') as file:
+            json.dump(results,file,indent=2)
+
+if __name__=='__main__':
+    main()
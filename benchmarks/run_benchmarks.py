@@ -0,0 +1,337 @@
+"""
+Benchmark Suite
+
+This script times and measures the memory of the feature computations, the preprocessing
+steps and pipeline, and the figure generators of MenSans on synthetic EEG of increasing size,
+stores the results as JSON, and flags regressions against a saved baseline.
+
+Sizes are given as CHANNELSxSECONDSxFS; the smallest default matches the conftest.py
+fixtures (16 channels at 125 Hz) and the others scale it up. With '--dtypes float64 float32'
+the feature computations and array filtering also run under a float32 precision policy, as
+cases suffixed with '[float32]', to compare their time and memory with float64.
+
+Functions:
+    - synthetic_eeg: Generate reproducible multichannel EEG-like data.
+    - benchmark_cases: Define the benchmarked cases for one size.
+    - measure: Time a case and measure its peak memory.
+    - run: Run every case for every size.
+    - compare: Flag the cases slower than a baseline run.
+
+Typical usage example:
+
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --baseline bench.json --threshold 1.2
+    python benchmarks/run_benchmarks.py --dtypes float64 float32 --cases power hjorth
+"""
+
+from typing import Callable, Dict, List, Tuple
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import mne
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from features_computation import covariance, frequency, time as time_features
+from features_computation.precision import dtype_policy
+from signal_processing import chunked, preprocessing
+from visualization import plot_globals, raw_plots
+
+default_sizes = ['16x60x125','16x600x125','32x600x250']
+bands = [(1.0,4.0),(4.0,8.0),(8.0,12.0),(12.0,16.0),(16.0,20.0)]
+
+def synthetic_eeg(n_channels:int,duration:int,sampling_frequency:int,seed:int=45)->np.ndarray:
+    """
+    Generate reproducible multichannel EEG-like data.
+
+    Each channel mixes one random-amplitude oscillation per band of 'bands' with white noise,
+    like the conftest.py 'eeg_data' fixture but at full sampling resolution.
+
+    Args:
+        n_channels (int): The number of channels.
+        duration (int): The duration, in seconds.
+        sampling_frequency (int): The sampling frequency.
+        seed (int, optional): The random seed. Default is 45, as in conftest.py.
+
+    Returns:
+        np.ndarray: Data of shape (n_channels, duration*sampling_frequency), in volts.
+    """
+    rng = np.random.default_rng(seed)
+    times = np.arange(duration*sampling_frequency)/sampling_frequency
+    data = rng.standard_normal((n_channels,times.shape[0]))
+    for band in bands:
+        freqs = rng.uniform(band[0],band[1],size=(n_channels,1))
+        amplitudes = rng.integers(1,10,size=(n_channels,1))
+        data += amplitudes*np.sin(2*np.pi*freqs*times)
+    return data*1e-6
+
+def _openBCI_raw(data:np.ndarray,sampling_frequency:int)->mne.io.RawArray:
+    ch_names = list(preprocessing.channels_map.keys())
+    ch_names += [f'EEG {channel_no}' for channel_no in range(17,data.shape[0]+1)]
+    ch_names += ['Accel X','Accel Y','Accel Z']
+    data = np.concatenate((data,np.zeros((3,data.shape[1]))))
+    info = mne.create_info(ch_names,sampling_frequency,ch_types='eeg')
+    return mne.io.RawArray(data,info,verbose=False)
+
+def benchmark_cases(
+        data:np.ndarray,sampling_frequency:int,dtype:str='float64'
+        )->Dict[str,Tuple[Callable,Callable]]:
+    """
+    Define the benchmarked cases for one size.
+
+    Args:
+        data (np.ndarray): Synthetic EEG of shape (channels, samples).
+        sampling_frequency (int): The sampling frequency.
+        dtype (str, optional): The precision policy the cases run under. Only the feature
+        computations and 'fused_filter_array' are defined for other dtypes than 'float64',
+        since mne.io.Raw and the figures always work in float64. Default is 'float64'.
+
+    Returns:
+        Dict[str, Tuple[Callable, Callable]]: For each case, a setup function returning the
+        arguments of the run, which is excluded from the measurements, and the measured run.
+    """
+    fs = sampling_frequency
+    n_channels = data.shape[0]
+    ch_names = [f'ch{channel_no}' for channel_no in range(n_channels)]
+    methods = [
+        (preprocessing.drop_accelerometer_channels,),
+        (preprocessing.rename_channels,),
+        (preprocessing.notch_filter,{'freqs':50}),
+        (preprocessing.custom_filter,{'lpf':40,'hpf':1}),
+        (preprocessing.extract_recording_center,{'percentage':75}),
+    ]
+    raw = _openBCI_raw(data,fs)
+    fresh_raw = lambda: (raw.copy(),)
+    # The figure generators are written for the 16 OpenBCI channels
+    plot_data = [data[:16],data[:16]*2]
+    recording_names = ['synthetic_1.csv','synthetic_2.csv']
+
+    if dtype!='float64':
+        data = data.astype(dtype)
+    cases = {
+        'band_power':(lambda: (),lambda: frequency.band_power(data,fs,bands[2])),
+        'bands_power':(lambda: (),lambda: frequency.bands_power(data,fs,bands)),
+        'compute_psd':(lambda: (),lambda: frequency.compute_psd(data,fs)),
+        'hjorth_parameters_computation':(
+            lambda: (),lambda: time_features.hjorth_parameters_computation(data[0],10)
+            ),
+        'hjorth_2D':(lambda: (),lambda: time_features.hjorth_2D(data,10,ch_names)),
+        'covariance_engine':(lambda: (),lambda: covariance.covariance_engine(data)),
+        'rolling_covariance':(
+            lambda: (),lambda: covariance.rolling_covariance(data,10*fs,fs)
+            ),
+        'preprocessing.fused_filter_array':(
+            lambda: (),
+            lambda: preprocessing.fused_filter_array(data,fs,50,lpf=40,hpf=1)
+            ),
+        'chunked.chunked_fused_filter':(
+            lambda: (),
+            lambda: chunked.chunked_fused_filter(data,fs,50,lpf=40,hpf=1,block_size=60*fs)
+            ),
+        'chunked.chunked_features':(
+            lambda: (),
+            lambda: chunked.chunked_features(
+                data,fs,bands=bands,hjorth_segment_size=10,block_size=60*fs
+                )
+            ),
+    }
+    if dtype!='float64':
+        return {f'{name}[{dtype}]':case for name,case in cases.items()}
+    for method in methods:
+        kwargs = method[1] if len(method)==2 else {}
+        cases[f'preprocessing.{method[0].__name__}'] = (
+            fresh_raw,lambda raw_,function=method[0],kwargs=kwargs: function(raw_,**kwargs)
+            )
+    for mode in preprocessing.execution_modes:
+        pipeline = preprocessing.PrepocessingPipeline('benchmark',methods,mode=mode)
+        cases[f'PrepocessingPipeline.forward[{mode}]'] = (fresh_raw,pipeline.forward)
+
+    if n_channels>=16:
+        powers = np.stack([frequency.bands_power(data_,fs,bands) for data_ in plot_data],axis=0)
+        hjorth_values = [
+            time_features.hjorth_2D(data_,10,plot_globals.channel_names) for data_ in plot_data
+            ]
+        cases.update({
+            'raw_plots.plot_psds':(
+                lambda: (),
+                lambda: raw_plots.plot_psds(plot_data,1,40,recording_names=recording_names)
+                ),
+            'raw_plots.head_plots':(
+                lambda: (),
+                lambda: raw_plots.head_plots(
+                    np.moveaxis(powers,-1,1),plot_globals.openBCIcoordsArray[:,:2],
+                    len(plot_data),len(bands),axis=0,
+                    recording_names=recording_names,band_names=[str(band) for band in bands]
+                    )
+                ),
+            'raw_plots.head_plots[mne]':(
+                lambda: (),
+                lambda: raw_plots.head_plots(
+                    np.moveaxis(powers,-1,1),plot_globals.openBCIcoordsArray[:,:2],
+                    len(plot_data),len(bands),axis=0,renderer='mne',
+                    recording_names=recording_names,band_names=[str(band) for band in bands]
+                    )
+                ),
+            'raw_plots.covariance_plots':(
+                lambda: (),
+                lambda: raw_plots.covariance_plots(
+                    plot_data,plot_globals.channel_names,len(plot_data),
+                    recording_names=recording_names
+                    )
+                ),
+            'raw_plots.hjorth_plot':(
+                lambda: (),lambda: raw_plots.hjorth_plot(hjorth_values,recording_names)
+                ),
+            'raw_plots.plot_psds[batch]':(
+                lambda: (tempfile.TemporaryDirectory(),),
+                lambda output_dir: raw_plots.plot_psds(
+                    plot_data,1,40,recording_names=recording_names,output_dir=output_dir.name
+                    )
+                ),
+        })
+    return cases
+
+def measure(setup:Callable,run:Callable,repeat:int)->dict:
+    """
+    Time a case and measure its peak memory.
+
+    The run is timed ``repeat`` times without tracing, then executed once more under
+    tracemalloc to measure the peak memory it allocates. Figures are closed after each run.
+
+    Args:
+        setup (Callable): Function returning the arguments of the run.
+        run (Callable): The measured function.
+        repeat (int): The number of timed runs.
+
+    Returns:
+        dict: The 'time_min', 'time_median' (seconds) and 'peak_memory' (bytes) of the case.
+    """
+    times = []
+    for _ in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        run(*args)
+        times.append(time.perf_counter()-start)
+        plt.close('all')
+
+    args = setup()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    run(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    plt.close('all')
+    return {'time_min':min(times),'time_median':statistics.median(times),'peak_memory':peak-baseline}
+
+def run(
+        sizes:List[str],repeat:int=5,cases:List[str]=None,dtypes:List[str]=('float64',)
+        )->dict:
+    """
+    Run every case for every size.
+
+    Args:
+        sizes (List[str]): The sizes, as CHANNELSxSECONDSxFS.
+        repeat (int, optional): The number of timed runs per case. Default is 5.
+        cases (List[str], optional): Only run the cases whose name contains one of these
+        strings. Default is None, which runs every case.
+        dtypes (List[str], optional): The precision policies to run the cases under.
+        Default is ('float64',).
+
+    Returns:
+        dict: The environment under 'meta' and, under 'results', the measurements of each
+        case for each size.
+    """
+    mne.set_log_level('ERROR')
+    results = {}
+    for size in sizes:
+        n_channels, duration, sampling_frequency = (int(value) for value in size.split('x'))
+        data = synthetic_eeg(n_channels,duration,sampling_frequency)
+        for dtype in dtypes:
+            with dtype_policy(dtype):
+                for name, (setup, run_) in benchmark_cases(data,sampling_frequency,dtype).items():
+                    if cases is not None and not any(case in name for case in cases):
+                        continue
+                    results.setdefault(name,{})[size] = measure(setup,run_,repeat)
+                    print(
+                        f"{name:<45} {size:<12} {results[name][size]['time_min']*1e3:10.2f} ms "
+                        f"{results[name][size]['peak_memory']/2**20:10.2f} MiB"
+                        )
+    meta = {
+        'date':datetime.datetime.now().isoformat(timespec='seconds'),
+        'python':platform.python_version(),
+        'platform':platform.platform(),
+        'numpy':np.__version__,
+        'mne':mne.__version__,
+        'repeat':repeat,
+    }
+    return {'meta':meta,'results':results}
+
+def compare(current:dict,baseline:dict,threshold:float=1.2)->List[str]:
+    """
+    Flag the cases slower than a baseline run.
+
+    Args:
+        current (dict): The output of 'run'.
+        baseline (dict): The output of a previous 'run', e.g. loaded from its JSON file.
+        threshold (float, optional): The ratio of minimum times, or of peak memory, above
+        which a case is flagged. Default is 1.2.
+
+    Returns:
+        List[str]: One description per regression.
+    """
+    regressions = []
+    for name, sizes in current['results'].items():
+        for size, measurement in sizes.items():
+            reference = baseline['results'].get(name,{}).get(size)
+            if reference is None:
+                continue
+            for metric in ('time_min','peak_memory'):
+                if reference[metric]>0 and measurement[metric]/reference[metric]>threshold:
+                    regressions.append(
+                        f"{name} [{size}] {metric}: {reference[metric]:.4g} -> "
+                        f"{measurement[metric]:.4g} "
+                        f"(x{measurement[metric]/reference[metric]:.2f})"
+                        )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes',nargs='+',default=default_sizes,
+                        help='sizes as CHANNELSxSECONDSxFS')
+    parser.add_argument('--repeat',type=int,default=5,help='timed runs per case')
+    parser.add_argument('--cases',nargs='+',default=None,
+                        help='only run cases whose name contains one of these strings')
+    parser.add_argument('--dtypes',nargs='+',default=['float64'],
+                        help='precision policies to run the cases under')
+    parser.add_argument('--output',default=None,help='JSON file to write the results to')
+    parser.add_argument('--baseline',default=None,help='JSON results to compare against')
+    parser.add_argument('--threshold',type=float,default=1.2,
+                        help='slowdown ratio above which a case is flagged')
+    args = parser.parse_args()
+
+    results = run(args.sizes,args.repeat,args.cases,args.dtypes)
+    if args.output is not None:
+        with open(args.output,'w') as file:
+            json.dump(results,file,indent=2)
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            regressions = compare(results,json.load(file),args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if len(regressions)>0:
+            sys.exit(1)
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,289 @@
+"""
+Covariance Module
+
+This module computes the covariance and correlation matrices of EEG recordings. Both come
+from a single centered pass over the data, stacks of recordings are reduced as one batched
+matrix product, and long recordings can be followed window by window with updates whose cost
+depends on the step between windows rather than on the window length.
+
+Functions:
+    - covariance_engine: Computes the covariance and correlation of one or more recordings.
+    - rolling_covariance: Computes the covariance or correlation of sliding windows.
+
+Classes:
+    - RollingCovariance: Maintains the covariance of the latest samples of a stream.
+
+Dependencies:
+    - numpy
+    - precision (from .precision)
+
+Typical usage example:
+
+    from custom_module import covariance_engine, rolling_covariance
+
+    cov, corr = covariance_engine(recordings)  # shape (n_recordings, n_channels, n_channels)
+    windows = rolling_covariance(sig, window=1250, step=125)
+"""
+
+from typing import List, Tuple, Union
+import numpy as np
+
+from .precision import as_policy_dtype, get_dtype
+
+def _correlation(covariance:np.ndarray)->np.ndarray:
+    """
+    Normalize covariance matrices into correlation matrices, as np.corrcoef does.
+
+    Args:
+        covariance (np.ndarray): Array of shape (..., n_channels, n_channels).
+
+    Returns:
+        np.ndarray: Array of the same shape, clipped to [-1, 1]. Channels with zero variance
+        give NaN rows and columns.
+    """
+    std = np.sqrt(np.diagonal(covariance,axis1=-2,axis2=-1))
+    with np.errstate(divide='ignore',invalid='ignore'):
+        return np.clip(covariance/(std[...,:,None]*std[...,None,:]),-1,1)
+
+def covariance_engine(
+        data:Union[np.ndarray,List[np.ndarray]],ddof:int=1
+        )->Tuple[np.ndarray,np.ndarray]:
+    """
+    Compute the covariance and correlation matrices of one or more recordings.
+
+    Each recording is centered once, and the correlation is derived from the covariance
+    instead of centering the data a second time. A list of recordings of equal length is
+    stacked and reduced as one batched matrix product.
+
+    Args:
+        data (Union[np.ndarray, List[np.ndarray]]): A recording of shape (n_channels, n_samples),
+        a stack of shape (n_recordings, n_channels, n_samples), or a list of recordings with
+        the same channels, possibly of different lengths.
+        ddof (int, optional): Delta degrees of freedom, as in np.cov. Default is 1.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The covariance and correlation matrices, of shape
+        (n_channels, n_channels) for one recording or (n_recordings, n_channels, n_channels)
+        otherwise, in the dtype of the precision policy.
+
+    Raises:
+        ValueError: If the data is neither 2D nor 3D, or if the recordings do not have the
+        same number of channels.
+
+    Example:
+        >>> import numpy as np
+        >>> from custom_module import covariance_engine
+        >>> recordings = [np.random.randn(16, 75000) for _ in range(4)]
+        >>> cov, corr = covariance_engine(recordings)
+        >>> cov.shape  # (4, 16, 16)
+    """
+    if isinstance(data,(list,tuple)) and len({np.shape(data_)[-1] for data_ in data})>1:
+        if len({np.shape(data_)[0] for data_ in data})>1:
+            raise ValueError("Inpermissible recordings, their number of channels differ")
+        covariances = np.stack([covariance_engine(data_,ddof)[0] for data_ in data])
+        return covariances, _correlation(covariances)
+
+    data = as_policy_dtype(data)
+    if data.ndim not in (2,3):
+        raise ValueError(f"Inpermissible data, {data.ndim}D arrays are not supported")
+    centered = data-data.mean(axis=-1,keepdims=True)
+    covariance = (centered @ np.swapaxes(centered,-1,-2))/(data.shape[-1]-ddof)
+    return covariance, _correlation(covariance)
+
+class RollingCovariance:
+    """
+    Covariance of the latest ``window`` samples of a multichannel stream.
+
+    The count, mean and co-moment matrix of the window are kept in float64. Incoming samples
+    are merged into them and evicted samples removed from them with the pairwise update of
+    Chan et al., which corrects the co-moment with a rank-1 term per block, so each update
+    costs O(block * channels²) whatever the window length. The co-moment is recomputed from
+    the buffered window every ``refresh_windows`` windows of evicted samples, which bounds the
+    rounding error accumulated by the removals.
+
+    Attributes:
+        n_channels (int): Number of channels in the stream.
+        window (int): Number of samples the statistics cover.
+        ddof (int): Delta degrees of freedom, as in np.cov.
+        refresh_windows (int): Number of windows of evicted samples between exact recomputations.
+        n_samples (int): Number of samples currently in the window.
+
+    Methods:
+        update(chunk): Ingest a chunk of samples, evicting the oldest ones.
+        covariance(): Covariance matrix of the window.
+        correlation(): Correlation matrix of the window.
+        reset(): Clear the window.
+    """
+
+    def __init__(self,n_channels:int,window:int,ddof:int=1,refresh_windows:int=16):
+        """
+        Initialize the RollingCovariance object.
+
+        Args:
+            n_channels (int): Number of channels in the stream.
+            window (int): Number of samples the statistics cover. Must exceed ddof.
+            ddof (int, optional): Delta degrees of freedom, as in np.cov. Default is 1.
+            refresh_windows (int, optional): Number of windows of evicted samples between
+            exact recomputations. Default is 16.
+
+        Returns:
+            None
+        """
+        assert window>ddof
+        assert refresh_windows>=1
+        self.n_channels = n_channels
+        self.window = window
+        self.ddof = ddof
+        self.refresh_windows = refresh_windows
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the window.
+
+        Returns:
+            None
+        """
+        self._buffer = np.zeros((self.n_channels,self.window))
+        self._start = 0
+        self.n_samples = 0
+        self._mean = np.zeros(self.n_channels)
+        self._comoment = np.zeros((self.n_channels,self.n_channels))
+        self._evicted = 0
+
+    @staticmethod
+    def _moments(block:np.ndarray)->Tuple[int,np.ndarray,np.ndarray]:
+        mean = block.mean(axis=-1)
+        centered = block-mean[:,None]
+        return block.shape[-1], mean, centered @ centered.T
+
+    def _merge(self,block:np.ndarray):
+        n_b, mean_b, comoment_b = self._moments(block)
+        n = self.n_samples+n_b
+        delta = mean_b-self._mean
+        self._comoment += comoment_b+np.outer(delta,delta)*(self.n_samples*n_b/n)
+        self._mean += delta*(n_b/n)
+        self.n_samples = n
+
+    def _remove(self,block:np.ndarray):
+        n_b, mean_b, comoment_b = self._moments(block)
+        n = self.n_samples-n_b
+        mean = (self.n_samples*self._mean-n_b*mean_b)/n
+        delta = mean_b-mean
+        self._comoment -= comoment_b+np.outer(delta,delta)*(n*n_b/self.n_samples)
+        self._mean = mean
+        self.n_samples = n
+
+    def _indices(self,start:int,length:int)->np.ndarray:
+        return (start+np.arange(length))%self.window
+
+    def update(self,chunk:Union[np.ndarray,List]):
+        """
+        Ingest a chunk of samples, evicting the oldest samples beyond the window.
+
+        Args:
+            chunk (Union[np.ndarray, List]): Samples of shape (n_channels, n_samples).
+
+        Returns:
+            None
+        """
+        chunk = np.asarray(chunk,dtype=np.float64)
+        assert chunk.ndim==2 and chunk.shape[0]==self.n_channels
+        if chunk.shape[-1]>=self.window:
+            self.reset()
+            self._buffer[:] = chunk[:,-self.window:]
+            self.n_samples, self._mean, self._comoment = self._moments(self._buffer)
+            return
+        if chunk.shape[-1]==0:
+            return
+
+        n_evicted = max(0,self.n_samples+chunk.shape[-1]-self.window)
+        if n_evicted>0:
+            self._remove(self._buffer[:,self._indices(self._start,n_evicted)])
+            self._start = (self._start+n_evicted)%self.window
+            self._evicted += n_evicted
+        self._buffer[:,self._indices(self._start+self.n_samples,chunk.shape[-1])] = chunk
+        self._merge(chunk)
+
+        if self._evicted>=self.refresh_windows*self.window:
+            window = self._buffer[:,self._indices(self._start,self.n_samples)]
+            _, self._mean, self._comoment = self._moments(window)
+            self._evicted = 0
+
+    def covariance(self)->np.ndarray:
+        """
+        Return the covariance matrix of the samples in the window.
+
+        Returns:
+            np.ndarray: Array of shape (n_channels, n_channels), in the dtype of the precision
+            policy.
+
+        Raises:
+            ValueError: If the window holds too few samples.
+        """
+        if self.n_samples<=self.ddof:
+            raise ValueError(f"Inpermissible window, {self.n_samples} samples are collected")
+        return (self._comoment/(self.n_samples-self.ddof)).astype(get_dtype())
+
+    def correlation(self)->np.ndarray:
+        """
+        Return the correlation matrix of the samples in the window.
+
+        Returns:
+            np.ndarray: Array of shape (n_channels, n_channels), in the dtype of the precision
+            policy.
+
+        Raises:
+            ValueError: If the window holds too few samples.
+        """
+        return _correlation(self.covariance())
+
+def rolling_covariance(
+        data:Union[np.ndarray,List],window:int,step:int=None,
+        method:str='cov',ddof:int=1
+        )->np.ndarray:
+    """
+    Compute the covariance or correlation matrix of sliding windows over a recording.
+
+    Consecutive windows share all but ``step`` samples, so each window is obtained from the
+    previous one by merging the new samples and removing the evicted ones (see
+    'RollingCovariance') instead of being recomputed from scratch.
+
+    Args:
+        data (Union[np.ndarray, List]): EEG data of shape (n_channels, n_samples).
+        window (int): Number of samples per window.
+        step (int, optional): Number of samples between the starts of consecutive windows.
+        Default is None, which uses non-overlapping windows.
+        method (str, optional): 'cov' for covariance or 'corr' for correlation. Default is 'cov'.
+        ddof (int, optional): Delta degrees of freedom, as in np.cov. Default is 1.
+
+    Returns:
+        np.ndarray: Array of shape (n_windows, n_channels, n_channels), in the dtype of the
+        precision policy.
+
+    Raises:
+        ValueError: If an invalid method is specified.
+        AssertionError: If the window is longer than the data or the step is not positive.
+
+    Example:
+        >>> import numpy as np
+        >>> from custom_module import rolling_covariance
+        >>> eeg_data = np.random.randn(16, 75000)  # 16 channels
+        >>> rolling_covariance(eeg_data, window=1250, step=125).shape  # (591, 16, 16)
+    """
+    if method not in ('cov','corr'):
+        raise ValueError(f"Inpermissible method, {method} is used")
+    data = np.asarray(data,dtype=np.float64)
+    step = window if step is None else step
+    assert data.ndim==2 and window<=data.shape[-1]
+    assert step>=1
+
+    rolling = RollingCovariance(data.shape[0],window,ddof)
+    starts = range(0,data.shape[-1]-window+1,step)
+    res = np.empty((len(starts),data.shape[0],data.shape[0]),dtype=get_dtype())
+    end = 0
+    for index,start in enumerate(starts):
+        rolling.update(data[:,max(end,start):start+window])
+        end = start+window
+        res[index] = rolling.covariance() if method=='cov' else rolling.correlation()
+    return res
@@ -0,0 +1,357 @@
+"""
+Feature Pipeline Module
+
+This module provides a pipeline that extracts several features from one recording while
+computing every derived signal they depend on a single time.
+
+Functions:
+    - extract_bands_power: Extract the log10 power within frequency bands.
+    - extract_relative_bands_power: Extract the share of each band in the power of all bands.
+    - extract_hjorth: Extract the Hjorth parameters.
+    - extract_covariance: Extract the covariance of each channel with every channel.
+    - extract_correlation: Extract the correlation of each channel with every channel.
+
+Classes:
+    - DerivedSignals: Memoizes the quantities derived from one recording.
+    - FeaturePipeline: A subclass of Pipeline running feature extractors over one recording.
+
+Dependencies:
+    - numpy
+    - frequency (from .frequency)
+    - time (from .time)
+    - store (from .store)
+    - precision (from .precision)
+    - covariance (from .covariance)
+    - pipeline (from pipeline.pipeline)
+
+Typical usage example:
+
+    from custom_module import FeaturePipeline, extract_bands_power, extract_hjorth
+
+    pipeline = FeaturePipeline('features', [
+        (extract_bands_power, {'bands': bands}),
+        (extract_hjorth, {'segment_size': 10}),
+    ], sampling_frequency=125)
+    features = pipeline.forward(sig)  # shape (n_channels, n_features)
+    store.write('subject_01', features, pipeline.feature_names)
+"""
+
+from typing import Callable, List, Tuple
+import numpy as np
+
+from pipeline.pipeline import Pipeline
+from .frequency import psd_backends, _reduce_bands
+from .time import hjorth_parameters_names, _segments, _hjorth_statistics
+from .store import band_feature_names
+from .precision import as_policy_dtype
+from .covariance import _correlation
+
+def _hashable(value):
+    """
+    Convert a keyword argument into a hashable memo key, arrays being keyed by their
+    contents and lists and dicts by their items.
+    """
+    if isinstance(value,np.ndarray):
+        return ('ndarray',value.dtype.str,value.shape,value.tobytes())
+    if isinstance(value,(list,tuple)):
+        return (type(value).__name__,)+tuple(_hashable(item) for item in value)
+    if isinstance(value,dict):
+        return ('dict',)+tuple(sorted((key,_hashable(item)) for key,item in value.items()))
+    try:
+        hash(value)
+    except TypeError:
+        return ('repr',repr(value))
+    return value
+
+class DerivedSignals:
+    """
+    Memoizes the quantities derived from one recording.
+
+    Every quantity is computed the first time it is requested and returned from memory
+    afterwards, so feature extractors sharing an input (e.g. the spectrum for band powers, the
+    centered data for covariance and correlation) only pay for it once.
+
+    Attributes:
+        data (np.ndarray): The recording, of shape (n_channels, n_samples), in the dtype of
+        the precision policy.
+        sampling_frequency (int): The sampling frequency of the recording.
+        computed (List[tuple]): The keys of the quantities computed so far, in order.
+
+    Methods:
+        centered(): Return the data with the mean of each channel removed.
+        covariance(): Return the covariance matrix of the channels.
+        spectrum(method, avg_type, **backend_kwargs): Return the spectrum of every channel.
+        segment_differences(segment_size): Return segmented data and its differences.
+    """
+
+    def __init__(self,data:np.ndarray,sampling_frequency:int):
+        """
+        Initialize the DerivedSignals object.
+
+        Args:
+            data (np.ndarray): The recording, of shape (n_channels, n_samples).
+            sampling_frequency (int): The sampling frequency of the recording.
+
+        Returns:
+            None
+        """
+        self.data = as_policy_dtype(data)
+        assert self.data.ndim==2
+        self.sampling_frequency = sampling_frequency
+        self.computed = []
+        self._memo = {}
+
+    def _memoized(self,key:tuple,compute:Callable):
+        if key not in self._memo:
+            self._memo[key] = compute()
+            self.computed.append(key)
+        return self._memo[key]
+
+    def centered(self)->np.ndarray:
+        """
+        Return the data with the mean of each channel removed.
+
+        Returns:
+            np.ndarray: Array of shape (n_channels, n_samples).
+        """
+        return self._memoized(
+            ('centered',),lambda: self.data-self.data.mean(axis=-1,keepdims=True)
+            )
+
+    def covariance(self)->np.ndarray:
+        """
+        Return the covariance matrix of the channels, as np.cov does.
+
+        Returns:
+            np.ndarray: Array of shape (n_channels, n_channels).
+        """
+        def compute():
+            centered = self.centered()
+            return (centered @ centered.T)/(centered.shape[-1]-1)
+        return self._memoized(('covariance',),compute)
+
+    def spectrum(
+            self,method:str='welch',avg_type:str='mean',**backend_kwargs
+            )->Tuple[np.ndarray,np.ndarray,int]:
+        """
+        Return the spectrum of every channel.
+
+        Args:
+            method (str, optional): The method used for spectral estimation, one of the keys
+            of 'psd_backends'. Default is 'welch'.
+            avg_type (str, optional): The type of averaging to apply. Default is 'mean'.
+            **backend_kwargs: Keyword arguments of the spectral estimator.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, int]: The frequencies, the linear spectrum of shape
+            (n_channels, frequencies) and the FFT length (or None), as returned by the backend.
+
+        Raises:
+            ValueError: If an invalid method is specified.
+        """
+        if method not in psd_backends:
+            raise ValueError(f"Inpermissible method, {method} is used")
+        key = ('spectrum',method,avg_type,_hashable(backend_kwargs))
+        return self._memoized(
+            key,
+            lambda: psd_backends[method](self.data,self.sampling_frequency,avg_type,**backend_kwargs)
+            )
+
+    def segment_differences(self,segment_size:int)->Tuple[np.ndarray,np.ndarray,np.ndarray]:
+        """
+        Return the data viewed as non-overlapping segments and its first and second
+        differences within each segment.
+
+        Args:
+            segment_size (int): The number of samples per segment.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: The segments, of shape
+            (n_channels, num_segments, segment_size), and their first and second differences.
+        """
+        def compute():
+            segments = _segments(self.data,segment_size)
+            first_diff = np.diff(segments,axis=-1)
+            return segments, first_diff, np.diff(first_diff,axis=-1)
+        return self._memoized(('segment_differences',segment_size),compute)
+
+def extract_bands_power(
+        signals:DerivedSignals,bands:List[Tuple[float]],
+        method:str='welch',avg_type:str='mean',**backend_kwargs
+        )->Tuple[np.ndarray,List[str]]:
+    """
+    Extract the log10 power within frequency bands, as 'bands_power' does.
+
+    Args:
+        signals (DerivedSignals): The recording and its derived quantities.
+        bands (List[Tuple[float]]): A list of tuples representing frequency bands of interest.
+        method (str, optional): The method used for spectral estimation. Default is 'welch'.
+        avg_type (str, optional): The type of averaging to apply. Default is 'mean'.
+        **backend_kwargs: Keyword arguments of the spectral estimator.
+
+    Returns:
+        Tuple[np.ndarray, List[str]]: The features, of shape (n_channels, len(bands)), and
+        their names from 'band_feature_names'.
+    """
+    freqs, spectrum, nfft = signals.spectrum(method,avg_type,**backend_kwargs)
+    powers = _reduce_bands(freqs,spectrum,nfft,signals.sampling_frequency,bands)
+    return np.log10(powers), band_feature_names(bands)
+
+def extract_relative_bands_power(
+        signals:DerivedSignals,bands:List[Tuple[float]],
+        method:str='welch',avg_type:str='mean',**backend_kwargs
+        )->Tuple[np.ndarray,List[str]]:
+    """
+    Extract the share of each band in the summed power of all the bands.
+
+    Args:
+        signals (DerivedSignals): The recording and its derived quantities.
+        bands (List[Tuple[float]]): A list of tuples representing frequency bands of interest.
+        method (str, optional): The method used for spectral estimation. Default is 'welch'.
+        avg_type (str, optional): The type of averaging to apply. Default is 'mean'.
+        **backend_kwargs: Keyword arguments of the spectral estimator.
+
+    Returns:
+        Tuple[np.ndarray, List[str]]: The features, of shape (n_channels, len(bands)), summing
+        to one for every channel, and their names, e.g. 'relative_band_8.0_12.0'.
+    """
+    freqs, spectrum, nfft = signals.spectrum(method,avg_type,**backend_kwargs)
+    powers = _reduce_bands(freqs,spectrum,nfft,signals.sampling_frequency,bands)
+    names = [f'relative_{name}' for name in band_feature_names(bands)]
+    return powers/powers.sum(axis=-1,keepdims=True), names
+
+def extract_hjorth(
+        signals:DerivedSignals,segment_size:int=10
+        )->Tuple[np.ndarray,List[str]]:
+    """
+    Extract the Hjorth parameters, as 'hjorth_batch' does.
+
+    Args:
+        signals (DerivedSignals): The recording and its derived quantities.
+        segment_size (int, optional): Segment size for computing Hjorth parameters. Default is 10.
+
+    Returns:
+        Tuple[np.ndarray, List[str]]: The features, of shape (n_channels, 6), and
+        'hjorth_parameters_names'.
+    """
+    return _hjorth_statistics(*signals.segment_differences(segment_size)), hjorth_parameters_names
+
+def _channel_labels(signals:DerivedSignals,ch_names:List[str])->List[str]:
+    if ch_names is None:
+        return [str(channel) for channel in range(signals.data.shape[0])]
+    assert len(ch_names)==signals.data.shape[0]
+    return [str(ch_name) for ch_name in ch_names]
+
+def extract_covariance(
+        signals:DerivedSignals,ch_names:List[str]=None
+        )->Tuple[np.ndarray,List[str]]:
+    """
+    Extract the covariance of each channel with every channel, as np.cov does.
+
+    Args:
+        signals (DerivedSignals): The recording and its derived quantities.
+        ch_names (List[str], optional): The channel names used in the feature names.
+        Default is None, which uses the channel indices.
+
+    Returns:
+        Tuple[np.ndarray, List[str]]: The features, of shape (n_channels, n_channels), and
+        their names, e.g. 'covariance_Fp1'.
+    """
+    names = [f'covariance_{label}' for label in _channel_labels(signals,ch_names)]
+    return signals.covariance(), names
+
+def extract_correlation(
+        signals:DerivedSignals,ch_names:List[str]=None
+        )->Tuple[np.ndarray,List[str]]:
+    """
+    Extract the correlation of each channel with every channel, as np.corrcoef does.
+
+    Args:
+        signals (DerivedSignals): The recording and its derived quantities.
+        ch_names (List[str], optional): The channel names used in the feature names.
+        Default is None, which uses the channel indices.
+
+    Returns:
+        Tuple[np.ndarray, List[str]]: The features, of shape (n_channels, n_channels), and
+        their names, e.g. 'correlation_Fp1'.
+    """
+    names = [f'correlation_{label}' for label in _channel_labels(signals,ch_names)]
+    return _correlation(signals.covariance()), names
+
+class FeaturePipeline(Pipeline):
+    """
+    Feature Pipeline Class
+
+    A subclass of Pipeline for extracting several features from one recording.
+
+    Every step is an extractor taking a DerivedSignals object, e.g. 'extract_bands_power' or
+    'extract_hjorth', and returning its features for every channel with their names. The
+    extractors of one forward pass share a single DerivedSignals object, so the spectrum, the
+    differences and the centered data are computed once however many extractors use them.
+
+    Attributes:
+        name (str): The name of the pipeline.
+        methods (list): A list of extractors, as (callable,) or (callable, kwargs).
+        sampling_frequency (int): The sampling frequency of the recordings.
+        feature_names (List[str]): The names of the columns returned by the last forward pass.
+        computed (List[tuple]): The keys of the quantities derived during the last forward
+        pass, see DerivedSignals. The quantities themselves are released after the pass.
+
+    Methods:
+        __init__(name, methods, sampling_frequency, profile, profile_memory): Initialize the
+        FeaturePipeline object.
+        forward(sig): Extract every feature from a recording.
+
+    """
+
+    def __init__(
+            self,name:str,methods:list,sampling_frequency:int,
+            profile:bool=False,profile_memory:bool=False
+            ):
+        """
+        Initialize the FeaturePipeline object.
+
+        Args:
+            name (str): The name of the pipeline.
+            methods (list): A list of extractors, as (callable,) or (callable, kwargs).
+            sampling_frequency (int): The sampling frequency of the array recordings.
+            profile (bool, optional): Profile every extractor, see Pipeline. Default is False.
+            profile_memory (bool, optional): Also measure the peak memory of every extractor.
+            Default is False.
+
+        Returns:
+            None
+        """
+        super().__init__(name,methods,profile,profile_memory)
+        self.sampling_frequency = sampling_frequency
+        self.feature_names = None
+        self.computed = []
+
+    def forward(self,sig:np.ndarray)->np.ndarray:
+        """
+        Extract every feature from a recording.
+
+        Args:
+            sig (np.ndarray): The recording, of shape (n_channels, n_samples), or an mne.io.Raw,
+            whose own sampling frequency is used instead of 'sampling_frequency'.
+
+        Returns:
+            np.ndarray: The features, of shape (n_channels, len(feature_names)), with the
+            columns of each extractor in the order of 'methods'.
+        """
+        self._begin_pass()
+        sampling_frequency = self.sampling_frequency
+        if hasattr(sig,'get_data'):
+            sampling_frequency = sig.info['sfreq']
+            sig = sig.get_data()
+        signals = DerivedSignals(sig,sampling_frequency)
+        values = []
+        feature_names = []
+        for step_no,method in enumerate(self.methods):
+            values_, names_ = self.run_step(step_no,method,signals)
+            assert values_.shape==(signals.data.shape[0],len(names_))
+            values.append(values_)
+            feature_names += names_
+        self.feature_names = feature_names
+        self.computed = signals.computed
+        return np.concatenate(values,axis=-1)
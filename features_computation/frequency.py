@@ -3,16 +3,23 @@
     using different methods like Welch's method or median filtering.
 
     Functions:
+        - spectral_engine: Computes the spectrum of a signal once and reduces it to the power
+        within every requested frequency band in a single vectorized step.
         - band_power: Computes the power within a specified frequency band using Welch's method 
         or median filtering.
         - bands_power: Computes the power within multiple frequency bands using Welch's method 
         or median filtering.
         - compute_psd: Computes the power spectral density (PSD) using Welch's method.
+        - register_psd_backend: Makes a spectral estimator selectable through 'method'.
+        - epochs_bands_power: Computes the power within multiple frequency bands for every
+        epoch of a sliding window, with one batched FFT.
 
     Dependencies:
         - numpy
-        - neurodsp.spectral
+        - scipy
+        - neurodsp.spectral (imported on first use, by the 'welch' and 'medfilt' methods)
         - typing
+        - precision (from .precision)
 
     Typical usage example:
 
@@ -30,14 +37,320 @@
         psd, freqs = compute_psd(sig, sampling_frequency)
 """
 
-from typing import Tuple, List
+from typing import TYPE_CHECKING, Callable, Tuple, List, Union
+from functools import lru_cache
 import numpy as np
-from neurodsp import spectral
+import scipy.fft
 
+from .precision import as_policy_dtype
+
+if TYPE_CHECKING:
+    import mne
+
+
+@lru_cache(maxsize=128)
+def _band_weights(
+        sampling_frequency:float,nperseg:int,bands:Tuple[Tuple[float,float],...],
+        dtype:str='float64'
+        )->np.ndarray:
+    """
+    Build the band-averaging matrix of a Welch spectrum for a given (fs, nperseg) pair.
+
+    Row ``i`` holds ``1/n_i`` on the ``n_i`` frequency bins inside ``bands[i]`` (edges
+    inclusive) and zero elsewhere, so ``spectrum @ weights.T`` is the mean power of every
+    band. A band that contains no bin gets a row of NaN, like the mean of an empty selection.
+
+    Args:
+        sampling_frequency (float): The sampling frequency of the signal.
+        nperseg (int): The Welch segment length, in samples.
+        bands (Tuple[Tuple[float, float], ...]): The frequency bands of interest.
+        dtype (str, optional): The dtype of the matrix, matching the spectrum it reduces.
+        Default is 'float64'.
+
+    Returns:
+        np.ndarray: Read-only array of shape (n_bands, nperseg//2 + 1).
+    """
+    freqs = np.fft.rfftfreq(nperseg,1/sampling_frequency)
+    weights = np.zeros((len(bands),freqs.shape[0]),dtype=dtype)
+    for band_no,band in enumerate(bands):
+        mask = (freqs>=band[0]) & (freqs<=band[1])
+        if mask.sum()==0:
+            weights[band_no,:] = np.nan
+        else:
+            weights[band_no,mask] = 1/mask.sum()
+    weights.setflags(write=False)
+    return weights
+
+@lru_cache(maxsize=32)
+def _hann_window(nperseg:int,dtype:str='float64')->np.ndarray:
+    """
+    Return the periodic Hann window used by Welch's method for a given segment length.
+
+    Args:
+        nperseg (int): The Welch segment length, in samples.
+        dtype (str, optional): The dtype of the window. Default is 'float64'.
+
+    Returns:
+        np.ndarray: Read-only window of shape (nperseg,).
+    """
+    window = (0.5-0.5*np.cos(2*np.pi*np.arange(nperseg)/nperseg)).astype(dtype)
+    window.setflags(write=False)
+    return window
+
+def _periodogram(segments:np.ndarray,sampling_frequency:float,workers:int=None)->np.ndarray:
+    """
+    Compute the one-sided power spectral density of Welch segments.
+
+    Each segment is mean-detrended and Hann-windowed, and the result uses the same density
+    scaling as the spectrogram behind 'spectral.compute_spectrum', so averaging the
+    periodograms of the Welch segments of a signal reproduces its Welch spectrum.
+
+    Args:
+        segments (np.ndarray): Segments of shape (..., nperseg).
+        sampling_frequency (float): The sampling frequency of the signal.
+        workers (int, optional): The number of threads of the FFT, negative values counting
+        back from the number of CPUs. Default is None, which uses one thread.
+
+    Returns:
+        np.ndarray: Power spectral density of shape (..., nperseg//2 + 1), in the dtype of
+        the segments.
+    """
+    nperseg = segments.shape[-1]
+    window = _hann_window(nperseg,segments.dtype.name)
+    detrended = segments-segments.mean(axis=-1,keepdims=True)
+    spectrum = np.abs(scipy.fft.rfft(detrended*window,axis=-1,workers=workers))**2
+    spectrum /= sampling_frequency*(window*window).sum()
+    if nperseg%2:
+        spectrum[...,1:] *= 2
+    else:
+        spectrum[...,1:-1] *= 2
+    return spectrum
+
+@lru_cache(maxsize=16)
+def _dpss_tapers(
+        n_samples:int,bandwidth:float,n_tapers:int,dtype:str='float64'
+        )->np.ndarray:
+    """
+    Return the unit-energy DPSS tapers for a given signal length and time-bandwidth product.
+
+    Args:
+        n_samples (int): The length of the signal, in samples.
+        bandwidth (float): The time-bandwidth product NW.
+        n_tapers (int): The number of tapers.
+        dtype (str, optional): The dtype of the tapers. Default is 'float64'.
+
+    Returns:
+        np.ndarray: Read-only tapers of shape (n_tapers, n_samples).
+    """
+    from scipy.signal import windows
+
+    tapers = windows.dpss(n_samples,bandwidth,Kmax=n_tapers).astype(dtype)
+    tapers.setflags(write=False)
+    return tapers
+
+def _welch_backend(
+        sig:np.ndarray,sampling_frequency:float,avg_type:str='mean',**kwargs
+        )->Tuple[np.ndarray,np.ndarray,int]:
+    """
+    Estimate the spectrum with neurodsp's Welch's method.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, int]: The frequencies, the spectrum and the FFT length.
+    """
+    from neurodsp import spectral
+
+    freqs, spectrum = spectral.compute_spectrum(
+        sig,sampling_frequency,'welch',avg_type,**kwargs
+        )
+    nperseg = kwargs.get('nperseg')
+    nperseg = int(sampling_frequency) if nperseg is None else int(nperseg)
+    return freqs, spectrum, min(nperseg,sig.shape[-1])
+
+def _medfilt_backend(
+        sig:np.ndarray,sampling_frequency:float,avg_type:str='mean',**kwargs
+        )->Tuple[np.ndarray,np.ndarray,int]:
+    """
+    Estimate the spectrum with neurodsp's median-filtered FFT.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, int]: The frequencies, the spectrum and None, since band
+        edges are not applied to this method.
+    """
+    from neurodsp import spectral
+
+    freqs, spectrum = spectral.compute_spectrum(
+        sig,sampling_frequency,'medfilt',avg_type,**kwargs
+        )
+    # neurodsp's FFT always returns float64
+    return freqs, spectrum.astype(sig.dtype,copy=False), None
+
+def _welch_fast_backend(
+        sig:np.ndarray,sampling_frequency:float,avg_type:str='mean',
+        nperseg:int=None,noverlap:int=None,workers:int=-1
+        )->Tuple[np.ndarray,np.ndarray,int]:
+    """
+    Estimate the spectrum with Welch's method, using strided segments, a cached window and a
+    multi-threaded FFT. The defaults and results are those of the 'welch' method.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, int]: The frequencies, the spectrum and the FFT length.
+    """
+    if avg_type not in ('mean','median'):
+        raise ValueError(f"Inpermissible avg_type, {avg_type} is used")
+    nperseg = int(sampling_frequency) if nperseg is None else int(nperseg)
+    nperseg = min(nperseg,sig.shape[-1])
+    noverlap = nperseg//8 if noverlap is None else int(noverlap)
+    segments = np.lib.stride_tricks.sliding_window_view(sig,nperseg,axis=-1)
+    segments = segments[...,::nperseg-noverlap,:]
+    periodograms = _periodogram(segments,sampling_frequency,workers)
+    if avg_type=='mean':
+        spectrum = periodograms.mean(axis=-2)
+    else:
+        spectrum = np.median(periodograms,axis=-2)
+    return np.fft.rfftfreq(nperseg,1/sampling_frequency), spectrum, nperseg
+
+def _multitaper_backend(
+        sig:np.ndarray,sampling_frequency:float,avg_type:str='mean',
+        bandwidth:float=4.0,n_tapers:int=None,workers:int=-1
+        )->Tuple[np.ndarray,np.ndarray,int]:
+    """
+    Estimate the spectrum with the multitaper method over the whole signal.
+
+    The signal is mean-detrended, multiplied by each DPSS taper (cached per signal length and
+    bandwidth) and transformed for all channels at once; the spectrum is the average of the
+    tapered periodograms. 'avg_type' is not used.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, int]: The frequencies, the spectrum and the FFT length.
+    """
+    n_samples = sig.shape[-1]
+    n_tapers = int(2*bandwidth)-1 if n_tapers is None else n_tapers
+    tapers = _dpss_tapers(n_samples,float(bandwidth),n_tapers,sig.dtype.name)
+    detrended = sig-sig.mean(axis=-1,keepdims=True)
+
+    spectrum = np.zeros(sig.shape[:-1]+(n_samples//2+1,),dtype=sig.dtype)
+    for taper in tapers:
+        spectrum += np.abs(scipy.fft.rfft(detrended*taper,axis=-1,workers=workers))**2
+    spectrum /= n_tapers*sampling_frequency
+    if n_samples%2:
+        spectrum[...,1:] *= 2
+    else:
+        spectrum[...,1:-1] *= 2
+    return np.fft.rfftfreq(n_samples,1/sampling_frequency), spectrum, n_samples
+
+# Spectral estimators selectable through the 'method' argument. Each takes the signal, the
+# sampling frequency, the averaging type and its own keyword arguments, and returns the
+# frequencies, the spectrum and the FFT length used to locate band edges (None to average
+# the whole spectrum for every band).
+psd_backends = {
+    'welch': _welch_backend,
+    'medfilt': _medfilt_backend,
+    'welch_fast': _welch_fast_backend,
+    'multitaper': _multitaper_backend,
+}
+
+def register_psd_backend(name:str,backend:Callable):
+    """
+    Make a spectral estimator selectable through the 'method' argument.
+
+    Args:
+        name (str): The method name.
+        backend (Callable): Function taking (sig, sampling_frequency, avg_type, **kwargs) and
+        returning the frequencies, the spectrum and the FFT length (or None), as the entries
+        of 'psd_backends' do.
+
+    Returns:
+        None
+    """
+    psd_backends[name] = backend
+
+def spectral_engine(
+        sig:np.ndarray,sampling_frequency:int,bands:List[Tuple[float]],
+        method:str='welch',avg_type:str='mean',**backend_kwargs
+        )->Tuple[np.ndarray,np.ndarray,np.ndarray]:
+    """
+    Compute the spectrum of a signal once and reduce it to the power within every band.
+
+    The spectrum is estimated a single time for all channels, then the mean power of every
+    band for every channel is obtained with one matrix product against a cached
+    band-averaging matrix.
+
+    Args:
+        sig (np.ndarray): The input signal, 1D (samples) or 2D (channels, samples).
+        sampling_frequency (int): The sampling frequency of the signal.
+        bands (List[Tuple[float]]): A list of tuples representing frequency bands of interest.
+
+    Keyword Args:
+        method (str, optional): The method used for spectral estimation. Default is 'welch'.
+        avg_type (str, optional): The type of averaging to apply. Default is 'mean'.
+        **backend_kwargs: Keyword arguments of the spectral estimator, e.g. 'nperseg' or
+        'workers' for 'welch_fast', 'bandwidth' or 'n_tapers' for 'multitaper'.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The frequencies, the linear spectrum and
+        the linear power within each band, of shape ``sig.shape[:-1] + (len(bands),)``.
+
+    Raises:
+        ValueError: If an invalid method is specified.
+
+    Notes:
+        - Supported methods for spectral estimation are the keys of 'psd_backends': 'welch'
+        and 'medfilt' from neurodsp, 'welch_fast' (same estimate with a multi-threaded FFT)
+        and 'multitaper'. More can be added with 'register_psd_backend'.
+        - With 'medfilt' the band edges are not applied and every band holds the mean of the
+        whole spectrum, as 'band_power' has always done for that method.
+
+    Example:
+        >>> import numpy as np
+        >>> from custom_module import spectral_engine
+        >>> fs = 1000  # Sampling frequency
+        >>> sig = np.random.randn(16, 1000)  # Random 16-channel signal
+        >>> bands = [(8, 12), (13, 30)]  # Define frequency bands
+        >>> freqs, spectrum, powers = spectral_engine(sig, fs, bands)
+    """
+    if method not in psd_backends:
+        raise ValueError(f"Inpermissible method, {method} is used")
+
+    sig = as_policy_dtype(sig)
+    freqs, spectrum, nfft = psd_backends[method](
+        sig,sampling_frequency,avg_type,**backend_kwargs
+        )
+    assert (spectrum.ndim!=0) and (spectrum.ndim<=2)
+    assert freqs.shape[0] == spectrum.shape[-1]
+    assert np.isnan(spectrum).sum() == 0
+
+    return freqs, spectrum, _reduce_bands(freqs,spectrum,nfft,sampling_frequency,bands)
+
+def _reduce_bands(
+        freqs:np.ndarray,spectrum:np.ndarray,nfft:int,
+        sampling_frequency:int,bands:List[Tuple[float]]
+        )->np.ndarray:
+    """
+    Reduce a spectrum returned by a backend of 'psd_backends' to the power within every band.
+
+    Args:
+        freqs (np.ndarray): The frequencies of the spectrum.
+        spectrum (np.ndarray): The linear spectrum, of shape (..., frequencies).
+        nfft (int): The FFT length of the spectrum, or None to give every band the mean of
+        the whole spectrum.
+        sampling_frequency (int): The sampling frequency of the signal.
+        bands (List[Tuple[float]]): A list of tuples representing frequency bands of interest.
+
+    Returns:
+        np.ndarray: The linear power within each band, of shape
+        ``spectrum.shape[:-1] + (len(bands),)``.
+    """
+    bands = tuple((float(band[0]),float(band[1])) for band in bands)
+    if nfft is not None:
+        assert freqs[-1] <= (sampling_frequency/2) or np.isclose(freqs[-1],sampling_frequency/2)
+        weights = _band_weights(float(sampling_frequency),nfft,bands,spectrum.dtype.name)
+        assert weights.shape[1] == freqs.shape[0]
+        return spectrum @ weights.T
+    return np.repeat(spectrum.mean(axis=-1)[...,np.newaxis],len(bands),axis=-1)
 
 def band_power(
         sig:np.array,sampling_frequency:int,band:List[float],
-        method:str='welch',avg_type:str='mean'
+        method:str='welch',avg_type:str='mean',**backend_kwargs
         )->np.array:
     """
     Calculate the power within a specified frequency band.
@@ -48,6 +361,7 @@ def band_power(
         band (List[float]): The frequency band of interest [low_freq, high_freq].
         method (str, optional): The method used for spectral estimation. Default is 'welch'.
         avg_type (str, optional): The type of averaging to apply. Default is 'mean'.
+        **backend_kwargs: Keyword arguments of the spectral estimator.
 
     Returns:
         np.ndarray: The log10 of the power within the specified frequency band.
@@ -56,7 +370,7 @@ def band_power(
         ValueError: If an invalid method is specified.
 
     Notes:
-        - Supported methods for spectral estimation are 'welch' and 'medfilt'.
+        - Supported methods for spectral estimation are the keys of 'psd_backends'.
 
     Example:
         >>> import numpy as np
@@ -67,37 +381,16 @@ def band_power(
         >>> power = band_power(sig, sampling_frequency, band)
     """
 
-    freqs, spectrum = spectral.compute_spectrum(sig,sampling_frequency,method,avg_type)
-    assert (spectrum.ndim!=0) and (spectrum.ndim<=2)
-    assert freqs.shape[0] == spectrum.shape[1]
-    assert np.isnan(spectrum).sum() == 0
-
-    if method=='welch':
-        assert freqs[-1] <= (sampling_frequency/2)
-        assert ((freqs>=band[0]) & (freqs<=band[1])).shape[0] >= 1
-        if spectrum.ndim==2:
-            _band_power = np.empty((spectrum.shape[0]))
-            for channel_no in range(spectrum.shape[0]):
-                _band_power[channel_no] = (
-                    (spectrum[channel_no,((freqs>=band[0]) & (freqs<=band[1]))]).mean()
-                    )
-        else:
-            _band_power = spectrum[((freqs>=band[0]) & (freqs<=band[1]))].mean()
-    elif method=='medfilt':
-        if spectrum.ndim==2:
-            _band_power = np.empty((spectrum.shape[0]))
-            for channel_no in range(spectrum.shape[0]):
-                _band_power[channel_no] = spectrum[channel_no,:].mean()
-        else:
-            _band_power = spectrum[:].mean()
-    else:
-        raise ValueError(f"Inpermissible method, {method} is used")
+    _, _, _bands_power = spectral_engine(
+        sig,sampling_frequency,[band],method,avg_type,**backend_kwargs
+        )
+    _band_power = _bands_power[...,0]
 
     return np.log10(_band_power)
 
 def bands_power(
         sig:np.array,sampling_frequency:int,bands:List[Tuple[float]],
-        method:str='welch',avg_type:str='mean'
+        method:str='welch',avg_type:str='mean',**backend_kwargs
         )->np.array:
     """
     Compute the power within multiple frequency bands using Welch's method or median filtering.
@@ -110,6 +403,7 @@ def bands_power(
     Keyword Args:
         method (str, optional): The method used for spectral estimation. Default is 'welch'.
         avg_type (str, optional): The type of averaging to apply. Default is 'mean'.
+        **backend_kwargs: Keyword arguments of the spectral estimator.
 
     Returns:
         np.ndarray: The power within the specified frequency bands.
@@ -127,23 +421,23 @@ def bands_power(
     """
 
     assert sig.ndim!=0 & sig.ndim<=2
-    if sig.ndim==2:
-        _bands_power = np.empty((sig.shape[0],len(bands)))
-        for band_no,band in enumerate(bands):
-            _bands_power[:,band_no] = band_power(sig,sampling_frequency,band,method,avg_type)
-    else:
-        _bands_power = np.empty((len(bands)))
-        for band_no,band in enumerate(bands):
-            _bands_power[band_no] = band_power(sig,sampling_frequency,band,method,avg_type)
-    return _bands_power
+    _, _, _bands_power = spectral_engine(
+        sig,sampling_frequency,bands,method,avg_type,**backend_kwargs
+        )
+    return np.log10(_bands_power)
 
-def compute_psd(sig_:np.ndarray,sampling_frequency_:int)->Tuple[np.ndarray,int]:
+def compute_psd(
+        sig_:np.ndarray,sampling_frequency_:int,method:str='welch',**backend_kwargs
+        )->Tuple[np.ndarray,int]:
     """
     Compute the Power Spectral Density (PSD) of a signal using Welch's method.
 
     Args:
         sig_ (np.ndarray): The input signal.
         sampling_frequency_ (int): The sampling frequency of the signal.
+        method (str, optional): The method used for spectral estimation, one of the keys of
+        'psd_backends'. Default is 'welch'.
+        **backend_kwargs: Keyword arguments of the spectral estimator.
 
     Returns:
         Tuple[np.ndarray, int]: A tuple containing the log10 of the PSD spectrum and 
@@ -156,6 +450,86 @@ def compute_psd(sig_:np.ndarray,sampling_frequency_:int)->Tuple[np.ndarray,int]:
         >>> sig = np.random.randn(1000)  # Random signal
         >>> psd, freqs = compute_psd(sig, fs)
     """
-    freqs, spectrum = spectral.compute_spectrum(sig_,sampling_frequency_,'welch','mean')
+    freqs, spectrum, _ = spectral_engine(
+        sig_,sampling_frequency_,[],method,'mean',**backend_kwargs
+        )
     spectrum = np.log10(spectrum)
     return spectrum, freqs
+
+def epochs_bands_power(
+        sig:Union[np.ndarray,'mne.io.Raw'],sampling_frequency:int=None,
+        bands:List[Tuple[float]]=None,epoch_duration:float=2.0,overlap:float=0.5,
+        avg_type:str='mean'
+        )->np.ndarray:
+    """
+    Compute the power within multiple frequency bands for every epoch of a sliding window.
+
+    The epochs, and the Welch segments inside each epoch, are built as strided views of the
+    signal without copying. The periodograms of every segment of every epoch and channel are
+    computed with one batched FFT, and reduced to band powers with the cached band-averaging
+    matrix of 'spectral_engine'. Each epoch gets the same values as 'bands_power' with the
+    'welch' method on that epoch alone.
+
+    Args:
+        sig (Union[np.ndarray, mne.io.Raw]): The input signal of shape (channels, samples), or a
+        recording whose data and sampling frequency are used.
+        sampling_frequency (int, optional): The sampling frequency of the signal. Required for
+        arrays, ignored for recordings.
+        bands (List[Tuple[float]]): A list of tuples representing frequency bands of interest.
+        Required, it follows 'sampling_frequency' only so that recordings can omit the latter.
+
+    Keyword Args:
+        epoch_duration (float, optional): The duration of each epoch, in seconds. Default is 2.
+        overlap (float, optional): The fraction of overlap between consecutive epochs, in
+        [0, 1). Default is 0.5.
+        avg_type (str, optional): The type of averaging across Welch segments, 'mean' or
+        'median'. Default is 'mean'.
+
+    Returns:
+        np.ndarray: The log10 of the power within each band, of shape
+        (epochs, channels, len(bands)).
+
+    Raises:
+        ValueError: If no bands or an invalid averaging type are specified.
+
+    Example:
+        >>> import numpy as np
+        >>> from custom_module import epochs_bands_power
+        >>> fs = 125  # Sampling frequency
+        >>> sig = np.random.randn(16, 125*600)  # 10 minutes of 16-channel signal
+        >>> bands = [(8, 12), (13, 30)]  # Define frequency bands
+        >>> powers = epochs_bands_power(sig, fs, bands)  # shape (599, 16, 2)
+    """
+    if bands is None:
+        raise ValueError("Inpermissible bands, epochs_bands_power needs frequency bands")
+    if avg_type not in ('mean','median'):
+        raise ValueError(f"Inpermissible avg_type, {avg_type} is used")
+    if hasattr(sig,'get_data'):
+        sampling_frequency = sig.info['sfreq']
+        sig = sig.get_data()
+    sig = as_policy_dtype(sig)
+    assert sig.ndim==2 and sampling_frequency is not None
+    assert 0<=overlap<1
+
+    epoch_length = int(round(epoch_duration*sampling_frequency))
+    epoch_step = max(int(round(epoch_length*(1-overlap))),1)
+    assert epoch_length<=sig.shape[-1]
+    # (channels, epochs, epoch_length) -> (epochs, channels, epoch_length)
+    epochs = np.lib.stride_tricks.sliding_window_view(sig,epoch_length,axis=-1)[:,::epoch_step]
+    epochs = np.moveaxis(epochs,1,0)
+
+    nperseg = min(int(sampling_frequency),epoch_length)
+    segment_step = nperseg-nperseg//8
+    segments = np.lib.stride_tricks.sliding_window_view(epochs,nperseg,axis=-1)
+    segments = segments[...,::segment_step,:]
+    periodograms = _periodogram(segments,sampling_frequency)
+    if avg_type=='mean':
+        spectrum = periodograms.mean(axis=-2)
+    else:
+        spectrum = np.median(periodograms,axis=-2)
+
+    weights = _band_weights(
+        float(sampling_frequency),nperseg,
+        tuple((float(band[0]),float(band[1])) for band in bands),spectrum.dtype.name
+        )
+    return np.log10(spectrum @ weights.T)
@@ -0,0 +1,95 @@
+"""
+Precision Policy Module
+
+This module holds the floating-point dtype that feature computations and array-based
+preprocessing work in. The default, float64, keeps the historical results; float32 halves
+memory and memory bandwidth, and is precise enough for EEG digitized with a 24-bit ADC.
+
+Under a float32 policy, inputs are cast once on entry and every intermediate (windows,
+tapers, band-averaging matrices, filter coefficients) is built in float32, so results are
+float32 without hidden upcasts. The exceptions are documented where they occur, e.g. the
+prefix sums of 'hjorth_multiscale', which accumulate in float64 to avoid cancellation.
+
+Functions:
+    - set_dtype: Set the dtype of the policy.
+    - get_dtype: Return the dtype of the policy.
+    - dtype_policy: Context manager applying a dtype within a block.
+    - as_policy_dtype: Cast data to the dtype of the policy.
+
+Dependencies:
+    - numpy
+
+Typical usage example:
+
+    from custom_module import dtype_policy, bands_power
+
+    with dtype_policy('float32'):
+        powers = bands_power(sig, fs, bands)  # float32
+"""
+
+from contextlib import contextmanager
+from typing import Iterator, Union
+import numpy as np
+
+supported_dtypes = ['float32','float64']
+
+_policy = {'dtype':np.dtype('float64')}
+
+def set_dtype(dtype:Union[str,np.dtype]):
+    """
+    Set the dtype of the policy.
+
+    Args:
+        dtype (Union[str, np.dtype]): 'float32' or 'float64'.
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: If an unsupported dtype is specified.
+    """
+    if np.dtype(dtype).name not in supported_dtypes:
+        raise ValueError(f"Inpermissible dtype, {dtype} is used")
+    _policy['dtype'] = np.dtype(dtype)
+
+def get_dtype()->np.dtype:
+    """
+    Return the dtype of the policy.
+
+    Returns:
+        np.dtype: The dtype feature computations work in.
+    """
+    return _policy['dtype']
+
+@contextmanager
+def dtype_policy(dtype:Union[str,np.dtype])->Iterator[np.dtype]:
+    """
+    Apply a dtype within a block, restoring the previous one on exit.
+
+    Args:
+        dtype (Union[str, np.dtype]): 'float32' or 'float64'.
+
+    Yields:
+        np.dtype: The dtype applied within the block.
+
+    Raises:
+        ValueError: If an unsupported dtype is specified.
+    """
+    previous = get_dtype()
+    set_dtype(dtype)
+    try:
+        yield get_dtype()
+    finally:
+        set_dtype(previous)
+
+def as_policy_dtype(data:Union[np.ndarray,list])->np.ndarray:
+    """
+    Cast data to the dtype of the policy, without copying if it already has that dtype.
+
+    Args:
+        data (Union[np.ndarray, list]): The data.
+
+    Returns:
+        np.ndarray: The data as an array of the policy dtype.
+    """
+    return np.asarray(data,dtype=get_dtype())
@@ -0,0 +1,291 @@
+"""
+Feature Store Module
+
+This module provides an on-disk, memory-mapped store for the features of a whole cohort,
+so that per-recording outputs never have to be gathered in memory.
+
+Functions:
+    - band_feature_names: Name the columns holding the output of 'bands_power'.
+
+Classes:
+    - FeatureStore: A columnar store of (recording, channel, feature) values backed by
+    preallocated .npy memmaps.
+
+Dependencies:
+    - numpy
+    - pandas (imported on first use, by 'FeatureStore.frame')
+
+Typical usage example:
+
+    from custom_module import FeatureStore, band_feature_names, bands_power
+    from custom_module import hjorth_2D, hjorth_parameters_names
+
+    features = band_feature_names(bands)+hjorth_parameters_names
+    store = FeatureStore('features/', ch_names, features, capacity=5000)
+    store.write_bands_power('subject_01', bands_power(sig, fs, bands), bands)
+    store.write_hjorth('subject_01', hjorth_2D(sig, 10, ch_names))
+    alpha = store.column('band_8.0_12.0')  # (n_recordings, n_channels) memmap
+"""
+
+from typing import TYPE_CHECKING, Dict, List, Tuple, Union
+import json
+import os
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+def band_feature_names(bands:List[Tuple[float]])->List[str]:
+    """
+    Name the columns holding the output of 'bands_power'.
+
+    Args:
+        bands (List[Tuple[float]]): A list of tuples representing frequency bands of interest.
+
+    Returns:
+        List[str]: One name per band, e.g. 'band_8.0_12.0'.
+    """
+    return [f'band_{float(band[0])}_{float(band[1])}' for band in bands]
+
+class FeatureStore:
+    """
+    A columnar, memory-mapped store of (recording, channel, feature) values.
+
+    Every feature is a column saved as a preallocated .npy file of shape
+    (capacity, n_channels), filled with NaN until written, and every recording owns one row of
+    all columns. Rows are claimed by creating a row marker file exclusively, so several worker
+    processes can append to the same store at once; the store must however be created before
+    the workers open it, and each recording must be written by one process at a time. Columns
+    are read back as memmaps, without copying.
+
+    Attributes:
+        directory (str): The directory holding the store.
+        ch_names (List[str]): The channel names, in column order.
+        features (List[str]): The feature names.
+        capacity (int): The maximum number of recordings.
+        dtype (str): The dtype of the stored values.
+
+    Methods:
+        write(recording, values, feature_names): Write features of a recording.
+        write_bands_power(recording, powers, bands): Write the output of 'bands_power'.
+        write_hjorth(recording, hjorth_df): Write the output of 'hjorth_2D'.
+        recordings(): Return the recordings in row order.
+        column(feature): Return a feature for every recording without copying.
+        load(features): Return several features for every recording without copying.
+        frame(recording): Return the features of one recording as a DataFrame.
+    """
+
+    def __init__(
+            self,directory:Union[str,os.PathLike],ch_names:List[str]=None,
+            features:List[str]=None,capacity:int=None,dtype:str='float64'
+            ):
+        """
+        Open the store in a directory, creating it if it does not exist yet.
+
+        Args:
+            directory (Union[str, os.PathLike]): The directory holding the store.
+            ch_names (List[str], optional): The channel names. Required to create a store.
+            features (List[str], optional): The feature names. Required to create a store.
+            capacity (int, optional): The maximum number of recordings. Required to create a store.
+            dtype (str, optional): The dtype of the stored values. Default is 'float64'.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If the store does not exist and its layout is not fully specified, or if
+            it exists with a different layout.
+        """
+        self.directory = str(directory)
+        schema_path = os.path.join(self.directory,'schema.json')
+        if not os.path.exists(schema_path):
+            if ch_names is None or features is None or capacity is None:
+                raise ValueError("ch_names, features and capacity are needed to create a store")
+            self._create(list(ch_names),list(features),int(capacity),dtype)
+        with open(schema_path) as file:
+            schema = json.load(file)
+        for name, value in (('ch_names',ch_names),('features',features),('capacity',capacity)):
+            if value is not None and schema[name]!=(list(value) if name!='capacity' else value):
+                raise ValueError(f"Store at {self.directory} has a different {name}")
+        self.ch_names = schema['ch_names']
+        self.features = schema['features']
+        self.capacity = schema['capacity']
+        self.dtype = schema['dtype']
+        self._rows = {}
+        self._columns = {}
+
+    def _create(self,ch_names:List[str],features:List[str],capacity:int,dtype:str):
+        """
+        Preallocate the columns and write the schema of a new store.
+
+        Returns:
+            None
+        """
+        os.makedirs(os.path.join(self.directory,'rows'),exist_ok=True)
+        for feature in features:
+            column = np.lib.format.open_memmap(
+                self._column_path(feature),mode='w+',dtype=dtype,
+                shape=(capacity,len(ch_names))
+                )
+            column[:] = np.nan
+            column.flush()
+            del column
+        schema = {'ch_names':ch_names,'features':features,'capacity':capacity,'dtype':dtype}
+        # The schema is written last and atomically, it marks the store as complete
+        temporary_path = os.path.join(self.directory,f'schema.{os.getpid()}.json')
+        with open(temporary_path,'w') as file:
+            json.dump(schema,file)
+        os.replace(temporary_path,os.path.join(self.directory,'schema.json'))
+
+    def _column_path(self,feature:str)->str:
+        return os.path.join(self.directory,f'{feature}.npy')
+
+    def _writable_column(self,feature:str)->np.memmap:
+        if feature not in self._columns:
+            self._columns[feature] = np.load(self._column_path(feature),mmap_mode='r+')
+        return self._columns[feature]
+
+    def _refresh_rows(self):
+        rows_directory = os.path.join(self.directory,'rows')
+        known_rows = set(self._rows.values())
+        for entry in os.scandir(rows_directory):
+            if entry.name.isdigit() and int(entry.name) not in known_rows:
+                with open(entry.path) as file:
+                    self._rows[file.read()] = int(entry.name)
+
+    def _row(self,recording:str)->int:
+        """
+        Return the row of a recording, claiming a new one if it has none.
+
+        Returns:
+            int: The row index of the recording.
+
+        Raises:
+            ValueError: If the store is full.
+        """
+        if recording not in self._rows:
+            self._refresh_rows()
+        while recording not in self._rows:
+            row = len(self._rows)
+            if row>=self.capacity:
+                raise ValueError(f"Store at {self.directory} is full ({self.capacity} recordings)")
+            # The marker is written aside and linked into place, which fails atomically if
+            # another process claimed the row first, so readers never see a partial marker
+            temporary_path = os.path.join(self.directory,'rows',f'claim.{os.getpid()}')
+            with open(temporary_path,'w') as file:
+                file.write(recording)
+            try:
+                os.link(temporary_path,os.path.join(self.directory,'rows',str(row)))
+            except FileExistsError:
+                self._refresh_rows()
+                continue
+            finally:
+                os.remove(temporary_path)
+            self._rows[recording] = row
+        return self._rows[recording]
+
+    def write(self,recording:str,values:np.ndarray,feature_names:List[str]):
+        """
+        Write features of a recording.
+
+        Args:
+            recording (str): The recording identifier.
+            values (np.ndarray): Values of shape (n_channels, len(feature_names)).
+            feature_names (List[str]): The features held by the columns of 'values'.
+
+        Returns:
+            None
+        """
+        values = np.asarray(values)
+        assert values.shape==(len(self.ch_names),len(feature_names))
+        row = self._row(recording)
+        for feature_no,feature in enumerate(feature_names):
+            column = self._writable_column(feature)
+            column[row] = values[:,feature_no]
+            column.flush()
+
+    def write_bands_power(self,recording:str,powers:np.ndarray,bands:List[Tuple[float]]):
+        """
+        Write the output of 'bands_power' for a recording.
+
+        Args:
+            recording (str): The recording identifier.
+            powers (np.ndarray): The band powers, of shape (n_channels, len(bands)).
+            bands (List[Tuple[float]]): The frequency bands the powers were computed for.
+
+        Returns:
+            None
+        """
+        self.write(recording,powers,band_feature_names(bands))
+
+    def write_hjorth(self,recording:str,hjorth_df:'pd.DataFrame'):
+        """
+        Write the output of 'hjorth_2D' for a recording.
+
+        Args:
+            recording (str): The recording identifier.
+            hjorth_df (pd.DataFrame): The Hjorth parameters of each channel.
+
+        Returns:
+            None
+        """
+        if hjorth_df.index.dtype==object:
+            hjorth_df = hjorth_df.loc[self.ch_names]
+        self.write(recording,hjorth_df.values,list(hjorth_df.columns))
+
+    def recordings(self)->List[str]:
+        """
+        Return the recordings written so far, in row order.
+
+        Returns:
+            List[str]: The recording identifiers; entry ``i`` owns row ``i`` of every column.
+        """
+        self._refresh_rows()
+        return sorted(self._rows,key=self._rows.get)
+
+    def column(self,feature:str)->np.memmap:
+        """
+        Return a feature for every recording written so far, without copying.
+
+        Args:
+            feature (str): The feature name.
+
+        Returns:
+            np.memmap: Read-only values of shape (len(recordings()), n_channels).
+        """
+        n_rows = len(self.recordings())
+        return np.load(self._column_path(feature),mmap_mode='r')[:n_rows]
+
+    def load(self,features:List[str]=None)->Dict[str,np.memmap]:
+        """
+        Return several features for every recording written so far, without copying.
+
+        Args:
+            features (List[str], optional): The feature names. Default is None, which loads
+            every feature.
+
+        Returns:
+            Dict[str, np.memmap]: Read-only values of shape (len(recordings()), n_channels)
+            for each feature.
+        """
+        features = self.features if features is None else features
+        return {feature:self.column(feature) for feature in features}
+
+    def frame(self,recording:str)->'pd.DataFrame':
+        """
+        Return the features of one recording as a DataFrame.
+
+        Args:
+            recording (str): The recording identifier.
+
+        Returns:
+            pd.DataFrame: DataFrame of the features (columns) of each channel (rows).
+        """
+        import pandas as pd
+
+        self._refresh_rows()
+        row = self._rows[recording]
+        return pd.DataFrame(
+            {feature:self.column(feature)[row] for feature in self.features},
+            index=self.ch_names
+            )
@@ -0,0 +1,382 @@
+"""
+Streaming Features Module
+
+This module provides stateful estimators that compute EEG features on live streams,
+one chunk of samples at a time, instead of on a whole finished recording.
+
+Classes:
+    - StreamingBandPower: Computes per-channel band powers with an incremental Welch estimate
+    over a ring buffer of samples.
+    - StreamingHjorth: Tracks per-channel Hjorth parameters with running (Welford) and
+    exponentially decayed statistics.
+
+Dependencies:
+    - numpy
+    - pandas (imported on first use, by 'StreamingHjorth')
+    - frequency (from .frequency)
+    - time (from .time)
+
+Typical usage example:
+
+    import numpy as np
+    from custom_module import StreamingBandPower
+
+    bands = [(8, 12), (13, 30)]  # Define frequency bands
+    estimator = StreamingBandPower(16, 125, bands)
+    for chunk in stream:  # chunks of shape (16, n_samples)
+        powers = estimator.update(chunk)  # shape (n_hops, 16, len(bands))
+"""
+
+from typing import TYPE_CHECKING, List, Tuple, Union
+import numpy as np
+
+from .frequency import _band_weights, _periodogram
+from .time import hjorth_parameters_names
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+class StreamingBandPower:
+    """
+    Incremental Welch band-power estimator for live multichannel streams.
+
+    Incoming samples are written into a preallocated ring buffer holding one Welch segment
+    per channel. Every ``hop`` samples the latest segment is transformed once and its
+    periodogram replaces the oldest of the ``n_segments`` periodograms kept in a second ring,
+    while a running sum of that ring is updated. Band powers are then read from the running
+    mean with the cached band-averaging matrix of 'spectral_engine', so an update costs one
+    segment FFT regardless of how many segments the Welch window averages over.
+
+    Segment length, overlap, window and scaling follow 'spectral_engine' with the 'welch'
+    method and 'mean' averaging: once ``n_segments`` segments have been seen, the emitted
+    values match 'bands_power' on the last ``nperseg + (n_segments-1)*hop`` samples.
+
+    Attributes:
+        n_channels (int): Number of channels in the stream.
+        sampling_frequency (int): The sampling frequency of the stream.
+        bands (List[Tuple[float]]): The frequency bands of interest.
+        nperseg (int): Welch segment length, in samples.
+        hop (int): Samples between consecutive segments (and emitted values).
+        n_segments (int): Number of segments averaged in the Welch estimate.
+
+    Methods:
+        update(chunk): Ingest a chunk of samples and return the band powers of every
+        completed hop.
+        reset(): Clear the buffers.
+    """
+
+    def __init__(
+            self,n_channels:int,sampling_frequency:int,bands:List[Tuple[float]],
+            nperseg:int=None,noverlap:int=None,n_segments:int=8
+            ):
+        """
+        Initialize the StreamingBandPower object.
+
+        Args:
+            n_channels (int): Number of channels in the stream.
+            sampling_frequency (int): The sampling frequency of the stream.
+            bands (List[Tuple[float]]): A list of tuples representing frequency bands of interest.
+            nperseg (int, optional): Welch segment length, in samples. Default is None, which
+            uses one second of data as 'spectral_engine' does.
+            noverlap (int, optional): Overlap between segments, in samples. Default is None,
+            which uses ``nperseg // 8`` as 'spectral_engine' does.
+            n_segments (int, optional): Number of segments averaged in the Welch estimate.
+            Default is 8.
+
+        Returns:
+            None
+        """
+        self.n_channels = n_channels
+        self.sampling_frequency = sampling_frequency
+        self.bands = bands
+        self.nperseg = int(sampling_frequency) if nperseg is None else int(nperseg)
+        noverlap = self.nperseg//8 if noverlap is None else int(noverlap)
+        assert 0<=noverlap<self.nperseg
+        self.hop = self.nperseg-noverlap
+        assert n_segments>=1
+        self.n_segments = n_segments
+
+        self._weights = _band_weights(
+            float(sampling_frequency),self.nperseg,
+            tuple((float(band[0]),float(band[1])) for band in bands)
+            )
+        self._samples = np.zeros((n_channels,self.nperseg))
+        self._periodograms = np.zeros((n_segments,n_channels,self._weights.shape[1]))
+        self._periodograms_sum = np.zeros((n_channels,self._weights.shape[1]))
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the sample and periodogram buffers.
+
+        Returns:
+            None
+        """
+        self._samples[:] = 0
+        self._periodograms[:] = 0
+        self._periodograms_sum[:] = 0
+        self._write_index = 0
+        self._n_periodograms = 0
+        self._until_next_segment = self.nperseg
+
+    def update(self,chunk:np.ndarray)->np.ndarray:
+        """
+        Ingest a chunk of samples and return the band powers of every completed hop.
+
+        Args:
+            chunk (np.ndarray): New samples of shape (n_channels, n_samples).
+
+        Returns:
+            np.ndarray: The log10 of the power within each band, of shape
+            (n_hops, n_channels, len(bands)), where ``n_hops`` is the number of segments
+            completed by this chunk (possibly zero).
+        """
+        chunk = np.asarray(chunk,dtype=float)
+        assert chunk.ndim==2 and chunk.shape[0]==self.n_channels
+
+        powers = []
+        position = 0
+        while position<chunk.shape[1]:
+            n_new = min(chunk.shape[1]-position,self._until_next_segment)
+            self._write(chunk[:,position:position+n_new])
+            position += n_new
+            self._until_next_segment -= n_new
+            if self._until_next_segment==0:
+                powers.append(self._push_segment())
+                self._until_next_segment = self.hop
+
+        if len(powers)==0:
+            return np.empty((0,self.n_channels,len(self.bands)))
+        return np.log10(np.stack(powers))
+
+    def _write(self,samples:np.ndarray):
+        """
+        Write samples into the ring buffer, wrapping around its end.
+
+        Args:
+            samples (np.ndarray): Samples of shape (n_channels, n) with ``n <= nperseg``.
+
+        Returns:
+            None
+        """
+        n_new = samples.shape[1]
+        first = min(n_new,self.nperseg-self._write_index)
+        self._samples[:,self._write_index:self._write_index+first] = samples[:,:first]
+        self._samples[:,:n_new-first] = samples[:,first:]
+        self._write_index = (self._write_index+n_new)%self.nperseg
+
+    def _push_segment(self)->np.ndarray:
+        """
+        Transform the latest segment and update the running Welch estimate.
+
+        Returns:
+            np.ndarray: The linear power within each band, of shape (n_channels, len(bands)).
+        """
+        segment = np.roll(self._samples,-self._write_index,axis=1)
+        periodogram = _periodogram(segment,self.sampling_frequency)
+
+        slot = self._n_periodograms%self.n_segments
+        self._periodograms_sum += periodogram-self._periodograms[slot]
+        self._periodograms[slot] = periodogram
+        if slot==self.n_segments-1:
+            # Resum once per full turn of the ring so rounding errors do not accumulate
+            self._periodograms.sum(axis=0,out=self._periodograms_sum)
+        self._n_periodograms += 1
+
+        count = min(self._n_periodograms,self.n_segments)
+        return (self._periodograms_sum/count) @ self._weights.T
+
+class StreamingHjorth:
+    """
+    Online Hjorth parameter tracker for live multichannel streams.
+
+    Samples are consumed chunk by chunk and split into consecutive segments of
+    ``segment_size`` samples, as in 'hjorth_parameters_computation'. Only the running sums of
+    x, x², Δx, (Δx)², Δ²x and (Δ²x)² of the current segment and its last two samples are
+    carried between chunks, so the differences stay exact across chunk boundaries. Each
+    completed segment updates a Welford mean/variance of activity, mobility and complexity
+    per channel, and an exponentially decayed mean/variance for dashboards. Memory is
+    O(channels) and does not grow with the length of the stream.
+
+    After the whole recording has been streamed, 'parameters' matches 'hjorth_2D' on the
+    same data.
+
+    Attributes:
+        n_channels (int): Number of channels in the stream.
+        segment_size (int): Segment size for computing Hjorth parameters.
+        alpha (float): Weight of the newest segment in the exponentially decayed statistics.
+        ch_names (List[str]): Channel names used as the index of the returned DataFrames.
+        n_segments (int): Number of segments completed so far.
+
+    Methods:
+        update(chunk): Ingest a chunk of samples.
+        parameters(): Hjorth parameters over every segment seen so far.
+        windowed_parameters(): Exponentially decayed Hjorth parameters.
+        reset(): Clear the running statistics.
+    """
+
+    def __init__(
+            self,n_channels:int,segment_size:int=10,alpha:float=0.05,
+            ch_names:Union[List,np.ndarray]=None
+            ):
+        """
+        Initialize the StreamingHjorth object.
+
+        Args:
+            n_channels (int): Number of channels in the stream.
+            segment_size (int, optional): Segment size for computing Hjorth parameters.
+            Default is 10.
+            alpha (float, optional): Weight of the newest segment in the exponentially
+            decayed statistics, between 0 and 1. Default is 0.05.
+            ch_names (Union[List, np.ndarray], optional): List of channel names. Default is None.
+
+        Returns:
+            None
+        """
+        assert segment_size>=3
+        assert 0<alpha<=1
+        if ch_names is not None:
+            assert len(ch_names)==n_channels
+        self.n_channels = n_channels
+        self.segment_size = segment_size
+        self.alpha = alpha
+        self.ch_names = ch_names
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the running statistics and the current segment.
+
+        Returns:
+            None
+        """
+        # Sums of x, x², Δx, (Δx)², Δ²x and (Δ²x)² over the current segment
+        self._segment_sums = np.zeros((self.n_channels,6))
+        self._last_samples = np.zeros((self.n_channels,2))
+        self._position = 0
+        self.n_segments = 0
+        self._mean = np.zeros((self.n_channels,3))
+        self._m2 = np.zeros((self.n_channels,3))
+        self._ew_mean = np.zeros((self.n_channels,3))
+        self._ew_var = np.zeros((self.n_channels,3))
+
+    def update(self,chunk:np.ndarray)->int:
+        """
+        Ingest a chunk of samples.
+
+        Args:
+            chunk (np.ndarray): New samples of shape (n_channels, n_samples).
+
+        Returns:
+            int: Number of segments completed by this chunk.
+        """
+        chunk = np.asarray(chunk,dtype=float)
+        assert chunk.ndim==2 and chunk.shape[0]==self.n_channels
+        n_samples = chunk.shape[1]
+        if n_samples==0:
+            return 0
+
+        extended = np.concatenate((self._last_samples,chunk),axis=1)
+        first_diff = np.diff(extended,axis=1)
+        second_diff = np.diff(first_diff,axis=1)
+        first_diff = first_diff[:,1:]
+
+        # Differences that would reach into the previous segment do not count
+        positions = (self._position+np.arange(n_samples))%self.segment_size
+        first_diff = np.where(positions>=1,first_diff,0)
+        second_diff = np.where(positions>=2,second_diff,0)
+        terms = np.stack(
+            (chunk,chunk**2,first_diff,first_diff**2,second_diff,second_diff**2),axis=-1
+            )
+
+        starts = np.flatnonzero(positions==0)
+        if starts.size==0 or starts[0]!=0:
+            starts = np.concatenate(([0],starts))
+        sums = np.add.reduceat(terms,starts,axis=1)
+        sums[:,0] += self._segment_sums
+
+        self._position = (self._position+n_samples)%self.segment_size
+        n_completed = sums.shape[1]-(self._position!=0)
+        self._segment_sums = sums[:,-1] if self._position!=0 else np.zeros_like(self._segment_sums)
+        self._last_samples = extended[:,-2:]
+
+        if n_completed>0:
+            lengths = np.array([self.segment_size,self.segment_size-1,self.segment_size-2])
+            completed = sums[:,:n_completed]
+            means = completed[...,0::2]/lengths
+            variances = np.maximum(completed[...,1::2]/lengths-means**2,0)
+            self._update_statistics(variances)
+        return n_completed
+
+    def _update_statistics(self,variances:np.ndarray):
+        """
+        Merge the Hjorth values of newly completed segments into the running statistics.
+
+        Args:
+            variances (np.ndarray): Activity, mobility and complexity of shape
+            (n_channels, n_new_segments, 3).
+
+        Returns:
+            None
+        """
+        n_new = variances.shape[1]
+        new_mean = variances.mean(axis=1)
+        new_m2 = ((variances-new_mean[:,np.newaxis])**2).sum(axis=1)
+        total = self.n_segments+n_new
+        delta = new_mean-self._mean
+        self._mean += delta*n_new/total
+        self._m2 += new_m2+delta**2*self.n_segments*n_new/total
+
+        for segment_no in range(n_new):
+            if self.n_segments+segment_no==0:
+                self._ew_mean = variances[:,0].copy()
+                continue
+            delta = variances[:,segment_no]-self._ew_mean
+            self._ew_mean += self.alpha*delta
+            self._ew_var = (1-self.alpha)*(self._ew_var+self.alpha*delta**2)
+        self.n_segments = total
+
+    def _to_frame(self,mean:np.ndarray,std:np.ndarray)->'pd.DataFrame':
+        """
+        Arrange per-channel means and standard deviations like 'hjorth_2D'.
+
+        Args:
+            mean (np.ndarray): Means of shape (n_channels, 3).
+            std (np.ndarray): Standard deviations of shape (n_channels, 3).
+
+        Returns:
+            pd.DataFrame: DataFrame containing Hjorth parameters for each channel.
+        """
+        import pandas as pd
+
+        if self.n_segments==0:
+            mean = np.full_like(mean,np.nan)
+            std = np.full_like(std,np.nan)
+        return pd.DataFrame(
+            np.concatenate((mean,std),axis=1),
+            columns=hjorth_parameters_names,index=self.ch_names
+            )
+
+    def parameters(self)->'pd.DataFrame':
+        """
+        Return the Hjorth parameters over every segment completed so far.
+
+        Returns:
+            pd.DataFrame: DataFrame containing Hjorth parameters for each channel, with the
+            same layout and values as 'hjorth_2D' on the streamed samples.
+        """
+        std = np.sqrt(self._m2/max(self.n_segments,1))
+        return self._to_frame(self._mean.copy(),std)
+
+    def windowed_parameters(self)->'pd.DataFrame':
+        """
+        Return the exponentially decayed Hjorth parameters.
+
+        Each segment weighs ``alpha`` times the previous one less, giving an effective window of
+        about ``1/alpha`` segments.
+
+        Returns:
+            pd.DataFrame: DataFrame containing the decayed mean and standard deviation of the
+            Hjorth parameters for each channel.
+        """
+        return self._to_frame(self._ew_mean.copy(),np.sqrt(self._ew_var))
@@ -6,38 +6,128 @@ including spectral analysis,time-domain analysis, and computation of
 Hjorth parameters.
 
 Functions:
+    - spectral_engine: Computes the spectrum once and the power within every frequency band.
     - band_power: Computes the power within a specified frequency band.
     - bands_power: Computes the power within multiple frequency bands.
     - compute_psd: Computes the power spectral density (PSD).
+    - epochs_bands_power: Computes the power within multiple frequency bands for every epoch.
+    - hjorth_batch: Computes Hjorth parameters for a batch of recordings.
+    - hjorth_multiscale: Computes Hjorth parameters for several segment sizes and hop lengths.
     - hjorth_parameters_computation: Computes Hjorth parameters for EEG data.
     - hjorth_2D: Computes Hjorth parameters for 2D EEG data.
+    - StreamingBandPower: Computes band powers incrementally on a live stream.
+    - StreamingHjorth: Tracks Hjorth parameters incrementally on a live stream.
+    - FeatureStore: Stores cohort features in memory-mapped columns.
+    - FeaturePipeline: Extracts several features sharing their derived signals.
+    - covariance_engine: Computes the covariance and correlation of one or more recordings.
+    - rolling_covariance: Computes the covariance or correlation of sliding windows.
+    - RollingCovariance: Maintains the covariance of the latest samples of a stream.
 
 Tests:
+    - test_spectral_engine: Test the vectorized band reduction of 'spectral_engine'.
     - test_band_power_method: Test different method and averaging type combinations 
     for 'band_power' function.
     - test_bands_power: Test different method and averaging type combinations 
     for 'bands_power' function.
     - test_compute_psd: Test the 'compute_psd' function.
+    - test_psd_backends: Test the 'welch_fast' and 'multitaper' spectral estimators.
+    - test_epochs_bands_power: Test 'epochs_bands_power' against 'bands_power' on each epoch.
     - test_hjorth_method: Test the 'hjorth_parameters_computation' function.
     - test_hjorth_2D: Test the 'hjorth_2D' function.
+    - test_hjorth_batch: Test the 'hjorth_batch' function against per-channel computation.
+    - test_hjorth_multiscale: Test the 'hjorth_multiscale' function with and without overlap.
+    - test_streaming_band_power: Test 'StreamingBandPower' against 'bands_power'.
+    - test_streaming_hjorth: Test 'StreamingHjorth' against 'hjorth_2D'.
+    - test_feature_store: Test writing 'bands_power' and 'hjorth_2D' outputs to 'FeatureStore'.
+    - test_feature_pipeline: Test 'FeaturePipeline' against the standalone feature functions.
+    - test_float32_policy: Test the float32 precision policy against float64 results.
+    - test_covariance_engine: Test 'covariance_engine' against np.cov and np.corrcoef.
+    - test_rolling_covariance: Test 'rolling_covariance' and 'RollingCovariance' against
+    np.cov on each window.
+    - test_lazy_imports: Test that importing a feature module does not load heavy dependencies.
+    - test_lazy_import_on_use: Test that calling a feature function loads its dependencies.
 
 Fixtures:
     - hjorth_segment_size: Fixture providing the segment size for computing Hjorth parameters.
 
 Dependencies:
+    - os
+    - subprocess
+    - sys
     - pytest
     - numpy
     - pandas
+    - mne
     - frequency (from .frequency)
     - time (from .time)
+    - streaming (from .streaming)
+    - store (from .store)
+    - feature_pipeline (from .feature_pipeline)
+    - precision (from .precision)
+    - covariance (from .covariance)
 
 """
 
+import os
+import subprocess
+import sys
 import pytest
 import numpy as np
 import pandas as pd
-from .frequency import band_power, bands_power, compute_psd
-from .time import hjorth_parameters_computation, hjorth_2D
+import mne
+from .frequency import (
+    spectral_engine, band_power, bands_power, compute_psd, epochs_bands_power,
+    psd_backends, register_psd_backend, _dpss_tapers
+)
+from .streaming import StreamingBandPower, StreamingHjorth
+from .store import FeatureStore, band_feature_names
+from .precision import dtype_policy, get_dtype, set_dtype
+from .covariance import covariance_engine, rolling_covariance, RollingCovariance
+from .feature_pipeline import (
+    DerivedSignals, FeaturePipeline, extract_bands_power, extract_relative_bands_power,
+    extract_hjorth, extract_covariance, extract_correlation
+)
+from .time import hjorth_parameters_computation, hjorth_2D, hjorth_batch, hjorth_multiscale, hjorth_parameters_names
+
+@pytest.mark.parametrize(
+        "method_, avg_type_", 
+        [("welch","mean"),("welch","median"),("medfilt","mean"),("medfilt","median")]
+        )
+def test_spectral_engine(sampling_frequency,bands,method_,avg_type_):
+    """
+    Test that 'spectral_engine' reduces all bands at once to the per-band mean of the
+    spectrum, and that 'band_power' agrees, for both 2D and 1D signals.
+
+    Args:
+        sampling_frequency: The sampling frequency of the EEG data.
+        bands: The frequency bands of interest.
+        method_ (str): The method used for spectral estimation.
+        avg_type_ (str): The type of averaging to apply.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the band powers have an unexpected shape or differ from the
+        per-band results.
+    """
+    sig = np.random.randn(4,sampling_frequency*8)
+    for sig_ in (sig,sig[0]):
+        freqs, spectrum, powers = spectral_engine(sig_,sampling_frequency,bands,method_,avg_type_)
+        assert spectrum.shape[-1]==freqs.shape[0]
+        assert powers.shape==sig_.shape[:-1]+(len(bands),)
+        for band_no,band in enumerate(bands):
+            if method_=='welch':
+                expected = spectrum[...,(freqs>=band[0]) & (freqs<=band[1])].mean(axis=-1)
+            else:
+                expected = spectrum.mean(axis=-1)
+            assert np.allclose(powers[...,band_no],expected)
+            assert np.allclose(
+                np.log10(expected),
+                band_power(sig_,sampling_frequency,band,method_,avg_type_)
+                )
+    with pytest.raises(ValueError):
+        spectral_engine(sig,sampling_frequency,bands,'wavelet')
 
 @pytest.mark.parametrize(
         "method_, avg_type_", 
@@ -135,6 +225,77 @@ def test_compute_psd(eeg_data,sampling_frequency):
     assert spectrum.ndim==eeg_data.ndim
     assert spectrum.shape[-1]==freqs.shape[0]
 
+def test_psd_backends(sampling_frequency,no_channels,bands):
+    """
+    Test the spectral estimators selectable through the 'method' argument.
+
+    Args:
+        sampling_frequency: The sampling frequency of the EEG data.
+        no_channels: The number of EEG channels.
+        bands: The frequency bands of interest.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If 'welch_fast' differs from 'welch', if 'multitaper' does not
+        recover the flat spectrum of white noise, if the tapers are not reused, or if a
+        registered backend is not selectable.
+    """
+    data = np.random.randn(no_channels,sampling_frequency*60)
+    for avg_type_ in ("mean","median"):
+        assert np.allclose(
+            bands_power(data,sampling_frequency,bands,'welch_fast',avg_type_,workers=2),
+            bands_power(data,sampling_frequency,bands,'welch',avg_type_)
+            )
+
+    _dpss_tapers.cache_clear()
+    for _ in range(2):
+        spectrum, freqs = compute_psd(data,sampling_frequency,'multitaper',bandwidth=3)
+    assert _dpss_tapers.cache_info().hits == 1
+    assert spectrum.shape == (no_channels,freqs.shape[0])
+    white_noise_power = np.log10(2/sampling_frequency)
+    assert np.allclose(
+        bands_power(data,sampling_frequency,bands,'multitaper'),white_noise_power,atol=0.1
+        )
+
+    register_psd_backend('welch_copy',psd_backends['welch'])
+    assert np.allclose(
+        bands_power(data,sampling_frequency,bands,'welch_copy'),
+        bands_power(data,sampling_frequency,bands)
+        )
+    del psd_backends['welch_copy']
+
+@pytest.mark.parametrize("avg_type_",["mean","median"])
+def test_epochs_bands_power(sampling_frequency,no_channels,bands,avg_type_):
+    """
+    Test the 'epochs_bands_power' function.
+
+    Args:
+        sampling_frequency: The sampling frequency of the EEG data.
+        no_channels: The number of EEG channels.
+        bands: The frequency bands of interest.
+        avg_type_ (str): The type of averaging to apply.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the number of epochs is wrong or if an epoch differs from
+        'bands_power' on the same samples, or if missing bands are accepted.
+    """
+    data = np.random.randn(no_channels,sampling_frequency*30)
+    powers = epochs_bands_power(data,sampling_frequency,bands,avg_type=avg_type_)
+    assert powers.shape == (29,no_channels,len(bands))
+    for epoch_no in (0,13,28):
+        start = epoch_no*sampling_frequency
+        epoch = data[:,start:start+2*sampling_frequency]
+        assert np.allclose(
+            powers[epoch_no],bands_power(epoch,sampling_frequency,bands,'welch',avg_type_)
+            )
+    with pytest.raises(ValueError):
+        epochs_bands_power(data,sampling_frequency)
+
 @pytest.fixture
 def hjorth_segment_size():
     return 10
@@ -194,3 +355,411 @@ def test_hjorth_2D(eeg_data,hjorth_segment_size,openBCI_16channels):
     hjorth_df = hjorth_2D(eeg_data,hjorth_segment_size,openBCI_16channels)
     assert isinstance(hjorth_df,pd.DataFrame)
     # assert hjorth_df.isin([np.nan, np.inf, -np.inf]).sum().sum() == 0
+
+
+def test_hjorth_batch(hjorth_segment_size):
+    """
+    Test the 'hjorth_batch' function.
+
+    Args:
+        hjorth_segment_size: The segment size for computing Hjorth parameters.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the batched results have an unexpected shape or differ from
+        a per-segment computation of the same statistics, or if 'hjorth_parameters_computation'
+        changed its results.
+    """
+    data = np.random.randn(3,4,hjorth_segment_size*20+3)
+    hjorth_results = hjorth_batch(data,hjorth_segment_size)
+    assert hjorth_results.shape == (3,4,len(hjorth_parameters_names))
+
+    channel = data[1,2]
+    segments = [
+        channel[start:start+hjorth_segment_size]
+        for start in range(0,hjorth_segment_size*20,hjorth_segment_size)
+        ]
+    activities = [np.var(segment) for segment in segments]
+    mobilities = [np.var(np.diff(segment)) for segment in segments]
+    complexities = [np.var(np.diff(np.diff(segment))) for segment in segments]
+    expected = [
+        np.mean(activities),np.mean(mobilities),np.mean(complexities),
+        np.std(activities),np.std(mobilities),np.std(complexities)
+        ]
+    assert np.allclose(hjorth_results[1,2],expected)
+    channel_results = hjorth_parameters_computation(channel,hjorth_segment_size)
+    assert np.allclose([channel_results[name] for name in hjorth_parameters_names],expected)
+
+    # 2D input keeps the original meaning of blocks of rows reduced as a whole
+    blocks = [data[0][start:start+2] for start in (0,2)]
+    block_results = hjorth_parameters_computation(data[0],2)
+    assert np.isclose(block_results['mean_activity'],np.mean([np.var(block) for block in blocks]))
+
+    hjorth_df = hjorth_2D(data[0],hjorth_segment_size)
+    assert list(hjorth_df.columns) == hjorth_parameters_names
+    assert np.allclose(hjorth_df.values,hjorth_results[0])
+
+def test_hjorth_multiscale():
+    """
+    Test the 'hjorth_multiscale' function.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the non-overlapping summaries differ from 'hjorth_batch', if an
+        overlapping segment differs from a direct computation on that segment, or if a NumPy
+        integer hop is rejected.
+    """
+    data = np.random.randn(4,1000)*20+50
+    window_sizes = [10,25,125]
+
+    summaries = hjorth_multiscale(data,window_sizes,summary=True)
+    for window_size in window_sizes:
+        assert np.allclose(summaries[(window_size,window_size)],hjorth_batch(data,window_size))
+
+    scales = hjorth_multiscale(data,window_sizes,hop_lengths=[1,5,50])
+    assert scales[(25,5)].shape == (4,len(range(0,1000-25+1,5)),3)
+    segment = data[3,5*7:5*7+25]
+    expected = [np.var(segment),np.var(np.diff(segment)),np.var(np.diff(np.diff(segment)))]
+    assert np.allclose(scales[(25,5)][3,7],expected)
+
+    scales = hjorth_multiscale(data,window_sizes[:2],hop_lengths=np.int64(5))
+    assert list(scales) == [(10,5),(25,5)]
+    assert np.allclose(scales[(25,5)][3,7],expected)
+
+def test_streaming_band_power(sampling_frequency,no_channels,bands):
+    """
+    Test the 'StreamingBandPower' class.
+
+    Args:
+        sampling_frequency: The sampling frequency of the EEG data.
+        no_channels: The number of EEG channels.
+        bands: The frequency bands of interest.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the number of emitted values is wrong or if a value differs from
+        'bands_power' on the samples covered by the Welch window.
+    """
+    data = np.random.randn(no_channels,sampling_frequency*30)
+    estimator = StreamingBandPower(no_channels,sampling_frequency,bands,n_segments=4)
+
+    chunks = np.array_split(data,np.cumsum(np.random.randint(1,50,size=200)),axis=1)
+    powers = np.concatenate([estimator.update(chunk) for chunk in chunks])
+    assert powers.shape == (
+        (data.shape[1]-estimator.nperseg)//estimator.hop+1,no_channels,len(bands)
+        )
+
+    window_length = estimator.nperseg+(estimator.n_segments-1)*estimator.hop
+    for hop_no in (estimator.n_segments-1,powers.shape[0]-1):
+        end = estimator.nperseg+hop_no*estimator.hop
+        expected = bands_power(data[:,end-window_length:end],sampling_frequency,bands)
+        assert np.allclose(powers[hop_no],expected)
+
+    estimator.reset()
+    assert estimator.update(data[:,:estimator.nperseg-1]).shape == (0,no_channels,len(bands))
+
+def test_streaming_hjorth(no_channels,hjorth_segment_size,openBCI_16channels):
+    """
+    Test the 'StreamingHjorth' class.
+
+    Args:
+        no_channels: The number of EEG channels.
+        hjorth_segment_size: The segment size for computing Hjorth parameters.
+        openBCI_16channels: The channel names of the OpenBCI 16-channel cap.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the streamed parameters differ from 'hjorth_2D' on the same data
+        or if the windowed parameters are not finite.
+    """
+    data = np.random.randn(no_channels,hjorth_segment_size*300+7)*10+200
+    tracker = StreamingHjorth(no_channels,hjorth_segment_size,ch_names=openBCI_16channels)
+    chunks = np.array_split(data,np.cumsum(np.random.randint(0,35,size=300)),axis=1)
+    assert sum(tracker.update(chunk) for chunk in chunks) == 300
+
+    expected = hjorth_2D(data,hjorth_segment_size,openBCI_16channels)
+    hjorth_df = tracker.parameters()
+    assert list(hjorth_df.index) == openBCI_16channels
+    assert list(hjorth_df.columns) == list(expected.columns)
+    assert np.allclose(hjorth_df.values,expected.values)
+    assert np.isfinite(tracker.windowed_parameters().values).all()
+
+def test_feature_store(eeg_data,sampling_frequency,bands,openBCI_16channels,tmp_path):
+    """
+    Test the 'FeatureStore' class.
+
+    Args:
+        eeg_data: The EEG data for testing.
+        sampling_frequency: The sampling frequency of the EEG data.
+        bands: The frequency bands of interest.
+        openBCI_16channels: The channel names of the OpenBCI 16-channel cap.
+        tmp_path: Temporary directory provided by pytest.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the stored values differ from the written outputs, if columns are
+        not memory-mapped, or if a reopened store does not see the written recordings.
+    """
+    features = band_feature_names(bands)+hjorth_parameters_names
+    store = FeatureStore(tmp_path,openBCI_16channels,features,capacity=4)
+    data = np.random.randn(2,len(openBCI_16channels),sampling_frequency*10)
+    for recording_no,recording in enumerate(['first','second']):
+        store.write_bands_power(
+            recording,bands_power(data[recording_no],sampling_frequency,bands),bands
+            )
+        store.write_hjorth(recording,hjorth_2D(data[recording_no],10,openBCI_16channels))
+
+    reopened = FeatureStore(tmp_path)
+    assert reopened.recordings() == ['first','second']
+    column = reopened.column(band_feature_names(bands)[2])
+    assert isinstance(column,np.memmap)
+    assert np.allclose(
+        column[1],bands_power(data[1],sampling_frequency,bands)[:,2]
+        )
+    hjorth_df = hjorth_2D(data[0],10,openBCI_16channels)
+    assert np.allclose(reopened.frame('first')[hjorth_parameters_names].values,hjorth_df.values)
+    assert set(reopened.load(hjorth_parameters_names[:2])) == set(hjorth_parameters_names[:2])
+    with pytest.raises(ValueError):
+        FeatureStore(tmp_path,openBCI_16channels[:4],features,capacity=4)
+
+def test_feature_pipeline(sampling_frequency,bands,openBCI_16channels):
+    """
+    Test that 'FeaturePipeline' matches the standalone feature functions and derives the
+    spectrum and the covariance a single time.
+
+    Args:
+        sampling_frequency: The sampling frequency of the EEG data.
+        bands: The frequency bands of interest.
+        openBCI_16channels: The channel names of the OpenBCI 16-channel cap.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the features, their names or the derived quantities are unexpected,
+        if a recording is not analysed at its own sampling frequency, or if spectra with
+        unhashable keyword arguments are not memoized.
+    """
+    sig = np.random.randn(len(openBCI_16channels),sampling_frequency*10)
+    pipeline = FeaturePipeline('features',[
+        (extract_bands_power,{'bands':bands}),
+        (extract_relative_bands_power,{'bands':bands}),
+        (extract_hjorth,{'segment_size':10}),
+        (extract_covariance,{'ch_names':openBCI_16channels}),
+        (extract_correlation,),
+    ],sampling_frequency)
+    features = pipeline.forward(sig)
+    n_channels = len(openBCI_16channels)
+    assert features.shape == (n_channels,2*len(bands)+len(hjorth_parameters_names)+2*n_channels)
+    assert len(pipeline.feature_names) == features.shape[1]
+    assert pipeline.feature_names[:len(bands)] == band_feature_names(bands)
+    assert pipeline.feature_names[2*len(bands)+len(hjorth_parameters_names)] == 'covariance_Fp1'
+
+    powers = bands_power(sig,sampling_frequency,bands)
+    expected = np.concatenate((
+        powers,
+        10**powers/(10**powers).sum(axis=-1,keepdims=True),
+        hjorth_batch(sig,10),
+        np.cov(sig),
+        np.corrcoef(sig),
+    ),axis=-1)
+    assert np.allclose(features,expected)
+    assert [key[0] for key in pipeline.computed] == [
+        'spectrum','segment_differences','centered','covariance'
+        ]
+
+    info = mne.create_info(openBCI_16channels,2*sampling_frequency,ch_types='eeg')
+    raw = mne.io.RawArray(sig,info,verbose=False)
+    raw_features = pipeline.forward(raw)
+    raw_powers = bands_power(sig,2*sampling_frequency,bands)
+    assert np.allclose(raw_features[:,:len(bands)],raw_powers)
+
+    signals = DerivedSignals(sig,sampling_frequency)
+    window = np.hanning(sampling_frequency)
+    spectrum = signals.spectrum(window=window,f_range=[1,40])[1]
+    assert signals.spectrum(window=window.copy(),f_range=[1,40])[1] is spectrum
+    assert signals.spectrum(window=np.hamming(sampling_frequency),f_range=[1,40])[1] is not spectrum
+    assert len(signals.computed) == 2
+
+@pytest.mark.parametrize("method_",["welch","medfilt","welch_fast","multitaper"])
+def test_float32_policy(sampling_frequency,no_channels,bands,method_):
+    """
+    Test that a float32 precision policy keeps the features in float32 and close to their
+    float64 values.
+
+    Args:
+        sampling_frequency: The sampling frequency of the EEG data.
+        no_channels: The number of EEG channels.
+        bands: The frequency bands of interest.
+        method_ (str): The method used for spectral estimation.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If a feature is upcast, differs too much from float64, or if the
+        policy accepts an unsupported dtype or is not restored.
+    """
+    sig = np.random.randn(no_channels,sampling_frequency*20)*1e-5
+
+    def features():
+        return {
+            'bands_power':bands_power(sig,sampling_frequency,bands,method_),
+            'compute_psd':compute_psd(sig,sampling_frequency,method_)[0],
+            'epochs_bands_power':epochs_bands_power(sig,sampling_frequency,bands),
+            'hjorth_batch':hjorth_batch(sig,10),
+            'hjorth_multiscale':hjorth_multiscale(sig,[10,125],summary=True)[(125,125)],
+            'feature_pipeline':FeaturePipeline('features',[
+                (extract_bands_power,{'bands':bands,'method':method_}),
+                (extract_hjorth,),(extract_correlation,)
+                ],sampling_frequency).forward(sig),
+        }
+    expected = features()
+    with dtype_policy('float32'):
+        assert get_dtype() == np.float32
+        res = features()
+        assert hjorth_2D(sig,10).values.dtype == np.float32
+    assert get_dtype() == np.float64
+
+    for name in expected:
+        assert expected[name].dtype == np.float64
+        assert res[name].dtype == np.float32, name
+    # log10 powers differ by a few float32 ulps, other features by a relative 1e-3 at most
+    for name in ('bands_power','compute_psd','epochs_bands_power'):
+        assert np.max(np.abs(res[name]-expected[name])) < 1e-4
+    for name in ('hjorth_batch','hjorth_multiscale'):
+        assert np.allclose(res[name],expected[name],rtol=1e-3,atol=0)
+    assert np.allclose(res['feature_pipeline'],expected['feature_pipeline'],rtol=1e-3,atol=1e-4)
+    with pytest.raises(ValueError):
+        set_dtype('float16')
+
+def test_covariance_engine(no_channels):
+    """
+    Test that 'covariance_engine' returns the matrices of np.cov and np.corrcoef for a single
+    recording, for a stack of recordings, and for a list of recordings of different lengths.
+
+    Args:
+        no_channels: The number of EEG channels.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If a matrix differs from numpy's, or if invalid data is accepted.
+    """
+    stack = np.random.randn(3,no_channels,2000)*5+3
+    cov, corr = covariance_engine(stack[0])
+    assert np.allclose(cov,np.cov(stack[0]))
+    assert np.allclose(corr,np.corrcoef(stack[0]))
+
+    for data in (stack,list(stack),[stack[0],stack[1][:,:1500],stack[2][:,:700]]):
+        cov, corr = covariance_engine(data)
+        assert cov.shape == corr.shape == (3,no_channels,no_channels)
+        for index,data_ in enumerate(data):
+            assert np.allclose(cov[index],np.cov(data_))
+            assert np.allclose(corr[index],np.corrcoef(data_))
+    with dtype_policy('float32'):
+        assert covariance_engine(stack)[0].dtype == np.float32
+    with pytest.raises(ValueError):
+        covariance_engine(stack[0,0])
+    with pytest.raises(ValueError):
+        covariance_engine([stack[0],stack[1][:-1,:1500]])
+
+@pytest.mark.parametrize("window_, step_",[(250,1),(250,25),(250,None),(100,300)])
+def test_rolling_covariance(no_channels,window_,step_):
+    """
+    Test that 'rolling_covariance' matches np.cov and np.corrcoef on every window, whether
+    windows overlap, touch or leave gaps, and that 'RollingCovariance' fed in uneven chunks
+    covers the latest samples only.
+
+    Args:
+        no_channels: The number of EEG channels.
+        window_ (int): The number of samples per window.
+        step_ (int): The number of samples between consecutive windows.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If a window differs from numpy's.
+    """
+    sig = np.random.randn(no_channels,3000)*5+3
+    starts = range(0,sig.shape[-1]-window_+1,window_ if step_ is None else step_)
+    res = rolling_covariance(sig,window_,step_)
+    assert res.shape == (len(starts),no_channels,no_channels)
+    assert np.allclose(res,np.stack([np.cov(sig[:,start:start+window_]) for start in starts]))
+    res = rolling_covariance(sig,window_,step_,method='corr')
+    assert np.allclose(res,np.stack([np.corrcoef(sig[:,start:start+window_]) for start in starts]))
+
+    rolling = RollingCovariance(no_channels,window_,refresh_windows=2)
+    with pytest.raises(ValueError):
+        rolling.covariance()
+    for start in range(0,sig.shape[-1],37):
+        rolling.update(sig[:,start:start+37])
+    assert rolling.n_samples == window_
+    assert np.allclose(rolling.covariance(),np.cov(sig[:,-window_:]))
+    with pytest.raises(ValueError):
+        rolling_covariance(sig,window_,step_,method='coherence')
+
+def _fresh_interpreter(probe:str)->str:
+    """
+    Run a probe in a fresh interpreter from the repository root and return its output.
+    """
+    return subprocess.run(
+        [sys.executable,'-c',probe],cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True,text=True,check=True
+        ).stdout.strip()
+
+@pytest.mark.parametrize(
+        "module_, heavy_",
+        [
+            ("features_computation.time",["pandas"]),
+            ("features_computation.frequency",["neurodsp","scipy.signal","matplotlib"]),
+            ("features_computation.store",["pandas"]),
+            ("features_computation.streaming",["pandas","neurodsp"]),
+            ("features_computation.feature_pipeline",["pandas","neurodsp"]),
+        ]
+        )
+def test_lazy_imports(module_,heavy_):
+    """
+    Test that importing a feature module in a fresh interpreter does not load the heavy
+    dependencies that only some of its functions need.
+
+    Args:
+        module_ (str): The dotted module name.
+        heavy_ (List[str]): The modules that must not be loaded on import.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If a heavy dependency is loaded on import.
+    """
+    probe = f"import sys, {module_}; print(','.join(name for name in {heavy_!r} if name in sys.modules))"
+    assert _fresh_interpreter(probe) == ''
+
+def test_lazy_import_on_use():
+    """
+    Test that a function needing a lazily imported dependency loads it on first use.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If calling 'hjorth_2D' does not load pandas.
+    """
+    probe = (
+        "import sys, numpy as np; from features_computation.time import hjorth_2D; "
+        "hjorth_2D(np.random.randn(2,100),10); print('pandas' in sys.modules)"
+        )
+    assert _fresh_interpreter(probe) == 'True'
@@ -5,18 +5,212 @@ This module contains functions for computing Hjorth parameters
 from EEG (electroencephalography) data.
 
 Functions:
+    - hjorth_batch: Computes Hjorth parameters for every channel of a batch of recordings
+    in a few array operations.
+    - hjorth_multiscale: Computes Hjorth parameters for several segment sizes and hop lengths
+    from a single set of prefix sums.
     - hjorth_parameters_computation: Computes Hjorth parameters for a given EEG data segment.
     - hjorth_2D: Computes Hjorth parameters for each channel of EEG data.
 
 Dependencies:
     - numpy
-    - pandas
+    - pandas (imported on first use, by 'hjorth_2D')
+    - precision (from .precision)
 
 """
 
 from typing import *
 import numpy as np
-import pandas as pd
+
+from .precision import as_policy_dtype, get_dtype
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Order of the statistics along the last axis of hjorth_batch's output
+hjorth_parameters_names = [
+    'mean_activity', 'mean_mobility', 'mean_complexity',
+    'std_activity', 'std_mobility', 'std_complexity'
+]
+
+def hjorth_batch(data:Union[np.ndarray,List], segment_size:int=10)->np.ndarray:
+    """
+    Compute Hjorth parameters for every channel of a batch of EEG recordings.
+
+    The samples are viewed as non-overlapping segments of ``segment_size`` samples without
+    copying (trailing samples that do not fill a segment are ignored), and the per-segment
+    activity, mobility and complexity as well as their mean and standard deviation across
+    segments are computed in a few array operations over all leading axes at once.
+
+    Args:
+        data (Union[np.ndarray, List]): EEG data of shape (..., samples), e.g. (samples,),
+        (channels, samples) or (recordings, channels, samples).
+        segment_size (int, optional): Segment size for computing Hjorth parameters. Default is 10.
+
+    Returns:
+        np.ndarray: Array of shape ``data.shape[:-1] + (6,)`` holding the statistics in the
+        order of ``hjorth_parameters_names``, in the dtype of the policy.
+
+    Example:
+        >>> import numpy as np
+        >>> from custom_module import hjorth_batch
+        >>> eeg_data = np.random.randn(8, 16, 1000)  # 8 recordings of 16 channels
+        >>> hjorth_params = hjorth_batch(eeg_data, 10)  # shape (8, 16, 6)
+    """
+    segments = _segments(data,segment_size)
+    first_diff = np.diff(segments,axis=-1)
+    return _hjorth_statistics(segments,first_diff,np.diff(first_diff,axis=-1))
+
+def _segments(data:Union[np.ndarray,List],segment_size:int)->np.ndarray:
+    """
+    View the samples as non-overlapping segments without copying.
+
+    Args:
+        data (Union[np.ndarray, List]): EEG data of shape (..., samples).
+        segment_size (int): The number of samples per segment.
+
+    Returns:
+        np.ndarray: Read-only view of shape ``data.shape[:-1] + (num_segments, segment_size)``,
+        in the dtype of the policy, ignoring the trailing samples that do not fill a segment.
+    """
+    data = as_policy_dtype(data)
+    assert data.ndim>=1
+    num_segments = data.shape[-1]//segment_size
+    return np.lib.stride_tricks.as_strided(
+        data,
+        shape=data.shape[:-1]+(num_segments,segment_size),
+        strides=data.strides[:-1]+(data.strides[-1]*segment_size,data.strides[-1]),
+        writeable=False
+        )
+
+def _hjorth_statistics(
+        segments:np.ndarray,first_diff:np.ndarray,second_diff:np.ndarray
+        )->np.ndarray:
+    """
+    Compute the Hjorth statistics from segmented data and its differences within segments.
+
+    Args:
+        segments (np.ndarray): The output of '_segments'.
+        first_diff (np.ndarray): The first differences of 'segments' along the last axis.
+        second_diff (np.ndarray): The second differences of 'segments' along the last axis.
+
+    Returns:
+        np.ndarray: Array of shape ``segments.shape[:-2] + (6,)`` holding the statistics in
+        the order of ``hjorth_parameters_names``.
+    """
+    activities = np.var(segments,axis=-1)
+    mobilities = np.var(first_diff,axis=-1)
+    complexities = np.var(second_diff,axis=-1)
+
+    per_segment = np.stack((activities,mobilities,complexities),axis=-1)
+    return np.concatenate((per_segment.mean(axis=-2),per_segment.std(axis=-2)),axis=-1)
+
+def _prefix_sums(sig:np.ndarray)->Tuple[np.ndarray,np.ndarray]:
+    """
+    Compute zero-padded cumulative sums of a signal and of its square along the last axis.
+
+    Args:
+        sig (np.ndarray): Signal of shape (..., samples).
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Cumulative sums of ``sig`` and ``sig**2``, each of shape
+        (..., samples + 1) with a leading zero so that ``sums[..., j] - sums[..., i]`` is the
+        sum over samples ``i`` to ``j - 1``.
+    """
+    padding = [(0,0)]*(sig.ndim-1)+[(1,0)]
+    return (
+        np.pad(np.cumsum(sig,axis=-1),padding),
+        np.pad(np.cumsum(np.square(sig),axis=-1),padding)
+        )
+
+def _windowed_variance(
+        sums:Tuple[np.ndarray,np.ndarray],starts:np.ndarray,length:int
+        )->np.ndarray:
+    """
+    Compute the variance of every window ``[start, start + length)`` from prefix sums.
+
+    Args:
+        sums (Tuple[np.ndarray, np.ndarray]): Output of ``_prefix_sums``.
+        starts (np.ndarray): Start index of each window.
+        length (int): Number of samples in each window.
+
+    Returns:
+        np.ndarray: Variances of shape (..., len(starts)).
+    """
+    first, second = sums
+    mean = (first[...,starts+length]-first[...,starts])/length
+    mean_square = (second[...,starts+length]-second[...,starts])/length
+    return np.maximum(mean_square-np.square(mean),0)
+
+def hjorth_multiscale(
+        data:Union[np.ndarray,List],window_sizes:List[int],
+        hop_lengths:Union[int,List[int]]=None,summary:bool=False
+        )->Dict[Tuple[int,int],np.ndarray]:
+    """
+    Compute Hjorth parameters for several segment sizes and hop lengths at once.
+
+    Cumulative sums of x, x², Δx, (Δx)², Δ²x and (Δ²x)² are built a single time, after which
+    the activity, mobility and complexity of every window of every scale are obtained in
+    O(samples) operations per scale, whatever the window size or overlap.
+
+    Args:
+        data (Union[np.ndarray, List]): EEG data of shape (..., samples).
+        window_sizes (List[int]): Segment sizes, in samples. Each must be at least 3.
+        hop_lengths (Union[int, List[int]], optional): Step between consecutive segments, either
+        one value for every scale or one per entry of ``window_sizes``. Default is None, which
+        uses non-overlapping segments (hop equal to the segment size).
+        summary (bool, optional): If True, reduce each scale to the mean and standard deviation
+        across segments, as returned by ``hjorth_batch``. Default is False.
+
+    Returns:
+        Dict[Tuple[int, int], np.ndarray]: Mapping from (window_size, hop_length) to an array of
+        shape (..., n_segments, 3) holding activity, mobility and complexity per segment, or of
+        shape (..., 6) ordered as ``hjorth_parameters_names`` when ``summary`` is True. The
+        prefix sums always accumulate in float64, which cumulative sums over long recordings
+        need, and the results are cast to the dtype of the policy.
+
+    Raises:
+        AssertionError: If a window size is smaller than 3 or longer than the data, or if the
+        number of hop lengths does not match the number of window sizes.
+
+    Example:
+        >>> import numpy as np
+        >>> from custom_module import hjorth_multiscale
+        >>> eeg_data = np.random.randn(16, 75000)  # 16 channels
+        >>> scales = hjorth_multiscale(eeg_data, [10, 25, 125, 250], hop_lengths=5)
+        >>> scales[(125, 5)].shape  # (16, 14976, 3)
+    """
+    data = np.asarray(data,dtype=float)
+    if hop_lengths is None:
+        hop_lengths = list(window_sizes)
+    elif np.ndim(hop_lengths)==0:
+        # a single hop, which may be a NumPy integer
+        hop_lengths = [int(hop_lengths)]*len(window_sizes)
+    assert len(hop_lengths)==len(window_sizes)
+
+    # Variance is shift invariant, centering keeps the prefix sums well conditioned
+    centered = data-data.mean(axis=-1,keepdims=True)
+    first_diff = np.diff(centered,axis=-1)
+    sums = (
+        _prefix_sums(centered),
+        _prefix_sums(first_diff),
+        _prefix_sums(np.diff(first_diff,axis=-1))
+        )
+
+    scales = {}
+    for window_size,hop_length in zip(window_sizes,hop_lengths):
+        assert 3<=window_size<=data.shape[-1]
+        starts = np.arange(0,data.shape[-1]-window_size+1,hop_length)
+        per_segment = np.stack(
+            [_windowed_variance(sums[order],starts,window_size-order) for order in range(3)],
+            axis=-1
+            )
+        if summary:
+            per_segment = np.concatenate(
+                (per_segment.mean(axis=-2),per_segment.std(axis=-2)),axis=-1
+                )
+        scales[(window_size,hop_length)] = per_segment.astype(get_dtype(),copy=False)
+    return scales
 
 def hjorth_parameters_computation(data:Union[np.ndarray,List], segment_size:int=10)->dict:
     """
@@ -41,41 +235,33 @@ def hjorth_parameters_computation(data:Union[np.ndarray,List], segment_size:int=
         >>> eeg_data = np.random.randn(1000)  # EEG data
         >>> hjorth_params = hjorth_parameters_computation(eeg_data)
     """
+    if np.ndim(data)==1:
+        return dict(zip(hjorth_parameters_names,hjorth_batch(data,segment_size)))
+
+    # Other inputs keep their original meaning: segments are blocks of rows, each reduced
+    # as a whole, so channels are not separated (see 'hjorth_2D' and 'hjorth_batch' for that)
     num_segments = len(data)//segment_size
     activities = []
     mobilities = []
     complexities = []
-    for i in range(num_segments): 
+    for i in range(num_segments):
         start = i*segment_size
         end = start+segment_size
         segment = data[start:end]
-        activity = np.var(segment)
-        activities.append(activity)
-        mobility = np.var(np.diff(segment))
-        mobilities.append(mobility)
-        complexity = np.var(np.diff(np.diff(segment)))
-        complexities.append(complexity)
-    avg_activity = np.mean(activities)
-    avg_mobility= np.mean(mobilities)
-    avg_complexity = np.mean(complexities)
-    std_activity = np.std(activities)
-    std_mobility= np.std(mobilities)
-    std_complexity = np.std(complexities)
-
-    hjorth_parameters = {
-        'mean_activity': avg_activity,
-        'mean_mobility': avg_mobility,
-        'mean_complexity': avg_complexity,
-        'std_activity': std_activity,
-        'std_mobility': std_mobility,
-        'std_complexity': std_complexity
-    }
+        activities.append(np.var(segment))
+        mobilities.append(np.var(np.diff(segment)))
+        complexities.append(np.var(np.diff(np.diff(segment))))
+    statistics = [
+        np.mean(activities),np.mean(mobilities),np.mean(complexities),
+        np.std(activities),np.std(mobilities),np.std(complexities),
+        ]
+    hjorth_parameters = dict(zip(hjorth_parameters_names,statistics))
     return hjorth_parameters
 
 def hjorth_2D(
         data:Union[np.ndarray,List[list]],
         segment_size:int,ch_names:Union[List,np.ndarray]=None
-        )->pd.DataFrame:
+        )->'pd.DataFrame':
     """
     Compute Hjorth parameters for each channel of EEG data.
 
@@ -97,18 +283,16 @@ def hjorth_2D(
         >>> eeg_data = np.random.randn(1000, 16)  # EEG data with 16 channels
         >>> hjorth_params_df = hjorth_2D(eeg_data, 10)
     """
+    import pandas as pd
+
     if isinstance(data,list):
         data = np.array(data)
     assert data.ndim==2
-    if ch_names!=None:
+    if ch_names is not None:
         assert data.shape[0]==len(ch_names)
 
-    hjorth_parameters = []
-
-    for c in range(len(data)):
-        hjorth_parameters.append(hjorth_parameters_computation(data[c,:],segment_size))
-    if ch_names!=None:
-        hjorth_parameters = pd.DataFrame(hjorth_parameters,index=ch_names)
-    else:
-        hjorth_parameters = pd.DataFrame(hjorth_parameters)
+    hjorth_parameters = pd.DataFrame(
+        hjorth_batch(data,segment_size),
+        columns=hjorth_parameters_names,index=ch_names
+        )
     return hjorth_parameters
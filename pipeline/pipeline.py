@@ -5,36 +5,98 @@ This module provides a class for creating and executing data processing pipeline
 
 Classes:
     - Pipeline: A class representing a data processing pipeline.
+    - DAGPipeline: A pipeline whose steps form a directed acyclic graph.
 
 """
 
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+hook_events = ['before','after']
+executor_types = ['thread','process']
+
+def _data_shape(data)->Optional[Tuple[int]]:
+    """
+    Return the shape of the data passed between pipeline steps.
+
+    Args:
+        data: An array-like object, or an mne.io.Raw.
+
+    Returns:
+        Tuple[int]: The shape of the data, (n_channels, n_times) for an mne.io.Raw, or None if
+        it has no shape.
+    """
+    if hasattr(data,'shape'):
+        return tuple(int(size) for size in data.shape)
+    if hasattr(data,'ch_names') and hasattr(data,'n_times'):
+        return (len(data.ch_names),int(data.n_times))
+    return None
+
+def _step_name(method:tuple)->str:
+    return getattr(method[0],'__name__',repr(method[0]))
+
 class Pipeline():
     """
     pipeline Class
 
     A class representing a data processing pipeline.
 
+    Subclasses run their steps through 'run_step', which can profile them and call user hooks.
+    Profiling records, for each step, its wall time, the CPU time of the thread running it, its
+    peak memory over the memory allocated before it (when 'profile_memory' is set) and the
+    shape of its input and output. The CPU time leaves out the work of steps running on other
+    threads at the same time, as well as the work the step hands to other threads or processes.
+    When profiling is disabled and no hook is registered, 'run_step' calls the step directly.
+
     Attributes:
         name (str): The name of the pipeline.
         methods (list): A list of methods in the pipeline.
+        profile (bool): Whether the steps are profiled.
+        profile_memory (bool): Whether profiling measures the peak memory of each step with
+        tracemalloc, which slows the steps down.
+        step_records (List[dict]): The profile of each step of the last forward pass.
+        hooks (Dict[str, List[Callable]]): The callbacks run 'before' and 'after' each step.
 
     Methods:
         forward(raw): Perform forward pass through the pipeline.
+        run_step(step_no, method, data): Run one step, profiling it when enabled.
+        add_hook(event, callback): Register a callback run before or after each step.
+        stats(): Return the profile of the steps aggregated over all forward passes.
+        reset_profile(): Discard the profiles recorded so far.
+        export_trace(path): Write the recorded profiles as a Chrome trace.
 
     """
-    def __init__(self,name,methods):
+    def __init__(self,name,methods,profile:bool=False,profile_memory:bool=False):
         """
         Initialize the Pipeline object.
 
         Args:
             name (str): The name of the pipeline.
             methods (list): A list of methods in the pipeline.
+            profile (bool, optional): Profile every step. Default is False.
+            profile_memory (bool, optional): Also measure the peak memory of every step with
+            tracemalloc. Implies 'profile'. Default is False.
 
         Returns:
             None
         """
         self.name = name
         self.methods = methods
+        self.profile = profile or profile_memory
+        self.profile_memory = profile_memory
+        self.hooks = {event:[] for event in hook_events}
+        self._record_lock = threading.Lock()
+        self._memory_lock = threading.Lock()
+        self._n_tracing = 0
+        self._started_tracing = False
+        self._n_running = 0
+        self.reset_profile()
 
     def forward(self,raw):
         """
@@ -47,4 +109,456 @@ class Pipeline():
             The processed data after passing through the pipeline.
         """
         return raw
-    
\ No newline at end of file
+
+    def add_hook(self,event:str,callback:Callable):
+        """
+        Register a callback run before or after each step.
+
+        'before' callbacks are called as callback(pipeline, step_no, method, data) with the
+        input of the step, and 'after' callbacks as callback(pipeline, step_no, method, data,
+        record) with its output and its profile, which is None when profiling is disabled.
+
+        Args:
+            event (str): 'before' or 'after'.
+            callback (Callable): The function to call.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If an invalid event is specified.
+        """
+        if event not in hook_events:
+            raise ValueError(f"Inpermissible hook event, {event} is used")
+        self.hooks[event].append(callback)
+
+    def reset_profile(self):
+        """
+        Discard the profiles recorded so far.
+
+        Returns:
+            None
+        """
+        self.step_records = []
+        self._aggregate = {}
+        self._trace_events = []
+        self._folded_peak = 0
+
+    def _begin_pass(self):
+        """
+        Start recording the profiles of a new forward pass.
+
+        Returns:
+            None
+        """
+        self.step_records = []
+        self._folded_peak = 0
+
+    def run_step(self,step_no:int,method:tuple,data,*extra_inputs):
+        """
+        Run one step of the pipeline, profiling it and calling the hooks when enabled.
+
+        Args:
+            step_no (int): The position of the step in the pipeline.
+            method (tuple): The step, as (callable,) or (callable, kwargs).
+            data: The input of the step.
+            *extra_inputs: Further positional inputs of the step, for steps with several
+            inputs. The hooks and the recorded input shape only see 'data'.
+
+        Returns:
+            The output of the step.
+        """
+        kwargs = method[1] if len(method)==2 else {}
+        if not self.profile and len(self.hooks['before'])==0 and len(self.hooks['after'])==0:
+            return method[0](data,*extra_inputs,**kwargs)
+
+        for callback in self.hooks['before']:
+            callback(self,step_no,method,data)
+        record = None
+        if self.profile:
+            input_shape = _data_shape(data)
+            with self._memory_tracing() if self.profile_memory else nullcontext():
+                if self.profile_memory:
+                    memory_before, peak_before, peak_reset = self._enter_memory_step()
+                start = time.perf_counter()
+                cpu_start = time.thread_time()
+                data = method[0](data,*extra_inputs,**kwargs)
+                cpu_time = time.thread_time()-cpu_start
+                wall_time = time.perf_counter()-start
+                record = {
+                    'step':step_no,
+                    'name':_step_name(method),
+                    'start':start,
+                    'wall_time':wall_time,
+                    'cpu_time':cpu_time,
+                    'peak_memory':None,
+                    'input_shape':input_shape,
+                    'output_shape':_data_shape(data),
+                }
+                if self.profile_memory:
+                    record['peak_memory'] = self._exit_memory_step(
+                        memory_before,peak_before,peak_reset
+                        )
+            self._record(record)
+        else:
+            data = method[0](data,*extra_inputs,**kwargs)
+        for callback in self.hooks['after']:
+            callback(self,step_no,method,data,record)
+        return data
+
+    @contextmanager
+    def _memory_tracing(self):
+        """
+        Keep tracemalloc tracing while the context is open. Tracing is started by the first
+        of nested or concurrent contexts, if it is not already on, and stopped by the last.
+
+        Yields:
+            None
+        """
+        with self._memory_lock:
+            if self._n_tracing==0:
+                self._started_tracing = not tracemalloc.is_tracing()
+                if self._started_tracing:
+                    tracemalloc.start()
+            self._n_tracing += 1
+        try:
+            yield
+        finally:
+            with self._memory_lock:
+                self._n_tracing -= 1
+                if self._n_tracing==0 and self._started_tracing:
+                    tracemalloc.stop()
+                    self._started_tracing = False
+
+    def _enter_memory_step(self)->Tuple[int,int,bool]:
+        """
+        Start measuring the peak memory of a step. The traced peak is reset only when no other
+        step is running, the pass-level peak being kept in _folded_peak.
+
+        Returns:
+            Tuple[int, int, bool]: The traced memory and peak at the start of the step, and
+            whether the peak was reset for it.
+        """
+        with self._memory_lock:
+            _, previous_peak = tracemalloc.get_traced_memory()
+            self._folded_peak = max(self._folded_peak,previous_peak)
+            peak_reset = self._n_running==0
+            if peak_reset:
+                tracemalloc.reset_peak()
+            self._n_running += 1
+            memory_before, peak_before = tracemalloc.get_traced_memory()
+        return memory_before, peak_before, peak_reset
+
+    def _exit_memory_step(self,memory_before:int,peak_before:int,peak_reset:bool)->Optional[int]:
+        """
+        Finish measuring the peak memory of a step.
+
+        Args:
+            memory_before (int): The traced memory at the start of the step.
+            peak_before (int): The traced peak at the start of the step.
+            peak_reset (bool): Whether the peak was reset at the start of the step.
+
+        Returns:
+            Optional[int]: The peak memory of the step over 'memory_before', or None when it
+            overlapped other steps and the traced peak did not rise while it ran, in which case
+            its own peak is unknown.
+        """
+        with self._memory_lock:
+            _, peak = tracemalloc.get_traced_memory()
+            self._n_running -= 1
+            self._folded_peak = max(self._folded_peak,peak)
+        if peak_reset or peak>peak_before:
+            return peak-memory_before
+        return None
+
+    def _traced_peak(self)->int:
+        """
+        Return the peak traced memory of the current forward pass, including the peaks that
+        step profiling reset.
+
+        Returns:
+            int: The peak traced memory, in bytes.
+        """
+        _, peak = tracemalloc.get_traced_memory()
+        return max(peak,self._folded_peak)
+
+    def _record(self,record:dict):
+        with self._record_lock:
+            self._record_unlocked(record)
+
+    def _record_unlocked(self,record:dict):
+        self.step_records.append(record)
+        key = (record['step'],record['name'])
+        if key not in self._aggregate:
+            self._aggregate[key] = {
+                'step':record['step'],'name':record['name'],'calls':0,
+                'wall_time':0.0,'cpu_time':0.0,'max_wall_time':0.0,'peak_memory':None,
+            }
+        aggregate = self._aggregate[key]
+        aggregate['calls'] += 1
+        aggregate['wall_time'] += record['wall_time']
+        aggregate['cpu_time'] += record['cpu_time']
+        aggregate['max_wall_time'] = max(aggregate['max_wall_time'],record['wall_time'])
+        if record['peak_memory'] is not None:
+            aggregate['peak_memory'] = max(aggregate['peak_memory'] or 0,record['peak_memory'])
+        self._trace_events.append({
+            'name':record['name'],
+            'cat':str(self.name),
+            'ph':'X',
+            'ts':record['start']*1e6,
+            'dur':record['wall_time']*1e6,
+            'pid':os.getpid(),
+            'tid':threading.get_ident(),
+            'args':{
+                'step':record['step'],
+                'cpu_time':record['cpu_time'],
+                'peak_memory':record['peak_memory'],
+                'input_shape':record['input_shape'],
+                'output_shape':record['output_shape'],
+            },
+        })
+
+    def stats(self)->List[dict]:
+        """
+        Return the profile of the steps aggregated over all forward passes since the last
+        'reset_profile'.
+
+        Returns:
+            List[dict]: For each step, in pipeline order, its 'step' number, 'name', number of
+            'calls', total 'wall_time' and 'cpu_time', 'mean_wall_time', 'max_wall_time' (in
+            seconds) and largest 'peak_memory' (in bytes, None unless 'profile_memory' is set).
+        """
+        stats = []
+        for key in sorted(self._aggregate):
+            aggregate = dict(self._aggregate[key])
+            aggregate['mean_wall_time'] = aggregate['wall_time']/aggregate['calls']
+            stats.append(aggregate)
+        return stats
+
+    def export_trace(self,path:Union[str,os.PathLike]):
+        """
+        Write the profiles recorded since the last 'reset_profile' as a Chrome trace, which
+        can be opened in chrome://tracing or Perfetto.
+
+        Args:
+            path (Union[str, os.PathLike]): The path of the JSON file.
+
+        Returns:
+            None
+        """
+        with open(path,'w') as file:
+            json.dump({'traceEvents':self._trace_events,'displayTimeUnit':'ms'},file)
+
+class _RemoteCall:
+    """
+    Callable running a function in a process pool, named after that function so that
+    profiles and hooks identify the step.
+    """
+
+    def __init__(self,pool:ProcessPoolExecutor,function:Callable):
+        self.pool = pool
+        self.function = function
+        self.__name__ = _step_name((function,))
+
+    def __call__(self,*args,**kwargs):
+        return self.pool.submit(self.function,*args,**kwargs).result()
+
+class DAGPipeline(Pipeline):
+    """
+    DAG Pipeline Class
+
+    A subclass of Pipeline whose steps form a directed acyclic graph.
+
+    Every node names the nodes whose outputs it takes as positional inputs, 'input' being the
+    data passed to 'forward'. Each node runs once per forward pass, so an intermediate shared
+    by several branches (e.g. a filtered recording) is computed a single time, and its output
+    is released as soon as every node consuming it has finished, unless it is an output of the
+    pipeline. Nodes whose inputs are ready run concurrently on a pool of 'n_workers' threads,
+    or processes, in which case the functions, their inputs and outputs must be picklable.
+    Since shared outputs are passed to several nodes, node functions must not modify their
+    inputs in place.
+
+    Profiling and hooks work as in Pipeline, with step numbers following 'order'. Memory is
+    traced for the whole forward pass. tracemalloc is process-wide, so with concurrent nodes
+    the peak memory of a step includes the allocations of the nodes running alongside it on
+    other threads, and is None when the step started while others were running and the traced
+    peak did not rise before it finished; set 'n_workers' to 1 for per-step peaks. With a
+    process pool, the allocations and CPU time of the steps are not measured.
+
+    Attributes:
+        name (str): The name of the pipeline.
+        methods (Dict[str, tuple]): The nodes, by name.
+        outputs (List[str]): The nodes returned by 'forward'.
+        executor (str): The pool running the nodes, 'thread' or 'process'.
+        n_workers (int): The size of the pool, or None for the number of CPUs.
+        order (List[str]): The nodes in a topological order.
+
+    Methods:
+        __init__(name, nodes, outputs, executor, n_workers, profile, profile_memory):
+        Initialize the DAGPipeline object.
+        forward(raw): Perform forward pass through the graph.
+
+    Example:
+        >>> nodes = {
+        ...     'filtered': (fused_filter, ['input'], {'freqs': 50, 'lpf': 40, 'hpf': 1}),
+        ...     'data': (get_data, ['filtered']),
+        ...     'powers': (bands_power, ['data'], {'sampling_frequency': 125, 'bands': bands}),
+        ...     'hjorth': (hjorth_batch, ['data']),
+        ...     'covariance': (np.cov, ['data']),
+        ... }
+        >>> res = DAGPipeline('features', nodes, n_workers=3).forward(raw)
+        >>> res['powers'], res['hjorth'], res['covariance']
+    """
+
+    input_name = 'input'
+
+    def __init__(
+            self,name:str,nodes:Dict[str,tuple],outputs:List[str]=None,
+            executor:str='thread',n_workers:int=None,
+            profile:bool=False,profile_memory:bool=False
+            ):
+        """
+        Initialize the DAGPipeline object.
+
+        Args:
+            name (str): The name of the pipeline.
+            nodes (Dict[str, tuple]): The nodes, by name, each as (callable, inputs) or
+            (callable, inputs, kwargs), where inputs lists the names of the nodes, or 'input',
+            whose outputs are passed positionally to the callable.
+            outputs (List[str], optional): The nodes returned by 'forward'. Default is None,
+            which returns the nodes no other node consumes.
+            executor (str, optional): 'thread' or 'process'. Default is 'thread'.
+            n_workers (int, optional): The number of nodes run at once; 1 runs them one after
+            the other in the calling thread. Default is None, which uses the number of CPUs.
+            profile (bool, optional): Profile every node, see Pipeline. Default is False.
+            profile_memory (bool, optional): Also measure the peak memory of every node.
+            Default is False.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If an invalid executor is specified, if a node or output is unknown or
+            reserved, or if the nodes form a cycle.
+        """
+        super().__init__(name,dict(nodes),profile,profile_memory)
+        if executor not in executor_types:
+            raise ValueError(f"Inpermissible executor, {executor} is used")
+        self.executor = executor
+        self.n_workers = n_workers
+        self.order = self._topological_order()
+        consumed = {input_ for node in self.methods.values() for input_ in node[1]}
+        if outputs is None:
+            outputs = [node_name for node_name in self.order if node_name not in consumed]
+        for output in outputs:
+            if output not in self.methods:
+                raise ValueError(f"Inpermissible output, {output} is not a node")
+        self.outputs = list(outputs)
+
+    def _topological_order(self)->List[str]:
+        """
+        Order the nodes so that every node comes after its inputs, keeping the declaration
+        order between independent nodes.
+
+        Returns:
+            List[str]: The node names.
+
+        Raises:
+            ValueError: If a node is reserved, has no inputs or an unknown input, or if the
+            nodes form a cycle.
+        """
+        if self.input_name in self.methods:
+            raise ValueError(f"Inpermissible node name, {self.input_name} is reserved")
+        for node_name, node in self.methods.items():
+            if len(node) not in (2,3) or len(node[1])==0:
+                raise ValueError(f"Inpermissible node, {node_name} needs a callable and inputs")
+            for input_ in node[1]:
+                if input_!=self.input_name and input_ not in self.methods:
+                    raise ValueError(f"Inpermissible input, {input_} of {node_name} is not a node")
+        order = []
+        placed = {self.input_name}
+        while len(order)<len(self.methods):
+            ready = [
+                node_name for node_name, node in self.methods.items()
+                if node_name not in placed and all(input_ in placed for input_ in node[1])
+                ]
+            if len(ready)==0:
+                raise ValueError(f"Inpermissible graph, the nodes of {self.name} form a cycle")
+            order += ready
+            placed.update(ready)
+        return order
+
+    def _method(self,node_name:str,pool:Optional[ProcessPoolExecutor])->tuple:
+        node = self.methods[node_name]
+        function = node[0] if pool is None else _RemoteCall(pool,node[0])
+        return (function,node[2]) if len(node)==3 else (function,)
+
+    def forward(self,raw)->Dict[str,object]:
+        """
+        Perform forward pass through the graph.
+
+        Args:
+            raw: The input data, consumed by the nodes listing 'input'.
+
+        Returns:
+            Dict[str, object]: The output of each node of 'outputs'.
+        """
+        with self._memory_tracing() if self.profile_memory else nullcontext():
+            self._begin_pass()
+            step_numbers = {node_name:step_no for step_no,node_name in enumerate(self.order)}
+            values = {self.input_name:raw}
+            del raw
+            n_consumers = {node_name:0 for node_name in [self.input_name]+self.order}
+            dependants = {node_name:[] for node_name in [self.input_name]+self.order}
+            for node_name in self.order:
+                for input_ in set(self.methods[node_name][1]):
+                    n_consumers[input_] += 1
+                    dependants[input_].append(node_name)
+
+            def release_inputs(node_name:str):
+                for input_ in set(self.methods[node_name][1]):
+                    n_consumers[input_] -= 1
+                    if n_consumers[input_]==0 and input_ not in self.outputs:
+                        del values[input_]
+
+            n_workers = self.n_workers or os.cpu_count() or 1
+            if n_workers==1 and self.executor=='thread':
+                for node_name in self.order:
+                    inputs = [values[input_] for input_ in self.methods[node_name][1]]
+                    values[node_name] = self.run_step(
+                        step_numbers[node_name],self._method(node_name,None),*inputs
+                        )
+                    del inputs
+                    release_inputs(node_name)
+                return {output:values[output] for output in self.outputs}
+
+            n_missing = {
+                node_name:len(set(self.methods[node_name][1])-{self.input_name})
+                for node_name in self.order
+                }
+            ready = [node_name for node_name in self.order if n_missing[node_name]==0]
+            process_pool = (
+                ProcessPoolExecutor(n_workers) if self.executor=='process' else nullcontext()
+                )
+            with process_pool as pool, ThreadPoolExecutor(n_workers) as threads:
+                running = {}
+                while len(ready)>0 or len(running)>0:
+                    for node_name in ready:
+                        inputs = [values[input_] for input_ in self.methods[node_name][1]]
+                        future = threads.submit(
+                            self.run_step,step_numbers[node_name],
+                            self._method(node_name,pool),*inputs
+                            )
+                        running[future] = node_name
+                        del inputs
+                    ready = []
+                    done, _ = wait(running,return_when=FIRST_COMPLETED)
+                    for future in done:
+                        node_name = running.pop(future)
+                        values[node_name] = future.result()
+                        release_inputs(node_name)
+                        for dependant in dependants[node_name]:
+                            n_missing[dependant] -= 1
+                            if n_missing[dependant]==0:
+                                ready.append(dependant)
+            return {output:values[output] for output in self.outputs}
@@ -0,0 +1,209 @@
+"""
+Pipeline Tests Module
+
+This module contains tests for the DAGPipeline class.
+
+Tests:
+    - test_dag_pipeline: Test that every executor computes the graph like direct calls.
+    - test_dag_shared_intermediates: Test that shared nodes run once and are released early.
+    - test_dag_validation: Test that invalid graphs are rejected.
+    - test_dag_concurrent_memory: Test the peak memory of concurrent steps.
+    - test_dag_concurrent_cpu_time: Test that concurrent steps only count their own CPU time.
+
+Dependencies:
+    - time
+    - tracemalloc
+    - weakref
+    - pytest
+    - numpy
+    - scipy
+    - pipeline (from .pipeline)
+    - frequency (from features_computation.frequency)
+    - time (from features_computation.time)
+
+"""
+
+import time
+import tracemalloc
+import weakref
+import pytest
+import numpy as np
+from scipy import signal
+from .pipeline import DAGPipeline
+from features_computation.frequency import bands_power
+from features_computation.time import hjorth_batch
+
+@pytest.mark.parametrize(
+        "executor_, n_workers_",
+        [("thread",1),("thread",3),("process",2)]
+        )
+def test_dag_pipeline(sampling_frequency,no_channels,bands,executor_,n_workers_):
+    """
+    Test that a graph with a shared filtering node and parallel feature branches returns the
+    same results as calling the functions one after the other.
+
+    Args:
+        sampling_frequency: The sampling frequency of the EEG data.
+        no_channels: The number of EEG channels.
+        bands: The frequency bands of interest.
+        executor_ (str): The pool running the nodes.
+        n_workers_ (int): The number of nodes run at once.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the outputs, their names or the step records are unexpected.
+    """
+    sig = np.random.randn(no_channels,sampling_frequency*10)
+    nodes = {
+        'detrended':(signal.detrend,['input']),
+        'powers':(bands_power,['detrended'],{'sampling_frequency':sampling_frequency,'bands':bands}),
+        'hjorth':(hjorth_batch,['detrended'],{'segment_size':10}),
+        'covariance':(np.cov,['detrended']),
+        'mixed':(np.dot,['covariance','powers']),
+    }
+    pipeline = DAGPipeline('features',nodes,executor=executor_,n_workers=n_workers_,profile=True)
+    res = pipeline.forward(sig)
+
+    detrended = signal.detrend(sig)
+    powers = bands_power(detrended,sampling_frequency,bands)
+    assert list(res) == ['hjorth','mixed']
+    assert np.allclose(res['hjorth'],hjorth_batch(detrended,10))
+    assert np.allclose(res['mixed'],np.cov(detrended)@powers)
+    assert sorted(record['name'] for record in pipeline.step_records) == sorted(
+        ['detrend','bands_power','hjorth_batch','cov','dot']
+        )
+    assert pipeline.order.index('detrended') == 0
+    assert pipeline.order.index('mixed') == len(nodes)-1
+
+class _Box:
+    def __init__(self,data):
+        self.data = data
+
+def _unbox(box:_Box)->np.ndarray:
+    return box.data
+
+def test_dag_shared_intermediates(no_channels):
+    """
+    Test that a node consumed by several branches runs once per forward pass, and that its
+    output is released once its consumers finished unless it is an output.
+
+    Args:
+        no_channels: The number of EEG channels.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If a shared node runs more than once or is kept alive too long.
+    """
+    calls = []
+    def shared(data):
+        calls.append(1)
+        return _Box(data*2)
+    nodes = {
+        'boxed':(shared,['input']),
+        'left':(_unbox,['boxed']),
+        'right':(_unbox,['boxed']),
+        'total':(np.add,['left','right']),
+        'summed':(np.sum,['total']),
+    }
+    boxes = []
+    alive_at_end = []
+    def after(pipeline_,step_no,method,data,record):
+        if isinstance(data,_Box):
+            boxes.append(weakref.ref(data))
+        if method[0] is np.sum:
+            alive_at_end.append(boxes[-1]() is not None)
+
+    for n_workers_ in (1,4):
+        pipeline = DAGPipeline('shared',nodes,n_workers=n_workers_)
+        pipeline.add_hook('after',after)
+        res = pipeline.forward(np.ones((no_channels,100)))
+        assert res['summed'] == 4*no_channels*100
+    assert len(calls) == 2
+    assert alive_at_end == [False,False]
+
+    res = DAGPipeline('kept',nodes,outputs=['boxed','summed'],n_workers=1).forward(np.ones(3))
+    assert np.array_equal(res['boxed'].data,2*np.ones(3))
+
+def test_dag_validation():
+    """
+    Test that unknown inputs and outputs, reserved names, cycles and invalid executors are
+    rejected.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If an invalid graph is accepted.
+    """
+    with pytest.raises(ValueError):
+        DAGPipeline('unknown',{'a':(np.abs,['b'])})
+    with pytest.raises(ValueError):
+        DAGPipeline('cycle',{'a':(np.abs,['b']),'b':(np.abs,['a'])})
+    with pytest.raises(ValueError):
+        DAGPipeline('reserved',{'input':(np.abs,['input'])})
+    with pytest.raises(ValueError):
+        DAGPipeline('output',{'a':(np.abs,['input'])},outputs=['b'])
+    with pytest.raises(ValueError):
+        DAGPipeline('executor',{'a':(np.abs,['input'])},executor='cluster')
+
+def _fast_step(data:np.ndarray)->np.ndarray:
+    time.sleep(0.1)
+    return data+np.ones(2**17)
+
+def _slow_step(data:np.ndarray)->np.ndarray:
+    time.sleep(0.3)
+    return data+np.ones(2**21)
+
+def test_dag_concurrent_memory():
+    """
+    Test that, with steps running concurrently, tracing lasts the whole forward pass and the
+    peak memory of each step is non-negative and its own.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If a peak is negative or attributed to the wrong step, or if tracing
+        is left on.
+    """
+    nodes = {'fast':(_fast_step,['input']),'slow':(_slow_step,['input'])}
+    pipeline = DAGPipeline('memory',nodes,n_workers=2,profile_memory=True)
+    for _ in range(2):
+        pipeline.forward(0.0)
+        peaks = {record['name']:record['peak_memory'] for record in pipeline.step_records}
+        assert not tracemalloc.is_tracing()
+        assert all(peak is None or peak >= 0 for peak in peaks.values())
+        assert peaks['_slow_step'] >= 2**21*8
+        assert peaks['_fast_step'] is None or peaks['_fast_step'] < 2**21*8
+
+def _busy_step(data:float)->float:
+    start = time.perf_counter()
+    while time.perf_counter()-start<0.3:
+        data += 1.0
+    return data
+
+def _sleeping_step(data:float)->float:
+    time.sleep(0.3)
+    return data
+
+def test_dag_concurrent_cpu_time():
+    """
+    Test that the CPU time of a step does not include the work of the steps running alongside
+    it on other threads.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If a sleeping step is charged the CPU time of a busy one.
+    """
+    nodes = {'busy':(_busy_step,['input']),'sleeping':(_sleeping_step,['input'])}
+    pipeline = DAGPipeline('cpu',nodes,n_workers=2,profile=True)
+    pipeline.forward(0.0)
+    cpu_times = {record['name']:record['cpu_time'] for record in pipeline.step_records}
+    assert cpu_times['_busy_step'] > 0.1
+    assert cpu_times['_sleeping_step'] < 0.05
@@ -0,0 +1,243 @@
+"""
+Checkpoint Cache Module
+
+This module provides an on-disk, content-addressed cache of the intermediate recordings
+produced by the steps of a PrepocessingPipeline.
+
+Functions:
+    - recording_hash: Compute a content hash identifying the input recording.
+    - step_key: Derive the cache key of a step from the key of its input.
+
+Classes:
+    - CheckpointCache: A size-limited, LRU-evicted store of preprocessed recordings.
+
+"""
+
+# Annotations are not evaluated, so that importing this module does not load mne.io
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple, Union
+import hashlib
+import os
+import numpy as np
+import mne
+
+_file_hashes = {}
+
+def _file_hash(path:str)->str:
+    """
+    Compute the SHA-256 of a file, memoized on its path, size and modification time.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        str: The hexadecimal digest of the file contents.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path),stat.st_size,stat.st_mtime_ns)
+    if memo_key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path,'rb') as file:
+            for block in iter(lambda: file.read(1<<20),b''):
+                digest.update(block)
+        _file_hashes[memo_key] = digest.hexdigest()
+    return _file_hashes[memo_key]
+
+def recording_hash(raw:mne.io.Raw)->str:
+    """
+    Compute a content hash identifying the input recording.
+
+    Recordings that are not loaded in memory are identified by the contents of the files they
+    were read from, together with the sample range and channels currently selected. The whole
+    files are read to hash them, although the hashes are memoized, so the first lookup of a
+    lazily opened recording reads all of it even if the pipeline only loads a part. Loaded
+    recordings, which may have been modified in place since they were read (e.g. filtered or
+    re-referenced), and recordings that were not read from a file (e.g. mne.io.RawArray) are
+    identified by a hash of their data instead.
+
+    Args:
+        raw (mne.io.Raw): The raw data.
+
+    Returns:
+        str: The hexadecimal digest identifying the recording.
+    """
+    digest = hashlib.sha256()
+    filenames = [name for name in raw.filenames if name is not None]
+    from_files = len(filenames)>0 and all(os.path.exists(name) for name in filenames)
+    if from_files and not raw.preload:
+        for name in filenames:
+            digest.update(_file_hash(str(name)).encode())
+    else:
+        digest.update(np.ascontiguousarray(raw.get_data()).tobytes())
+    digest.update(repr((raw.first_samp,raw.n_times,raw.info['sfreq'],raw.ch_names)).encode())
+    return digest.hexdigest()
+
+def step_key(previous_key:str,method:tuple)->str:
+    """
+    Derive the cache key of a preprocessing step from the key of its input.
+
+    Args:
+        previous_key (str): The key of the step's input (the recording hash for the first step).
+        method (tuple): The step, as (callable,) or (callable, kwargs).
+
+    Returns:
+        str: The hexadecimal key of the step's output.
+    """
+    function = method[0]
+    kwargs = method[1] if len(method)==2 else {}
+    identity = (
+        f"{function.__module__}.{function.__qualname__}"
+        f"({sorted(kwargs.items(),key=lambda item: item[0])!r})"
+        )
+    return hashlib.sha256((previous_key+identity).encode()).hexdigest()
+
+class CheckpointCache:
+    """
+    A size-limited store of preprocessed recordings addressed by content.
+
+    Each entry is a FIF file named after the key of the pipeline prefix that produced it.
+    Reading an entry refreshes its modification time, and once the cache grows over
+    'max_bytes' the least recently used entries are deleted first.
+
+    Attributes:
+        directory (str): The directory holding the checkpoints.
+        max_bytes (int): The size limit of the cache, in bytes, or None for no limit.
+        hits (int): The number of successful lookups.
+        misses (int): The number of failed lookups.
+
+    Methods:
+        get(key): Load the recording stored under a key.
+        longest_prefix(keys): Load the checkpoint of the longest cached pipeline prefix.
+        put(key, raw): Store a recording under a key.
+        stats(): Return the hit/miss statistics and size of the cache.
+        clear(): Delete every checkpoint.
+    """
+
+    def __init__(self,directory:Union[str,os.PathLike],max_bytes:int=None):
+        """
+        Initialize the CheckpointCache object.
+
+        Args:
+            directory (Union[str, os.PathLike]): The directory holding the checkpoints. It is
+            created if needed.
+            max_bytes (int, optional): The size limit of the cache, in bytes. Default is None,
+            which means no limit.
+
+        Returns:
+            None
+        """
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory,exist_ok=True)
+
+    def _path(self,key:str)->str:
+        return os.path.join(self.directory,f'{key}_raw.fif')
+
+    def __contains__(self,key:str)->bool:
+        return os.path.exists(self._path(key))
+
+    def get(self,key:str)->Optional[mne.io.Raw]:
+        """
+        Load the recording stored under a key.
+
+        Args:
+            key (str): The key of the checkpoint.
+
+        Returns:
+            mne.io.Raw: The preloaded recording, or None if the key is not cached.
+        """
+        path = self._path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        self.hits += 1
+        os.utime(path)
+        return mne.io.read_raw_fif(path,preload=True,verbose=False)
+
+    def longest_prefix(self,keys:List[str])->Tuple[int,Optional[mne.io.Raw]]:
+        """
+        Load the checkpoint of the longest cached pipeline prefix.
+
+        Args:
+            keys (List[str]): The keys of the successive steps of a pipeline.
+
+        Returns:
+            Tuple[int, mne.io.Raw]: The number of steps covered by the checkpoint and the
+            preloaded recording, or (0, None) if no prefix is cached.
+        """
+        for n_steps in range(len(keys),0,-1):
+            if keys[n_steps-1] in self:
+                return n_steps, self.get(keys[n_steps-1])
+        self.misses += 1
+        return 0, None
+
+    def put(self,key:str,raw:mne.io.Raw):
+        """
+        Store a recording under a key, then evict entries over the size limit.
+
+        Args:
+            key (str): The key of the checkpoint.
+            raw (mne.io.Raw): The recording to store.
+
+        Returns:
+            None
+        """
+        path = self._path(key)
+        temporary_path = os.path.join(self.directory,f'{key}.{os.getpid()}.tmp_raw.fif')
+        raw.save(temporary_path,fmt='double',overwrite=True,verbose=False)
+        os.replace(temporary_path,path)
+        self._evict()
+
+    def _entries(self)->Dict[str,os.stat_result]:
+        return {
+            entry.path:entry.stat() for entry in os.scandir(self.directory)
+            if entry.name.endswith('_raw.fif') and '.tmp' not in entry.name
+            }
+
+    def _evict(self):
+        """
+        Delete the least recently used checkpoints until the cache fits in 'max_bytes'.
+
+        Returns:
+            None
+        """
+        if self.max_bytes is None:
+            return
+        entries = self._entries()
+        size = sum(stat.st_size for stat in entries.values())
+        for path, stat in sorted(entries.items(),key=lambda item: item[1].st_mtime_ns):
+            if size<=self.max_bytes:
+                break
+            os.remove(path)
+            size -= stat.st_size
+
+    def stats(self)->dict:
+        """
+        Return the hit/miss statistics and size of the cache.
+
+        Returns:
+            dict: The 'hits', 'misses', 'hit_rate', 'entries' and 'bytes' of the cache.
+        """
+        entries = self._entries()
+        lookups = self.hits+self.misses
+        return {
+            'hits':self.hits,
+            'misses':self.misses,
+            'hit_rate':self.hits/lookups if lookups>0 else 0.0,
+            'entries':len(entries),
+            'bytes':sum(stat.st_size for stat in entries.values()),
+        }
+
+    def clear(self):
+        """
+        Delete every checkpoint and reset the statistics.
+
+        Returns:
+            None
+        """
+        for path in self._entries():
+            os.remove(path)
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,444 @@
+"""
+Chunked Processing Module
+
+This module filters recordings and computes their features without holding them in memory.
+The samples are read in blocks of fixed size, either from an mne.io.Raw opened with
+preload=False or from an array that may be a np.memmap. Filters carry their state from one
+block to the next, and features are reduced as the blocks arrive, keeping only the samples
+that the next block needs (the overlap between Welch segments, the last Hjorth segment). The
+memory used therefore depends on the block size and not on the length of the recording, and
+the results match the in-memory functions.
+
+Functions:
+    - read_blocks: Yield consecutive blocks of samples of a recording.
+    - chunked_fused_filter: Apply the filtering of 'fused_filter' block by block.
+    - chunked_features: Compute the band powers and Hjorth parameters block by block.
+
+Classes:
+    - BlockFilter: A causal cascade of second-order sections that carries its state across
+    blocks.
+    - WelchAccumulator: Sums the Welch periodograms of a stream of blocks.
+
+Dependencies:
+    - numpy
+    - scipy (imported when a filter is first applied)
+    - mne
+    - preprocessing (from .preprocessing)
+    - precision, frequency, streaming (from features_computation)
+
+Typical usage example:
+
+    from custom_module import chunked_fused_filter, chunked_features
+
+    raw = mne.io.read_raw_edf(path, preload=False)
+    shape = (len(raw.ch_names), raw.n_times)
+    filtered = np.lib.format.open_memmap('filtered.npy', 'w+', shape=shape)
+    chunked_fused_filter(raw, freqs=50, lpf=40, hpf=1, out=filtered)
+    features = chunked_features(filtered, 125, bands=[(8, 12), (12, 30)])
+"""
+
+# Annotations are not evaluated, so that importing this module does not load mne.io
+from __future__ import annotations
+from typing import Iterator, List, Tuple, Union
+import numpy as np
+import mne
+
+from features_computation.precision import as_policy_dtype, get_dtype
+from features_computation.frequency import _band_weights, _periodogram
+from features_computation.streaming import StreamingHjorth
+from .preprocessing import _fused_sos
+
+default_block_size = 65536
+
+def _n_samples(source:Union[mne.io.Raw,np.ndarray])->Tuple[int,int]:
+    """
+    Return the number of channels and samples of a recording without reading it.
+    """
+    if isinstance(source,mne.io.BaseRaw):
+        return len(source.ch_names), source.n_times
+    return source.shape[0], source.shape[-1]
+
+def _read(source:Union[mne.io.Raw,np.ndarray],start:int,stop:int)->np.ndarray:
+    """
+    Read the samples [start, stop) of a recording, in the dtype of the precision policy.
+    """
+    if isinstance(source,mne.io.BaseRaw):
+        return as_policy_dtype(source.get_data(start=start,stop=stop))
+    return as_policy_dtype(np.asarray(source[:,start:stop]))
+
+def _block_bounds(n_samples:int,block_size:int,reverse:bool=False)->List[Tuple[int,int]]:
+    bounds = [(start,min(start+block_size,n_samples)) for start in range(0,n_samples,block_size)]
+    return bounds[::-1] if reverse else bounds
+
+def read_blocks(
+        source:Union[mne.io.Raw,np.ndarray],block_size:int=default_block_size
+        )->Iterator[np.ndarray]:
+    """
+    Yield consecutive blocks of samples of a recording.
+
+    Only one block is read at a time: an mne.io.Raw opened with preload=False reads it from
+    disk, and a np.memmap only pages it in.
+
+    Args:
+        source (Union[mne.io.Raw, np.ndarray]): The recording, an mne.io.Raw or an array of
+        shape (channels, samples).
+        block_size (int, optional): The number of samples per block. Default is 65536.
+
+    Returns:
+        Iterator[np.ndarray]: Blocks of shape (channels, block_size), the last one possibly
+        shorter, in the dtype of the precision policy.
+
+    Example:
+        >>> raw = mne.io.read_raw_edf(path, preload=False)
+        >>> for block in read_blocks(raw, 125*60):
+        ...     print(block.shape)  # one minute at a time
+    """
+    assert block_size>=1
+    for start,stop in _block_bounds(_n_samples(source)[1],block_size):
+        yield _read(source,start,stop)
+
+class BlockFilter:
+    """
+    A causal cascade of second-order sections applied to a stream of blocks.
+
+    The state of every section is carried from one block to the next, so filtering the blocks
+    in turn gives the same output as filtering their concatenation at once.
+
+    Attributes:
+        sos (np.ndarray): The second-order sections, of shape (n_sections, 6).
+        n_channels (int): Number of channels in the stream.
+        steady_state (bool): Whether the first block starts from the steady state of the filter
+        for its first sample, as scipy.signal.sosfiltfilt does, rather than from rest.
+
+    Methods:
+        process(block): Filter the next block.
+        reset(): Return to the initial state.
+    """
+
+    def __init__(self,sos:np.ndarray,n_channels:int,steady_state:bool=True):
+        """
+        Initialize the BlockFilter object.
+
+        Args:
+            sos (np.ndarray): The second-order sections, of shape (n_sections, 6).
+            n_channels (int): Number of channels in the stream.
+            steady_state (bool, optional): Whether to start from the steady state of the filter
+            for the first sample. Default is True.
+
+        Returns:
+            None
+        """
+        self.sos = np.atleast_2d(sos)
+        self.n_channels = n_channels
+        self.steady_state = steady_state
+        self.reset()
+
+    def reset(self):
+        """
+        Return to the initial state.
+
+        Returns:
+            None
+        """
+        self._zi = None
+
+    def process(self,block:np.ndarray)->np.ndarray:
+        """
+        Filter the next block.
+
+        Args:
+            block (np.ndarray): Samples of shape (n_channels, n_samples).
+
+        Returns:
+            np.ndarray: The filtered samples, of the same shape.
+        """
+        from scipy import signal
+
+        assert block.ndim==2 and block.shape[0]==self.n_channels
+        if block.shape[-1]==0:
+            return block.copy()
+        if self._zi is None:
+            zi = signal.sosfilt_zi(self.sos).astype(block.dtype)[:,np.newaxis,:]
+            self._zi = np.repeat(zi,self.n_channels,axis=1)
+            if self.steady_state:
+                self._zi = self._zi*block[np.newaxis,:,:1]
+            else:
+                self._zi[:] = 0
+        res, self._zi = signal.sosfilt(self.sos,block,axis=-1,zi=self._zi)
+        return res
+
+def _padlen(sos:np.ndarray)->int:
+    """
+    Return the default padding of scipy.signal.sosfiltfilt for a cascade.
+    """
+    n_taps = 2*sos.shape[0]+1-min((sos[:,2]==0).sum(),(sos[:,5]==0).sum())
+    return 3*n_taps
+
+def _chunked_sosfiltfilt(
+        source:Union[mne.io.Raw,np.ndarray],sos:np.ndarray,out:np.ndarray,block_size:int
+        )->np.ndarray:
+    """
+    Filter a recording forward and backward block by block, as scipy.signal.sosfiltfilt.
+
+    The recording is extended at both ends by odd reflection of its first and last samples.
+    The forward pass writes into 'out' and keeps the output over the end extension, from which
+    the backward pass starts; the backward pass then reads 'out' in reverse block order and
+    overwrites it with the result.
+
+    Returns:
+        np.ndarray: 'out', holding the filtered recording.
+    """
+    n_channels, n_samples = _n_samples(source)
+    padlen = _padlen(sos)
+    if n_samples<=padlen:
+        raise ValueError(f"Inpermissible recording, {n_samples} samples are too few to filter")
+    head = _read(source,0,padlen+1)
+    tail = _read(source,n_samples-padlen-1,n_samples)
+    sos = sos.astype(head.dtype)
+    left = 2*head[:,:1]-head[:,padlen:0:-1]
+    right = 2*tail[:,-1:]-tail[:,-2::-1]
+
+    forward = BlockFilter(sos,n_channels)
+    forward.process(left)
+    for start,stop in _block_bounds(n_samples,block_size):
+        out[:,start:stop] = forward.process(_read(source,start,stop))
+    right = forward.process(right)
+
+    backward = BlockFilter(sos,n_channels)
+    backward.process(right[:,::-1])
+    for start,stop in _block_bounds(n_samples,block_size,reverse=True):
+        block = np.asarray(out[:,start:stop],dtype=head.dtype)
+        out[:,start:stop] = backward.process(block[:,::-1])[:,::-1]
+    return out
+
+def chunked_fused_filter(
+        source:Union[mne.io.Raw,np.ndarray],sampling_frequency:float=None,
+        freqs:Union[List[Union[int,float]],int,float]=None,
+        lpf:Union[int,float]=None,hpf:Union[int,float]=None,
+        order:int=4,notch_quality:float=30.0,out:np.ndarray=None,
+        block_size:int=default_block_size
+        )->np.ndarray:
+    """
+    Apply the notch and bandpass filtering of 'fused_filter' to a recording block by block.
+
+    The forward and backward passes each carry the state of the filter across blocks, and the
+    ends of the recording are padded as scipy.signal.sosfiltfilt pads them, so the result is
+    that of 'fused_filter_array' while only a few blocks are held in memory. Passing a
+    np.memmap as 'out' keeps the filtered recording on disk as well.
+
+    Args:
+        source (Union[mne.io.Raw, np.ndarray]): The recording, an mne.io.Raw (which may be
+        opened with preload=False) or an array of shape (channels, samples).
+        sampling_frequency (float, optional): The sampling frequency of the recording. Default
+        is None, which reads it from the mne.io.Raw.
+        freqs (Union[List[Union[int, float]], int, float], optional): The frequencies to notch
+        filter. Default is None.
+        lpf (Union[int, float], optional): The low-pass frequency. Default is None.
+        hpf (Union[int, float], optional): The high-pass frequency. Default is None.
+        order (int, optional): The order of the Butterworth bandpass filter. Default is 4.
+        notch_quality (float, optional): The quality factor of each notch filter. Default is 30.
+        out (np.ndarray, optional): The array of shape (channels, samples) to write the result
+        to, e.g. a np.memmap. Default is None, which allocates one in the dtype of the policy.
+        block_size (int, optional): The number of samples per block. Default is 65536.
+
+    Returns:
+        np.ndarray: The filtered recording, 'out' when it is given.
+
+    Raises:
+        ValueError: If the sampling frequency is missing, if 'out' does not have the shape of
+        the recording, or if the recording is shorter than the padding of the filter.
+
+    Example:
+        >>> raw = mne.io.read_raw_edf(path, preload=False)
+        >>> out = np.lib.format.open_memmap('filtered.npy', 'w+', shape=(16, raw.n_times))
+        >>> chunked_fused_filter(raw, freqs=50, lpf=40, hpf=1, out=out)
+    """
+    assert block_size>=1
+    if sampling_frequency is None:
+        if not isinstance(source,mne.io.BaseRaw):
+            raise ValueError("Inpermissible sampling_frequency, it is required for arrays")
+        sampling_frequency = source.info['sfreq']
+    shape = _n_samples(source)
+    if out is None:
+        out = np.empty(shape,dtype=get_dtype())
+    elif out.shape!=shape:
+        raise ValueError(f"Inpermissible out, of shape {out.shape} instead of {shape}")
+
+    sos = _fused_sos(sampling_frequency,freqs,lpf,hpf,order,notch_quality)
+    if sos.shape[0]==0:
+        for start,stop in _block_bounds(shape[1],block_size):
+            out[:,start:stop] = _read(source,start,stop)
+        return out
+    return _chunked_sosfiltfilt(source,sos,out,block_size)
+
+class WelchAccumulator:
+    """
+    Sum of the Welch periodograms of a stream of blocks.
+
+    The segments are placed as in the 'welch' method over the whole stream: the samples after
+    the last complete segment, which include the overlap with the next one, are carried over
+    to the next block. The spectrum is the mean of the summed periodograms, so it equals the
+    'mean' Welch spectrum of the concatenated blocks.
+
+    Attributes:
+        n_channels (int): Number of channels in the stream.
+        sampling_frequency (float): The sampling frequency of the stream.
+        nperseg (int): The number of samples per segment.
+        noverlap (int): The number of samples shared by consecutive segments.
+        n_segments (int): Number of segments summed so far.
+
+    Methods:
+        update(block): Ingest the next block.
+        spectrum(): Frequencies and mean spectrum of the segments summed so far.
+        bands_power(bands): Log10 of the mean power within each band.
+    """
+
+    def __init__(
+            self,n_channels:int,sampling_frequency:float,nperseg:int=None,noverlap:int=None
+            ):
+        """
+        Initialize the WelchAccumulator object.
+
+        Args:
+            n_channels (int): Number of channels in the stream.
+            sampling_frequency (float): The sampling frequency of the stream.
+            nperseg (int, optional): The number of samples per segment. Default is None, which
+            uses one second, as the 'welch' method.
+            noverlap (int, optional): The number of samples shared by consecutive segments.
+            Default is None, which uses nperseg//8.
+
+        Returns:
+            None
+        """
+        self.n_channels = n_channels
+        self.sampling_frequency = float(sampling_frequency)
+        self.nperseg = int(sampling_frequency) if nperseg is None else int(nperseg)
+        self.noverlap = self.nperseg//8 if noverlap is None else int(noverlap)
+        assert 0<=self.noverlap<self.nperseg
+        self.n_segments = 0
+        self._sum = np.zeros((n_channels,self.nperseg//2+1))
+        self._carry = np.zeros((n_channels,0),dtype=get_dtype())
+
+    def update(self,block:np.ndarray)->int:
+        """
+        Ingest the next block.
+
+        Args:
+            block (np.ndarray): Samples of shape (n_channels, n_samples).
+
+        Returns:
+            int: Number of segments completed by this block.
+        """
+        assert block.ndim==2 and block.shape[0]==self.n_channels
+        data = np.concatenate([self._carry,block.astype(self._carry.dtype,copy=False)],axis=-1)
+        hop = self.nperseg-self.noverlap
+        n_segments = max(0,(data.shape[-1]-self.noverlap)//hop)
+        if n_segments>0:
+            segments = np.lib.stride_tricks.sliding_window_view(data,self.nperseg,axis=-1)
+            segments = segments[:,:n_segments*hop:hop]
+            self._sum += _periodogram(segments,self.sampling_frequency).sum(axis=-2)
+            self.n_segments += n_segments
+        self._carry = data[:,n_segments*hop:].copy()
+        return n_segments
+
+    def spectrum(self)->Tuple[np.ndarray,np.ndarray]:
+        """
+        Return the mean spectrum of the segments summed so far.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The frequencies, and the spectrum of shape
+            (n_channels, nperseg//2 + 1) in the dtype of the precision policy.
+
+        Raises:
+            ValueError: If no segment is complete.
+        """
+        if self.n_segments==0:
+            raise ValueError("Inpermissible stream, no segment is complete")
+        freqs = np.fft.rfftfreq(self.nperseg,1/self.sampling_frequency)
+        return freqs, (self._sum/self.n_segments).astype(get_dtype())
+
+    def bands_power(self,bands:List[Tuple[float,float]])->np.ndarray:
+        """
+        Return the log10 of the mean power within each band, as 'bands_power'.
+
+        Args:
+            bands (List[Tuple[float, float]]): The frequency bands of interest.
+
+        Returns:
+            np.ndarray: Array of shape (n_channels, len(bands)).
+
+        Raises:
+            ValueError: If no segment is complete.
+        """
+        _, spectrum = self.spectrum()
+        bands = tuple((float(band[0]),float(band[1])) for band in bands)
+        weights = _band_weights(self.sampling_frequency,self.nperseg,bands,spectrum.dtype.name)
+        return np.log10(spectrum @ weights.T)
+
+def chunked_features(
+        source:Union[mne.io.Raw,np.ndarray],sampling_frequency:float=None,
+        bands:List[Tuple[float,float]]=None,hjorth_segment_size:int=None,
+        ch_names:List[str]=None,nperseg:int=None,noverlap:int=None,
+        block_size:int=default_block_size
+        )->dict:
+    """
+    Compute the band powers and Hjorth parameters of a recording in a single pass over blocks.
+
+    Each block feeds a WelchAccumulator and a StreamingHjorth, which keep the samples they
+    need from one block to the next, so the results are those of 'bands_power' (with the
+    'welch' method and 'mean' average) and 'hjorth_2D' on the whole recording.
+
+    Args:
+        source (Union[mne.io.Raw, np.ndarray]): The recording, an mne.io.Raw (which may be
+        opened with preload=False) or an array of shape (channels, samples), e.g. the output of
+        'chunked_fused_filter'.
+        sampling_frequency (float, optional): The sampling frequency of the recording. Default
+        is None, which reads it from the mne.io.Raw.
+        bands (List[Tuple[float, float]], optional): The frequency bands of interest. Default
+        is None, which skips the band powers.
+        hjorth_segment_size (int, optional): The segment size of 'hjorth_2D'. Default is None,
+        which skips the Hjorth parameters.
+        ch_names (List[str], optional): The channel names of the Hjorth parameters. Default is
+        None, which uses those of the mne.io.Raw, if any.
+        nperseg (int, optional): The number of samples per Welch segment. Default is None,
+        which uses one second.
+        noverlap (int, optional): The number of samples shared by Welch segments. Default is
+        None, which uses nperseg//8.
+        block_size (int, optional): The number of samples per block. Default is 65536.
+
+    Returns:
+        dict: The array of shape (channels, len(bands)) under 'bands_power' and the DataFrame
+        of 'hjorth_2D' under 'hjorth', for the features that are requested.
+
+    Raises:
+        ValueError: If the sampling frequency is missing for the band powers.
+
+    Example:
+        >>> raw = mne.io.read_raw_edf(path, preload=False)
+        >>> features = chunked_features(raw, bands=[(8, 12), (12, 30)], hjorth_segment_size=10)
+        >>> features['bands_power'].shape  # (n_channels, 2)
+    """
+    n_channels, _ = _n_samples(source)
+    if isinstance(source,mne.io.BaseRaw):
+        if sampling_frequency is None:
+            sampling_frequency = source.info['sfreq']
+        if ch_names is None:
+            ch_names = source.ch_names
+
+    reducers = {}
+    if bands is not None:
+        if sampling_frequency is None:
+            raise ValueError("Inpermissible sampling_frequency, it is required for band powers")
+        reducers['bands_power'] = WelchAccumulator(n_channels,sampling_frequency,nperseg,noverlap)
+    if hjorth_segment_size is not None:
+        reducers['hjorth'] = StreamingHjorth(n_channels,hjorth_segment_size,ch_names=ch_names)
+    for block in read_blocks(source,block_size):
+        for reducer in reducers.values():
+            reducer.update(block)
+
+    res = {}
+    if bands is not None:
+        res['bands_power'] = reducers['bands_power'].bands_power(bands)
+    if hjorth_segment_size is not None:
+        res['hjorth'] = reducers['hjorth'].parameters()
+    return res
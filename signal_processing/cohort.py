@@ -0,0 +1,176 @@
+"""
+Cohort Preprocessing Module
+
+This module provides a runner that preprocesses many recordings in parallel with the steps
+of a PrepocessingPipeline.
+
+Functions:
+    - run_cohort: Preprocess a list of recordings in a process pool and yield each result as
+    soon as it is ready.
+
+Classes:
+    - CohortResult: The outcome of preprocessing one recording.
+
+"""
+
+# Annotations are not evaluated, so that importing this module does not load mne.io
+from __future__ import annotations
+from typing import Callable, Iterator, List, Union
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import os
+import traceback
+import mne
+
+from .preprocessing import PrepocessingPipeline
+
+CohortResult = namedtuple('CohortResult',['path','result','error'])
+CohortResult.__doc__ = """
+    The outcome of preprocessing one recording.
+
+    Attributes:
+        path (str): The path of the recording.
+        result: The preprocessed mne.io.Raw, or the output of 'postprocess' when one is given.
+        None if the recording failed.
+        error (str): The formatted traceback if the recording failed, otherwise None.
+"""
+
+def _process_recording(
+        path:str,methods:list,reader:Callable,reader_kwargs:dict,
+        postprocess:Callable
+        )->CohortResult:
+    """
+    Read and preprocess one recording, capturing any failure.
+
+    Args:
+        path (str): The path of the recording.
+        methods (list): A list of preprocessing methods to apply.
+        reader (Callable): Function reading the recording into an mne.io.Raw.
+        reader_kwargs (dict): Keyword arguments passed to the reader.
+        postprocess (Callable): Function applied to the preprocessed recording, or None.
+
+    Returns:
+        CohortResult: The outcome of preprocessing the recording.
+    """
+    try:
+        raw = reader(path,**reader_kwargs)
+        # The worker owns the recording, so there is nothing to protect with a copy
+        res = PrepocessingPipeline(os.path.basename(path),methods,mode='inplace').forward(raw)
+        if postprocess is not None:
+            res = postprocess(res)
+        return CohortResult(path,res,None)
+    except Exception:
+        return CohortResult(path,None,traceback.format_exc())
+
+def run_cohort(
+        paths:List[Union[str,os.PathLike]],methods:list,
+        n_workers:int=None,max_in_flight:int=None,
+        reader:Callable=None,reader_kwargs:dict=None,
+        postprocess:Callable=None
+        )->Iterator[CohortResult]:
+    """
+    Preprocess a list of recordings in a process pool.
+
+    At most ``max_in_flight`` recordings are submitted at any time, which bounds memory to
+    that many recordings whatever the size of the cohort. Results are yielded in completion
+    order as soon as each recording finishes. A failing recording is reported through the
+    'error' field of its result and does not stop the others. If a worker dies (e.g. killed
+    for lack of memory), the recordings that were in flight are run again one at a time in a
+    new pool, and only the one whose worker dies again is reported as failed.
+
+    The methods, reader and postprocess callables are sent to the worker processes, so they
+    must be picklable (e.g. module-level functions such as those of 'preprocessing').
+
+    Args:
+        paths (List[Union[str, os.PathLike]]): The paths of the recordings.
+        methods (list): A list of preprocessing methods to apply, as for PrepocessingPipeline.
+        n_workers (int, optional): The number of worker processes. Default is None, which uses
+        the number of CPUs.
+        max_in_flight (int, optional): The maximum number of recordings submitted at once.
+        Default is None, which uses twice the number of workers.
+        reader (Callable, optional): Function reading a path into an mne.io.Raw.
+        Default is None, which uses mne.io.read_raw.
+        reader_kwargs (dict, optional): Keyword arguments passed to the reader. Default is None,
+        which opens the recording without preloading it, so that the pipeline only reads the
+        part kept by its shrinking steps, and silences MNE's logging.
+        postprocess (Callable, optional): Function applied to each preprocessed recording in
+        the worker, e.g. to compute features, so that only its output is sent back.
+        Default is None.
+
+    Yields:
+        CohortResult: The outcome of preprocessing each recording.
+
+    Example:
+        >>> from signal_processing.preprocessing import rename_channels, custom_filter
+        >>> methods = [(rename_channels,), (custom_filter, {'lpf': 40, 'hpf': 1})]
+        >>> for res in run_cohort(paths, methods, n_workers=8):
+        ...     if res.error is not None:
+        ...         print(res.path, res.error)
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2*n_workers
+    assert max_in_flight>=1
+    if reader is None:
+        reader = mne.io.read_raw
+    if reader_kwargs is None:
+        reader_kwargs = {'preload':False,'verbose':False}
+
+    def submit(executor:ProcessPoolExecutor,path:str):
+        return executor.submit(
+            _process_recording,path,methods,reader,reader_kwargs,postprocess
+            )
+
+    pending_paths = iter(paths)
+    # Paths that were in flight when a worker died. They run one at a time in a new pool, so
+    # that the crash is charged to the recording that caused it and the others still run.
+    suspects = []
+    in_flight = {}
+    executor = ProcessPoolExecutor(max_workers=n_workers)
+    try:
+        while True:
+            broken = False
+            limit = 1 if len(suspects)>0 else max_in_flight
+            while len(in_flight)<limit:
+                path = suspects.pop(0) if len(suspects)>0 else next(pending_paths,None)
+                if path is None:
+                    break
+                try:
+                    in_flight[submit(executor,str(path))] = str(path)
+                except BrokenProcessPool:
+                    suspects.insert(0,str(path))
+                    broken = True
+                    break
+            if len(in_flight)==0 and not broken:
+                return
+
+            crashed = []
+            if len(in_flight)>0:
+                done, _ = wait(in_flight,return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = in_flight.pop(future)
+                    exc = future.exception()
+                    if isinstance(exc,BrokenProcessPool):
+                        crashed.append((path,exc))
+                    elif exc is not None:
+                        error = ''.join(traceback.format_exception(type(exc),exc,exc.__traceback__))
+                        yield CohortResult(path,None,error)
+                    else:
+                        yield future.result()
+            if len(crashed)==0 and not broken:
+                continue
+
+            # every recording still in flight was lost with the pool, and a recording lost
+            # alone is the one whose worker died
+            lost = [path for path,_ in crashed]+list(in_flight.values())
+            in_flight = {}
+            if len(crashed)==1 and len(lost)==1:
+                path, exc = crashed[0]
+                error = ''.join(traceback.format_exception(type(exc),exc,exc.__traceback__))
+                yield CohortResult(path,None,error)
+            else:
+                suspects = lost+suspects
+            executor.shutdown(wait=True)
+            executor = ProcessPoolExecutor(max_workers=n_workers)
+    finally:
+        executor.shutdown(wait=True)
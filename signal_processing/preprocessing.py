@@ -7,19 +7,32 @@ Functions:
     - drop_accelerometer_channels: Drop accelerometer channels from raw data.
     - rename_channels: Rename channels in raw data based on a predefined mapping.
     - extract_recording_center: Extract a percentage of the recording centered around its duration.
+    - read_recording: Read a recording from disk, loading only its center when requested.
     - notch_filter: Apply a notch filter to raw data.
     - custom_filter: Apply a custom bandpass filter to raw data.
+    - fused_filter: Apply notch and bandpass filtering to raw data in a single IIR pass.
+    - fused_filter_array: Apply the filtering of 'fused_filter' to an array, in the dtype of
+    the precision policy.
 
 Classes:
     - PreprocessingPipeline: A subclass of Pipeline for executing a sequence of preprocessing steps.
 
 """
 
-from typing import List, Union
+# Annotations are not evaluated, so that importing this module does not load mne.io
+from __future__ import annotations
+from typing import List, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import copy
+import os
+import tracemalloc
+import numpy as np
 import mne
 
 from pipeline.pipeline import Pipeline
+from features_computation.precision import as_policy_dtype
+from .checkpoint import CheckpointCache, recording_hash, step_key
 
 channels_map = {
   'EEG 1':'Fp1',
@@ -70,6 +83,10 @@ def extract_recording_center(raw:mne.io.Raw,percentage:int=75)->mne.io.Raw:
     """
     Extract a percentage of the recording centered around its duration.
 
+    The window is computed from the header (number of samples and sampling frequency) only.
+    If the raw data is not preloaded, nothing is read from disk: the crop is recorded and only
+    the extracted samples are read when the data is loaded.
+
     Args:
         raw (mne.io.Raw): The raw data.
         percentage (int): The percentage of the recording to extract. Default is 75.
@@ -82,6 +99,27 @@ def extract_recording_center(raw:mne.io.Raw,percentage:int=75)->mne.io.Raw:
     raw.crop(tmin=((1-percentage)/2)*time_,tmax=(((1-percentage)/2)+percentage)*time_)
     return raw
 
+def read_recording(path:str,percentage:int=None)->mne.io.Raw:
+    """
+    Read a recording from disk, loading only its center when requested.
+
+    The recording is opened without preloading, cropped with 'extract_recording_center' if a
+    percentage is given, and only then loaded, so the discarded samples are never read.
+
+    Args:
+        path (str): The path of the recording, in any format supported by mne.io.read_raw.
+        percentage (int, optional): The percentage of the recording to extract. Default is None,
+        which loads the whole recording.
+
+    Returns:
+        mne.io.Raw: The preloaded raw data.
+    """
+    raw = mne.io.read_raw(path,preload=False,verbose=False)
+    if percentage is not None:
+        raw = extract_recording_center(raw,percentage)
+    raw.load_data(verbose=False)
+    return raw
+
 def notch_filter(raw:mne.io.Raw,freqs:Union[List[Union[int,float]],int,float])->mne.io.Raw:
     """
     Apply a notch filter to raw data.
@@ -111,34 +149,252 @@ def custom_filter(raw:mne.io.Raw,lpf:Union[int,float]=None,hpf:Union[int,float]=
     raw.filter(hpf,lpf)
     return raw
 
+@lru_cache(maxsize=64)
+def _design_fused_sos(
+        sfreq:float,freqs:Tuple[float,...],hpf:float,lpf:float,
+        order:int,notch_quality:float
+        )->np.ndarray:
+    """
+    Design a single second-order-sections cascade holding notch and bandpass filters.
+
+    The result is cached, so every recording sharing the same settings reuses one design.
+
+    Args:
+        sfreq (float): The sampling frequency of the data.
+        freqs (Tuple[float, ...]): The frequencies to notch filter.
+        hpf (float): The high-pass frequency, or None.
+        lpf (float): The low-pass frequency, or None.
+        order (int): The order of the Butterworth bandpass filter.
+        notch_quality (float): The quality factor of each notch filter.
+
+    Returns:
+        np.ndarray: Read-only array of second-order sections of shape (n_sections, 6).
+    """
+    from scipy import signal
+
+    sections = []
+    for freq in freqs:
+        b, a = signal.iirnotch(freq,notch_quality,fs=sfreq)
+        sections.append(signal.tf2sos(b,a))
+    if hpf is not None and lpf is not None:
+        sections.append(signal.butter(order,[hpf,lpf],btype='bandpass',output='sos',fs=sfreq))
+    elif hpf is not None:
+        sections.append(signal.butter(order,hpf,btype='highpass',output='sos',fs=sfreq))
+    elif lpf is not None:
+        sections.append(signal.butter(order,lpf,btype='lowpass',output='sos',fs=sfreq))
+    sos = np.concatenate(sections) if len(sections)>0 else np.empty((0,6))
+    sos.setflags(write=False)
+    return sos
+
+def fused_filter(
+        raw:mne.io.Raw,freqs:Union[List[Union[int,float]],int,float]=None,
+        lpf:Union[int,float]=None,hpf:Union[int,float]=None,
+        order:int=4,notch_quality:float=30.0,n_jobs:int=None
+        )->mne.io.Raw:
+    """
+    Apply notch and bandpass filtering to raw data in a single pass.
+
+    The notch filters and the Butterworth band are combined into one cascade of second-order
+    sections, designed once per (sfreq, freqs, hpf, lpf) and cached. The cascade is applied
+    forward and backward (zero phase, like 'notch_filter' and 'custom_filter') to blocks of
+    channels on a thread pool. The raw data must be preloaded.
+
+    Args:
+        raw (mne.io.Raw): The raw data.
+        freqs (Union[List[Union[int, float]], int, float], optional): The frequencies to notch
+        filter. Default is None.
+        lpf (Union[int, float], optional): The low-pass frequency. Default is None.
+        hpf (Union[int, float], optional): The high-pass frequency. Default is None.
+        order (int, optional): The order of the Butterworth bandpass filter. Default is 4.
+        notch_quality (float, optional): The quality factor of each notch filter. Default is 30.
+        n_jobs (int, optional): The number of threads. Default is None, which uses one thread
+        per channel up to the number of CPUs.
+
+    Returns:
+        mne.io.Raw: The raw data after filtering.
+    """
+    sos = _fused_sos(float(raw.info['sfreq']),freqs,lpf,hpf,order,notch_quality)
+    if sos.shape[0]==0:
+        return raw
+    raw.apply_function(
+        lambda data: _sosfiltfilt_channels(sos,data,n_jobs),channel_wise=False
+        )
+    return raw
+
+def _fused_sos(
+        sampling_frequency:float,freqs:Union[List[Union[int,float]],int,float],
+        lpf:Union[int,float],hpf:Union[int,float],order:int,notch_quality:float
+        )->np.ndarray:
+    """
+    Return a writable copy of the cached cascade of 'fused_filter'.
+
+    Returns:
+        np.ndarray: The second-order sections, of shape (n_sections, 6).
+    """
+    if freqs is None:
+        freqs = []
+    elif isinstance(freqs,(int,float)):
+        freqs = [freqs]
+    return _design_fused_sos(
+        float(sampling_frequency),tuple(float(freq) for freq in freqs),
+        None if hpf is None else float(hpf),None if lpf is None else float(lpf),
+        order,notch_quality
+        ).copy()
+
+def _sosfiltfilt_channels(sos:np.ndarray,data:np.ndarray,n_jobs:int=None)->np.ndarray:
+    """
+    Filter blocks of channels forward and backward in place, on a thread pool.
+
+    Args:
+        sos (np.ndarray): The second-order sections.
+        data (np.ndarray): The data, of shape (channels, samples), overwritten with the result.
+        n_jobs (int, optional): The number of threads. Default is None, which uses one thread
+        per channel up to the number of CPUs.
+
+    Returns:
+        np.ndarray: The filtered data.
+    """
+    from scipy import signal
+
+    workers = min(data.shape[0],n_jobs or os.cpu_count() or 1)
+    blocks = np.array_split(np.arange(data.shape[0]),workers)
+    def _filter_block(block):
+        data[block] = signal.sosfiltfilt(sos,data[block],axis=-1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(_filter_block,blocks))
+    return data
+
+def fused_filter_array(
+        data:np.ndarray,sampling_frequency:float,
+        freqs:Union[List[Union[int,float]],int,float]=None,
+        lpf:Union[int,float]=None,hpf:Union[int,float]=None,
+        order:int=4,notch_quality:float=30.0,n_jobs:int=None
+        )->np.ndarray:
+    """
+    Apply the notch and bandpass filtering of 'fused_filter' to an array.
+
+    mne.io.Raw always stores its data in float64, so this is the way to keep preprocessing in
+    float32 under a float32 precision policy: the data and the filter coefficients are cast to
+    the dtype of the policy and the filter runs in that dtype.
+
+    Args:
+        data (np.ndarray): The data, of shape (channels, samples).
+        sampling_frequency (float): The sampling frequency of the data.
+        freqs (Union[List[Union[int, float]], int, float], optional): The frequencies to notch
+        filter. Default is None.
+        lpf (Union[int, float], optional): The low-pass frequency. Default is None.
+        hpf (Union[int, float], optional): The high-pass frequency. Default is None.
+        order (int, optional): The order of the Butterworth bandpass filter. Default is 4.
+        notch_quality (float, optional): The quality factor of each notch filter. Default is 30.
+        n_jobs (int, optional): The number of threads. Default is None, which uses one thread
+        per channel up to the number of CPUs.
+
+    Returns:
+        np.ndarray: A filtered copy of the data, in the dtype of the policy.
+
+    Example:
+        >>> from features_computation.precision import dtype_policy
+        >>> with dtype_policy('float32'):
+        ...     filtered = fused_filter_array(raw.get_data(), 125, 50, lpf=40, hpf=1)
+    """
+    data = np.array(as_policy_dtype(data),ndmin=2)
+    sos = _fused_sos(sampling_frequency,freqs,lpf,hpf,order,notch_quality).astype(data.dtype)
+    if sos.shape[0]==0:
+        return data
+    return _sosfiltfilt_channels(sos,data,n_jobs)
+
+# Steps that reduce the amount of data, and only depend on the recording layout, so they can
+# run before the other steps and leave fewer samples for filters to process
+shrinking_methods = [extract_recording_center, drop_accelerometer_channels]
+
+execution_modes = ['copy', 'inplace']
+
 class PrepocessingPipeline(Pipeline):
     """
     Preprocessing Pipeline Class
 
     A subclass of Pipeline for executing a sequence of preprocessing steps.
 
+    Each step receives the output of the previous one. Recordings opened with preload=False
+    stay on disk while the steps from 'shrinking_methods' run, and are loaded right before the
+    first other step, so only the samples and channels they keep are read. In 'copy' mode the
+    input recording is copied once and the steps then work on that copy in place, so the
+    caller's data is left untouched at the cost of one extra recording in memory. In 'inplace'
+    mode no copy is made and the input recording itself is modified, which keeps peak memory
+    at a single recording.
+
     Attributes:
         name (str): The name of the pipeline.
         methods (list): A list of preprocessing methods to apply.
+        mode (str): The execution mode, 'copy' or 'inplace'.
+        shrink_first (bool): Whether steps from 'shrinking_methods' run before the others.
+        track_memory (bool): Whether the peak memory of each forward pass is recorded.
+        peak_memory (int): Peak memory, in bytes, allocated during the last forward pass when
+        'track_memory' is set, otherwise None.
+        cache (CheckpointCache): Store of the output of every step, or None.
+        profile (bool): Whether the executed steps are profiled, see Pipeline.
 
     Methods:
-        __init__(name, methods): Initialize the PreprocessingPipeline object.
+        __init__(name, methods, mode, shrink_first, track_memory, cache, profile,
+        profile_memory): Initialize the PreprocessingPipeline object.
+        ordered_methods(): Return the steps in the order they are executed.
         forward(raw): Perform forward pass through the preprocessing pipeline.
 
     """
 
-    def __init__(self,name:str,methods):
+    def __init__(
+            self,name:str,methods,mode:str='copy',
+            shrink_first:bool=True,track_memory:bool=False,
+            cache:CheckpointCache=None,profile:bool=False,profile_memory:bool=False
+            ):
         """
         Initialize the PreprocessingPipeline object.
 
         Args:
             name (str): The name of the pipeline.
             methods (list): A list of preprocessing methods to apply.
+            mode (str, optional): 'copy' to work on a single copy of the input, or 'inplace' to
+            modify the input without copying it. Default is 'copy'.
+            shrink_first (bool, optional): Run the steps listed in 'shrinking_methods' before the
+            other steps, keeping their relative order. Default is True.
+            track_memory (bool, optional): Record the peak memory allocated during each forward
+            pass in 'peak_memory'. Default is False.
+            cache (CheckpointCache, optional): Store the output of every step, keyed by the
+            input recording and the steps (function and kwargs) that produced it, so that
+            'forward' resumes from the longest cached prefix. Hashing a lazily opened
+            recording reads its whole file, see 'recording_hash'. Default is None.
+            profile (bool, optional): Profile every executed step, see Pipeline. Steps loaded
+            from the cache are not profiled. Default is False.
+            profile_memory (bool, optional): Also measure the peak memory of every step.
+            Default is False.
 
         Returns:
             None
+
+        Raises:
+            ValueError: If an invalid execution mode is specified.
+        """
+        super().__init__(name,methods,profile,profile_memory)
+        if mode not in execution_modes:
+            raise ValueError(f"Inpermissible execution mode, {mode} is used")
+        self.mode = mode
+        self.shrink_first = shrink_first
+        self.track_memory = track_memory
+        self.peak_memory = None
+        self.cache = cache
+
+    def ordered_methods(self)->list:
+        """
+        Return the preprocessing steps in the order they are executed.
+
+        Returns:
+            list: The steps, with those from 'shrinking_methods' first when 'shrink_first' is set.
         """
-        super().__init__(name,methods)
+        if not self.shrink_first:
+            return list(self.methods)
+        shrinking = [method for method in self.methods if method[0] in shrinking_methods]
+        others = [method for method in self.methods if method[0] not in shrinking_methods]
+        return shrinking+others
 
     def forward(self, raw:mne.io.Raw)->mne.io.Raw:
         """
@@ -148,13 +404,39 @@ class PrepocessingPipeline(Pipeline):
             raw (mne.io.Raw): The raw data.
 
         Returns:
-            mne.io.Raw: The preprocessed raw data.
+            mne.io.Raw: The preprocessed raw data. In 'inplace' mode this is the input object,
+            unless a checkpoint was loaded from the cache.
         """
-        res = copy.deepcopy(raw)
-        for method in self.methods:
-            if len(method)==2:
-                res = method[0](raw,**method[1])
-            elif len(method)==1:
-              res = method[0](raw)
+        self._begin_pass()
+        if self.track_memory:
+            was_tracing = tracemalloc.is_tracing()
+            if not was_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+
+        methods = self.ordered_methods()
+        n_cached = 0
+        if self.cache is not None:
+            keys = []
+            key = recording_hash(raw)
+            for method in methods:
+                key = step_key(key,method)
+                keys.append(key)
+            n_cached, res = self.cache.longest_prefix(keys)
+
+        if n_cached==0:
+            res = copy.deepcopy(raw) if self.mode=='copy' else raw
+        for step_no in range(n_cached,len(methods)):
+            method = methods[step_no]
+            if not res.preload and method[0] not in shrinking_methods:
+                res.load_data(verbose=False)
+            res = self.run_step(step_no,method,res)
+            if self.cache is not None:
+                self.cache.put(keys[step_no],res)
+
+        if self.track_memory:
+            self.peak_memory = self._traced_peak()-baseline
+            if not was_tracing:
+                tracemalloc.stop()
         return res
-    
\ No newline at end of file
@@ -0,0 +1,526 @@
+"""
+Preprocessing Tests Module
+
+This module contains tests for the preprocessing steps and the PrepocessingPipeline class.
+
+Tests:
+    - test_pipeline_copy_mode: Test that 'copy' mode leaves the input recording untouched.
+    - test_pipeline_inplace_mode: Test that 'inplace' mode modifies the input recording.
+    - test_pipeline_shrink_first: Test that shrinking steps are executed first.
+    - test_fused_filter: Test that 'fused_filter' removes the notch frequency and keeps the band.
+    - test_run_cohort: Test that 'run_cohort' preprocesses every recording and reports failures.
+    - test_run_cohort_worker_crash: Test that a dying worker only fails its own recording.
+    - test_checkpoint_cache: Test that pipelines resume from the longest cached prefix.
+    - test_lazy_loading: Test that recordings opened lazily only load the extracted center.
+    - test_pipeline_profiling: Test the per-step profiling and hooks of the pipeline.
+    - test_fused_filter_array: Test array filtering against 'fused_filter' in both precisions.
+    - test_chunked_fused_filter: Test block-wise filtering of arrays and lazy recordings.
+    - test_chunked_features: Test block-wise band powers and Hjorth parameters.
+    - test_chunked_memory: Test that block-wise processing uses memory bounded by the block size.
+
+Fixtures:
+    - openBCI_raw: Fixture providing an OpenBCI-like recording with accelerometer channels.
+
+Dependencies:
+    - json
+    - os
+    - tracemalloc
+    - pytest
+    - numpy
+    - mne
+    - preprocessing (from .preprocessing)
+    - cohort (from .cohort)
+    - checkpoint (from .checkpoint)
+    - chunked (from .chunked)
+    - precision (from features_computation.precision)
+    - frequency, time (from features_computation)
+
+"""
+
+import json
+import os
+import tracemalloc
+import pytest
+import numpy as np
+import mne
+from .preprocessing import (
+    channels_map, drop_accelerometer_channels, rename_channels,
+    extract_recording_center, read_recording, notch_filter, custom_filter, fused_filter,
+    fused_filter_array, _design_fused_sos, PrepocessingPipeline
+)
+from .cohort import run_cohort
+from .checkpoint import CheckpointCache, recording_hash
+from .chunked import BlockFilter, chunked_features, chunked_fused_filter, read_blocks
+from features_computation.precision import dtype_policy
+from features_computation.frequency import bands_power
+from features_computation.time import hjorth_2D
+
+@pytest.fixture
+def openBCI_raw(sampling_frequency):
+    ch_names = list(channels_map.keys())+['Accel X','Accel Y','Accel Z']
+    info = mne.create_info(ch_names,sampling_frequency,ch_types='eeg')
+    data = np.random.randn(len(ch_names),sampling_frequency*20)*1e-5
+    return mne.io.RawArray(data,info,verbose=False)
+
+@pytest.fixture
+def preprocessing_methods():
+    return [
+        (drop_accelerometer_channels,),
+        (rename_channels,),
+        (notch_filter,{'freqs':50}),
+        (custom_filter,{'lpf':40,'hpf':1}),
+        (extract_recording_center,{'percentage':50}),
+    ]
+
+def test_pipeline_copy_mode(openBCI_raw,preprocessing_methods):
+    """
+    Test that 'copy' mode chains the steps on a copy and leaves the input untouched.
+
+    Args:
+        openBCI_raw: The OpenBCI-like recording.
+        preprocessing_methods: The preprocessing steps.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the input is modified or the output is not fully preprocessed.
+    """
+    original = openBCI_raw.get_data()
+    pipeline = PrepocessingPipeline('copy',preprocessing_methods,mode='copy',track_memory=True)
+    res = pipeline.forward(openBCI_raw)
+    assert res is not openBCI_raw
+    assert np.array_equal(openBCI_raw.get_data(),original)
+    assert res.ch_names == list(channels_map.values())
+    assert res.n_times < openBCI_raw.n_times
+    assert pipeline.peak_memory >= original.nbytes
+
+def test_pipeline_inplace_mode(openBCI_raw,preprocessing_methods):
+    """
+    Test that 'inplace' mode chains the steps on the input recording itself.
+
+    Args:
+        openBCI_raw: The OpenBCI-like recording.
+        preprocessing_methods: The preprocessing steps.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the output is not the input object or differs from 'copy' mode.
+    """
+    expected = PrepocessingPipeline('reference',preprocessing_methods).forward(openBCI_raw)
+    pipeline = PrepocessingPipeline('inplace',preprocessing_methods,mode='inplace',track_memory=True)
+    res = pipeline.forward(openBCI_raw)
+    assert res is openBCI_raw
+    assert np.allclose(res.get_data(),expected.get_data())
+    assert pipeline.peak_memory is not None
+    with pytest.raises(ValueError):
+        PrepocessingPipeline('invalid',preprocessing_methods,mode='lazy')
+
+def test_pipeline_shrink_first(preprocessing_methods):
+    """
+    Test that steps from 'shrinking_methods' are executed before the other steps.
+
+    Args:
+        preprocessing_methods: The preprocessing steps.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the execution order is unexpected.
+    """
+    ordered = PrepocessingPipeline('ordered',preprocessing_methods).ordered_methods()
+    assert [method[0] for method in ordered] == [
+        drop_accelerometer_channels,extract_recording_center,
+        rename_channels,notch_filter,custom_filter
+        ]
+    unordered = PrepocessingPipeline(
+        'unordered',preprocessing_methods,shrink_first=False
+        ).ordered_methods()
+    assert unordered == preprocessing_methods
+
+def test_fused_filter(sampling_frequency):
+    """
+    Test the 'fused_filter' function.
+
+    Args:
+        sampling_frequency: The sampling frequency of the EEG data.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the notch frequency or the out-of-band drift survive, if the
+        in-band oscillation is attenuated, or if the filter design is not reused.
+    """
+    times = np.arange(sampling_frequency*60)/sampling_frequency
+    in_band = np.sin(2*np.pi*10*times)
+    data = np.tile(in_band+np.sin(2*np.pi*50*times)+np.sin(2*np.pi*0.1*times),(4,1))*1e-5
+    info = mne.create_info(4,sampling_frequency,ch_types='eeg')
+
+    _design_fused_sos.cache_clear()
+    for _ in range(2):
+        raw = mne.io.RawArray(data.copy(),info,verbose=False)
+        res = fused_filter(raw,freqs=[50],lpf=40,hpf=1,n_jobs=2)
+    assert res is raw
+    assert _design_fused_sos.cache_info().hits == 1
+
+    edge = sampling_frequency*10
+    filtered = res.get_data()[:,edge:-edge]*1e5
+    assert np.allclose(filtered,in_band[edge:-edge],atol=1e-2)
+
+def _data_shape(raw):
+    return raw.get_data().shape
+
+def test_run_cohort(openBCI_raw,preprocessing_methods,tmp_path):
+    """
+    Test the 'run_cohort' function.
+
+    Args:
+        openBCI_raw: The OpenBCI-like recording.
+        preprocessing_methods: The preprocessing steps.
+        tmp_path: Temporary directory provided by pytest.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If a recording is missing from the results, if a valid recording
+        fails, or if the invalid recording is not reported as failed.
+    """
+    paths = []
+    for recording_no in range(3):
+        path = tmp_path/f'recording_{recording_no}_raw.fif'
+        openBCI_raw.save(path,verbose=False)
+        paths.append(path)
+    paths.append(tmp_path/'missing_raw.fif')
+
+    results = {
+        res.path:res for res in run_cohort(
+            paths,preprocessing_methods,n_workers=2,max_in_flight=2,postprocess=_data_shape
+            )
+        }
+    assert sorted(results) == sorted(str(path) for path in paths)
+    for path in paths[:-1]:
+        assert results[str(path)].error is None
+        assert results[str(path)].result == (16,openBCI_raw.n_times//2+1)
+    assert results[str(paths[-1])].result is None
+    assert results[str(paths[-1])].error is not None
+
+def _crashing_reader(path:str,**kwargs)->mne.io.Raw:
+    if 'crash' in os.path.basename(path):
+        os._exit(1)
+    return mne.io.read_raw(path,**kwargs)
+
+def test_run_cohort_worker_crash(openBCI_raw,preprocessing_methods,tmp_path):
+    """
+    Test that 'run_cohort' reports a recording whose worker dies as failed, and still
+    preprocesses every other recording, including those in flight when the worker died.
+
+    Args:
+        openBCI_raw: The OpenBCI-like recording.
+        preprocessing_methods: The preprocessing steps.
+        tmp_path: Temporary directory provided by pytest.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If a recording is missing from the results, or if the crash is
+        charged to another recording.
+    """
+    paths = []
+    for name in ('a','crash','c','d','e','f'):
+        path = tmp_path/f'{name}_raw.fif'
+        openBCI_raw.save(path,verbose=False)
+        paths.append(path)
+
+    results = {
+        res.path:res for res in run_cohort(
+            paths,preprocessing_methods,n_workers=2,max_in_flight=3,
+            reader=_crashing_reader,postprocess=_data_shape
+            )
+        }
+    assert sorted(results) == sorted(str(path) for path in paths)
+    for path in paths:
+        if 'crash' in path.name:
+            assert results[str(path)].result is None
+            assert 'BrokenProcessPool' in results[str(path)].error
+        else:
+            assert results[str(path)].error is None
+            assert results[str(path)].result == (16,openBCI_raw.n_times//2+1)
+
+def test_checkpoint_cache(openBCI_raw,preprocessing_methods,tmp_path):
+    """
+    Test the 'CheckpointCache' class through PrepocessingPipeline.
+
+    Args:
+        openBCI_raw: The OpenBCI-like recording.
+        preprocessing_methods: The preprocessing steps.
+        tmp_path: Temporary directory provided by pytest.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If a changed last step does not resume from the cached prefix, if the
+        cached results differ from uncached ones, if the size limit is not enforced, or if a
+        recording modified in place keeps its hash.
+    """
+    cache = CheckpointCache(tmp_path/'cache')
+    PrepocessingPipeline('first',preprocessing_methods,cache=cache).forward(openBCI_raw)
+    assert cache.stats()['misses'] == 1
+    assert cache.stats()['entries'] == len(preprocessing_methods)
+
+    tweaked_methods = preprocessing_methods[:3]+[(custom_filter,{'lpf':30,'hpf':1})]
+    tweaked_methods += preprocessing_methods[4:]
+    res = PrepocessingPipeline('tweaked',tweaked_methods,cache=cache).forward(openBCI_raw)
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['entries'] == len(preprocessing_methods)+1
+    expected = PrepocessingPipeline('uncached',tweaked_methods).forward(openBCI_raw)
+    assert np.allclose(res.get_data(),expected.get_data(),rtol=1e-10,atol=0)
+
+    limit = cache.stats()['bytes']//2
+    limited_cache = CheckpointCache(tmp_path/'cache',max_bytes=limit)
+    limited_cache.put('latest',expected)
+    assert 'latest' in limited_cache
+    assert limited_cache.stats()['bytes'] <= limit
+
+    path = tmp_path/'recording_raw.fif'
+    openBCI_raw.save(path,verbose=False)
+    lazy_raw = mne.io.read_raw_fif(path,preload=False,verbose=False)
+    loaded_raw = mne.io.read_raw_fif(path,preload=True,verbose=False)
+    unmodified_key = recording_hash(loaded_raw)
+    assert recording_hash(lazy_raw) == recording_hash(lazy_raw.copy())
+    loaded_raw.filter(1,40,verbose=False)
+    assert recording_hash(loaded_raw) != unmodified_key
+def test_lazy_loading(openBCI_raw,preprocessing_methods,tmp_path):
+    """
+    Test that lazily opened recordings only load the extracted center.
+
+    Args:
+        openBCI_raw: The OpenBCI-like recording.
+        preprocessing_methods: The preprocessing steps.
+        tmp_path: Temporary directory provided by pytest.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the lazy path loads the data too early, or if its results differ
+        from those of the preloaded path.
+    """
+    path = tmp_path/'recording_raw.fif'
+    openBCI_raw.save(path,fmt='double',verbose=False)
+
+    center = read_recording(path,percentage=50)
+    assert center.preload
+    assert np.array_equal(
+        center.get_data(),
+        extract_recording_center(openBCI_raw.copy(),percentage=50).get_data()
+        )
+
+    lazy_raw = mne.io.read_raw_fif(path,preload=False,verbose=False)
+    extract_recording_center(lazy_raw,percentage=50)
+    assert not lazy_raw.preload
+
+    lazy_raw = mne.io.read_raw_fif(path,preload=False,verbose=False)
+    res = PrepocessingPipeline('lazy',preprocessing_methods,mode='inplace').forward(lazy_raw)
+    expected = PrepocessingPipeline('preloaded',preprocessing_methods).forward(openBCI_raw)
+    assert res.preload
+    assert np.allclose(res.get_data(),expected.get_data(),rtol=1e-10,atol=0)
+
+def test_pipeline_profiling(openBCI_raw,preprocessing_methods,tmp_path):
+    """
+    Test that profiled pipelines record every step, call the hooks and export a Chrome trace.
+
+    Args:
+        openBCI_raw: The OpenBCI-like recording.
+        preprocessing_methods: The preprocessing steps.
+        tmp_path: Temporary directory provided by pytest.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the step records, statistics, hook calls or trace are unexpected.
+    """
+    calls = []
+    pipeline = PrepocessingPipeline('profiled',preprocessing_methods,profile_memory=True)
+    pipeline.add_hook('before',lambda pipeline_,step_no,method,data: calls.append(('before',step_no)))
+    pipeline.add_hook(
+        'after',lambda pipeline_,step_no,method,data,record: calls.append(('after',record['name']))
+        )
+    expected = PrepocessingPipeline('reference',preprocessing_methods).forward(openBCI_raw)
+    for _ in range(2):
+        res = pipeline.forward(openBCI_raw)
+    assert np.array_equal(res.get_data(),expected.get_data())
+
+    ordered = pipeline.ordered_methods()
+    assert [record['name'] for record in pipeline.step_records] == [
+        method[0].__name__ for method in ordered
+        ]
+    assert pipeline.step_records[0]['input_shape'] == (19,openBCI_raw.n_times)
+    assert pipeline.step_records[0]['output_shape'] == (16,openBCI_raw.n_times)
+    assert pipeline.step_records[-1]['output_shape'] == res.get_data().shape
+    assert all(record['peak_memory']>=0 for record in pipeline.step_records)
+    assert calls[:2] == [('before',0),('after',ordered[0][0].__name__)]
+    assert len(calls) == 4*len(ordered)
+
+    stats = pipeline.stats()
+    assert [aggregate['calls'] for aggregate in stats] == [2]*len(ordered)
+    assert all(aggregate['wall_time']>=aggregate['max_wall_time'] for aggregate in stats)
+
+    pipeline.export_trace(tmp_path/'trace.json')
+    with open(tmp_path/'trace.json') as file:
+        trace = json.load(file)
+    assert len(trace['traceEvents']) == 2*len(ordered)
+    assert all(event['ph']=='X' for event in trace['traceEvents'])
+
+    silent = PrepocessingPipeline('silent',preprocessing_methods)
+    silent.forward(openBCI_raw)
+    assert silent.step_records == [] and silent.stats() == []
+    with pytest.raises(ValueError):
+        silent.add_hook('during',print)
+
+def test_fused_filter_array(openBCI_raw):
+    """
+    Test that 'fused_filter_array' matches 'fused_filter' and runs in the dtype of the
+    precision policy.
+
+    Args:
+        openBCI_raw: The OpenBCI-like recording.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the filtered arrays are upcast or differ from the filtered recording.
+    """
+    data = openBCI_raw.get_data()
+    kwargs = {'freqs':50,'lpf':40,'hpf':1}
+    expected = fused_filter(openBCI_raw.copy(),**kwargs).get_data()
+    res = fused_filter_array(data,openBCI_raw.info['sfreq'],**kwargs)
+    assert res.dtype == np.float64
+    assert np.allclose(res,expected)
+    assert np.array_equal(data,openBCI_raw.get_data())
+    with dtype_policy('float32'):
+        res = fused_filter_array(data,openBCI_raw.info['sfreq'],**kwargs)
+    assert res.dtype == np.float32
+    assert np.max(np.abs(res-expected)) < 1e-4*np.max(np.abs(expected))
+
+@pytest.mark.parametrize('block_size',[1000,4096,10**6])
+def test_chunked_fused_filter(openBCI_raw,block_size,tmp_path):
+    """
+    Test that 'chunked_fused_filter' matches 'fused_filter_array' for arrays, memory-mapped
+    outputs and recordings opened with preload=False, whatever the block size.
+
+    Args:
+        openBCI_raw: The OpenBCI-like recording.
+        block_size: The number of samples per block.
+        tmp_path: Temporary directory provided by pytest.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the block-wise result differs from the in-memory one.
+    """
+    data = openBCI_raw.get_data()
+    sampling_frequency = openBCI_raw.info['sfreq']
+    kwargs = {'freqs':50,'lpf':40,'hpf':1}
+    expected = fused_filter_array(data,sampling_frequency,**kwargs)
+    res = chunked_fused_filter(data,sampling_frequency,block_size=block_size,**kwargs)
+    assert res.dtype == np.float64
+    assert np.allclose(res,expected,rtol=0,atol=1e-12*np.abs(expected).max())
+
+    out = np.lib.format.open_memmap(tmp_path/'filtered.npy','w+',shape=data.shape)
+    res = chunked_fused_filter(data,sampling_frequency,out=out,block_size=block_size,**kwargs)
+    assert res is out
+    res = np.load(tmp_path/'filtered.npy')
+    assert np.allclose(res,expected,rtol=0,atol=1e-12*np.abs(expected).max())
+
+    openBCI_raw.save(tmp_path/'recording_raw.fif',fmt='double',verbose=False)
+    lazy = mne.io.read_raw_fif(tmp_path/'recording_raw.fif',preload=False,verbose=False)
+    res = chunked_fused_filter(lazy,block_size=block_size,**kwargs)
+    assert not lazy.preload
+    assert np.allclose(res,expected,rtol=0,atol=1e-12*np.abs(expected).max())
+    blocks = list(read_blocks(lazy,block_size))
+    assert all(block.shape[-1]==block_size for block in blocks[:-1])
+    assert np.array_equal(np.concatenate(blocks,axis=-1),data)
+
+    with pytest.raises(ValueError):
+        chunked_fused_filter(data,**kwargs)
+    with pytest.raises(ValueError):
+        chunked_fused_filter(data,sampling_frequency,out=np.empty((2,2)),**kwargs)
+
+def test_chunked_features(openBCI_raw):
+    """
+    Test that 'chunked_features' matches 'bands_power' and 'hjorth_2D' on the whole recording,
+    and that a BlockFilter carries its state across blocks.
+
+    Args:
+        openBCI_raw: The OpenBCI-like recording.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the block-wise features differ from the in-memory ones.
+    """
+    from scipy import signal
+
+    data = openBCI_raw.get_data()
+    sampling_frequency = openBCI_raw.info['sfreq']
+    bands = [(1,4),(4,8),(8,12),(12,30)]
+    expected_power = bands_power(data,sampling_frequency,bands)
+    expected_hjorth = hjorth_2D(data,10,openBCI_raw.ch_names)
+    for block_size in (97,1000,10**6):
+        res = chunked_features(
+            openBCI_raw,bands=bands,hjorth_segment_size=10,block_size=block_size
+            )
+        assert np.allclose(res['bands_power'],expected_power)
+        assert list(res['hjorth'].index) == list(expected_hjorth.index)
+        assert list(res['hjorth'].columns) == list(expected_hjorth.columns)
+        assert np.allclose(res['hjorth'].values,expected_hjorth.values,rtol=1e-6,atol=0)
+    assert set(chunked_features(data,sampling_frequency,bands=bands)) == {'bands_power'}
+    with pytest.raises(ValueError):
+        chunked_features(data,bands=bands)
+
+    sos = signal.butter(4,[1,40],'bandpass',fs=sampling_frequency,output='sos')
+    block_filter = BlockFilter(sos,data.shape[0],steady_state=False)
+    res = np.concatenate([block_filter.process(block) for block in read_blocks(data,333)],axis=-1)
+    assert np.allclose(res,signal.sosfilt(sos,data,axis=-1))
+
+def test_chunked_memory(tmp_path):
+    """
+    Test that filtering a memory-mapped recording into a memory-mapped output and computing
+    its features allocates memory bounded by the block size, not by the recording length.
+
+    Args:
+        tmp_path: Temporary directory provided by pytest.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the peak allocation grows with the recording or exceeds the
+        size of the recording.
+    """
+    block_size = 4096
+    peaks = []
+    for n_samples in (125*600,125*2400):
+        data = np.lib.format.open_memmap(
+            tmp_path/f'data_{n_samples}.npy','w+',shape=(16,n_samples)
+            )
+        data[:] = np.random.randn(16,n_samples)
+        out = np.lib.format.open_memmap(tmp_path/f'out_{n_samples}.npy','w+',shape=data.shape)
+        tracemalloc.start()
+        chunked_fused_filter(data,125,freqs=50,lpf=40,hpf=1,out=out,block_size=block_size)
+        chunked_features(out,125,bands=[(8,12)],hjorth_segment_size=10,block_size=block_size)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    assert peaks[1] < 1.5*peaks[0]
+    assert peaks[1] < 0.25*data.nbytes
@@ -9,14 +9,15 @@ Functions:
     - find_trace_index: Find the index of a trace in a Plotly figure.
     - unplot_psd_by_name: Remove a PSD trace from a Plotly figure by its name.
 
+Classes:
+    - PSDFigure: Manages the PSD traces of many recordings in one interactive figure.
+
 """
 
 from typing import Union, List, Tuple
 import copy
 import numpy as np
 
-from plotly.subplots import make_subplots
-import plotly.graph_objects as go
 from . import plot_globals
 
 def create_subplots(n_rows,n_cols):
@@ -30,6 +31,8 @@ def create_subplots(n_rows,n_cols):
     Returns:
         plotly.subplots.Subplot: Plotly subplot grid.
     """
+    from plotly.subplots import make_subplots
+
     fig = make_subplots(rows=n_rows, cols=n_cols)
     return fig
 
@@ -50,7 +53,7 @@ def plot_psd(psd,freqs,row_,col_,fig_,name_,db_limit=None,freqs_limit=None,figsi
     Returns:
         None
     """
-
+    import plotly.graph_objects as go
 
     if int(name_[-1])%2==0:
         fig_.add_trace(
@@ -70,7 +73,349 @@ def plot_psd(psd,freqs,row_,col_,fig_,name_,db_limit=None,freqs_limit=None,figsi
                 ),
             row=row_,col=col_,
             )
-    fig_.update_xaxes(range=[freqs_limit[0], freqs_limit[1]])  # Set the range for the x-axis
+    if freqs_limit is not None:
+        fig_.update_xaxes(range=[freqs_limit[0], freqs_limit[1]])  # Set the range for the x-axis
     if db_limit is not None:
         fig_.update_yaxes(range=[db_limit[0], db_limit[1]])
-    fig_.update_layout(width=figsize_[0])
\ No newline at end of file
+    fig_.update_layout(width=figsize_[0])
+
+def find_trace_index(fig_,name_):
+    """
+    Find the index of a trace in a Plotly figure.
+
+    The traces are scanned in order; 'PSDFigure' keeps an index for figures with many traces.
+
+    Args:
+        fig_ (plotly.graph_objects.Figure): Plotly figure to search.
+        name_ (str): Name of the trace.
+
+    Returns:
+        int: Index of the first trace with that name, or None if there is none.
+    """
+    for index,trace in enumerate(fig_.data):
+        if trace.name==name_:
+            return index
+    return None
+
+def unplot_psd_by_name(fig_,name_):
+    """
+    Remove a PSD trace from a Plotly figure by its name.
+
+    Args:
+        fig_ (plotly.graph_objects.Figure): Plotly figure to remove the trace from.
+        name_ (str): Name of the trace.
+
+    Returns:
+        bool: True if a trace was removed, False if there was none with that name.
+    """
+    index = find_trace_index(fig_,name_)
+    if index is None:
+        return False
+    fig_.data = fig_.data[:index]+fig_.data[index+1:]
+    return True
+
+def _decimate(
+        freqs:np.ndarray,psds:np.ndarray,freqs_limit:Tuple[float]=None,max_points:int=None
+        )->Tuple[np.ndarray,np.ndarray]:
+    """
+    Reduce spectra to the points a viewport can show.
+
+    The frequencies outside the limits are dropped, except one on each side so that the lines
+    reach the edges. If more than ``max_points`` remain, they are split into buckets of equal
+    size and only the minimum and maximum of each bucket are kept, in frequency order, so peaks
+    and troughs survive the decimation.
+
+    Args:
+        freqs (np.ndarray): Frequencies of shape (n_freqs,).
+        psds (np.ndarray): Spectra of shape (n_traces, n_freqs).
+        freqs_limit (Tuple[float], optional): The visible frequency range. Default is None.
+        max_points (int, optional): The maximum number of points per trace. Default is None,
+        which keeps every visible point.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The frequencies and the values of each trace, both of
+        shape (n_traces, n_points).
+
+    Raises:
+        ValueError: If max_points is below 2, the minimum and maximum of one bucket.
+    """
+    if max_points is not None and max_points<2:
+        raise ValueError(f"Inpermissible max_points, {max_points} is used")
+    if freqs_limit is not None:
+        start = max(np.searchsorted(freqs,freqs_limit[0])-1,0)
+        stop = np.searchsorted(freqs,freqs_limit[1],side='right')+1
+        freqs, psds = freqs[start:stop], psds[:,start:stop]
+    if max_points is None or freqs.shape[0]<=max_points:
+        return np.broadcast_to(freqs,psds.shape), psds
+
+    bucket_size = int(np.ceil(freqs.shape[0]/(max_points//2)))
+    n_buckets = int(np.ceil(freqs.shape[0]/bucket_size))
+    padding = n_buckets*bucket_size-freqs.shape[0]
+    buckets = np.pad(psds,((0,0),(0,padding)),constant_values=np.nan)
+    buckets = buckets.reshape(psds.shape[0],n_buckets,bucket_size)
+    offsets = np.arange(n_buckets)*bucket_size
+    # NaN values (and the padding) never win, and a bucket with no value (e.g. a dead channel)
+    # keeps its first point, which every bucket holds since the padding is shorter than one
+    missing = np.isnan(buckets)
+    lowest = np.argmin(np.where(missing,np.inf,buckets),axis=-1)+offsets
+    highest = np.argmax(np.where(missing,-np.inf,buckets),axis=-1)+offsets
+    indices = np.stack([np.minimum(lowest,highest),np.maximum(lowest,highest)],axis=-1)
+    indices = indices.reshape(psds.shape[0],-1)
+    return freqs[indices], np.take_along_axis(psds,indices,axis=-1)
+
+class PSDFigure:
+    """
+    Manages the PSD traces of many recordings in one interactive Plotly figure.
+
+    Traces are WebGL scatters ('Scattergl'), added in batches with a single update of the
+    figure, axes and layout per batch. Each trace is registered under a unique name, so
+    showing, hiding and removing it does not scan the figure. Removed traces are blanked and
+    their slots reused by later additions; 'compact' drops the blank slots.
+
+    Only the points a viewport can show are sent to the figure: the frequencies outside
+    ``freqs_limit`` are dropped, and the others decimated to two points (minimum and maximum)
+    per horizontal pixel of a subplot. The full-resolution spectra are kept, so
+    'set_freqs_limit' decimates again for a new frequency range.
+
+    Attributes:
+        figure (plotly.graph_objects.Figure): The managed figure.
+        db_limit (tuple): Limits for the y-axis (in dB), or None.
+        freqs_limit (tuple): Limits for the x-axis (in Hz), or None.
+        max_points (int): The maximum number of points per trace, or None for no decimation.
+        names (List[str]): The names of the traces in the figure, in the order they were added.
+
+    Methods:
+        add_psds(psds, freqs, names, row, col, ch_names): Add the spectra of several traces.
+        trace_index(name): Index of a trace in the figure data.
+        show(names) / hide(names): Set the visibility of traces.
+        remove(names): Remove traces.
+        set_freqs_limit(freqs_limit): Change or clear the frequency range and decimate again.
+        compact(): Drop the slots of removed traces.
+    """
+
+    def __init__(
+            self,n_rows:int=1,n_cols:int=1,db_limit:Tuple[float]=None,
+            freqs_limit:Tuple[float]=None,figsize_:Tuple[int,int]=(550,None),
+            max_points:Union[int,str]='auto'
+            ):
+        """
+        Initialize the PSDFigure object.
+
+        Args:
+            n_rows (int, optional): Number of rows in the grid. Default is 1.
+            n_cols (int, optional): Number of columns in the grid. Default is 1.
+            db_limit (tuple, optional): Limits for the y-axis (in dB). Default is None.
+            freqs_limit (tuple, optional): Limits for the x-axis (in Hz). Default is None.
+            figsize_ (Tuple[int, int], optional): Width and height of the figure in pixels, the
+            height being left to Plotly when None. Default is (550, None).
+            max_points (Union[int, str], optional): The maximum number of points per trace.
+            Default is 'auto', which uses two points per pixel of a subplot's width. None
+            disables the decimation.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If max_points is below 2.
+        """
+        self.figure = create_subplots(n_rows,n_cols)
+        self.db_limit = db_limit
+        self.freqs_limit = freqs_limit
+        if max_points=='auto':
+            max_points = max(2*(figsize_[0]//n_cols),2)
+        if max_points is not None and max_points<2:
+            raise ValueError(f"Inpermissible max_points, {max_points} is used")
+        self.max_points = max_points
+        self._index = {}
+        self._spectra = {}
+        self._free = []
+        with self.figure.batch_update():
+            if freqs_limit is not None:
+                self.figure.update_xaxes(range=[freqs_limit[0], freqs_limit[1]])
+            if db_limit is not None:
+                self.figure.update_yaxes(range=[db_limit[0], db_limit[1]])
+            self.figure.update_layout(width=figsize_[0],height=figsize_[1])
+
+    @property
+    def names(self)->List[str]:
+        """
+        The names of the traces in the figure, in the order they were added.
+        """
+        return list(self._index)
+
+    def __len__(self)->int:
+        return len(self._index)
+
+    def __contains__(self,name:str)->bool:
+        return name in self._index
+
+    def trace_index(self,name:str)->int:
+        """
+        Return the index of a trace in the figure data.
+
+        Args:
+            name (str): Name of the trace.
+
+        Returns:
+            int: Index of the trace in 'figure.data'.
+
+        Raises:
+            KeyError: If there is no trace with that name.
+        """
+        return self._index[name]
+
+    def add_psds(
+            self,psds:np.ndarray,freqs:np.ndarray,names:List[str],row:int=1,col:int=1,
+            ch_names:List[str]=None
+            ):
+        """
+        Add the spectra of several traces to a subplot at once.
+
+        Args:
+            psds (np.ndarray): Spectra of shape (n_traces, n_freqs), e.g. one recording as
+            returned by 'compute_psd'.
+            freqs (np.ndarray): Frequencies of shape (n_freqs,).
+            names (List[str]): Unique names of the traces, e.g. 'recording/Fp1'.
+            row (int, optional): Row index of the subplot. Default is 1.
+            col (int, optional): Column index of the subplot. Default is 1.
+            ch_names (List[str], optional): Channel of each trace, which sets its color and line
+            style as in 'plot_psd' and groups its legend entries. Default is None, which uses
+            the names.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If a name is already used or repeated.
+        """
+        import plotly.graph_objects as go
+
+        psds = np.atleast_2d(np.asarray(psds))
+        freqs = np.asarray(freqs)
+        ch_names = names if ch_names is None else ch_names
+        assert psds.shape==(len(names),freqs.shape[0]) and len(ch_names)==len(names)
+        if len(set(names))<len(names) or any(name in self._index for name in names):
+            raise ValueError("Inpermissible names, they must be unique")
+
+        xs, ys = _decimate(freqs,psds,self.freqs_limit,self.max_points)
+        subplot = self.figure.get_subplot(row,col)
+        axes = {
+            'xaxis':subplot.xaxis.plotly_name.replace('axis',''),
+            'yaxis':subplot.yaxis.plotly_name.replace('axis',''),
+        }
+        appended = []
+        with self.figure.batch_update():
+            for name,ch_name,psd,x,y in zip(names,ch_names,psds,xs,ys):
+                line = {}
+                if ch_name in plot_globals.sensors_colors:
+                    line['color'] = plot_globals.sensors_colors[ch_name][0]
+                    if int(ch_name[-1])%2!=0:
+                        line['dash'] = 'dash'
+                properties = dict(
+                    x=x,y=y,name=name,line=line,legendgroup=ch_name,mode='lines',
+                    visible=True,showlegend=True,**axes
+                    )
+                self._spectra[name] = (freqs,psd)
+                if self._free:
+                    # a removed trace is overwritten in place
+                    self._index[name] = self._free.pop()
+                    self.figure.data[self._index[name]].update(properties)
+                else:
+                    self._index[name] = len(self.figure.data)+len(appended)
+                    appended.append(go.Scattergl(**properties))
+            if appended:
+                self.figure.add_traces(appended)
+
+    def _set_visible(self,names:Union[str,List[str]],visible:bool):
+        names = [names] if isinstance(names,str) else names
+        with self.figure.batch_update():
+            for name in names:
+                self.figure.data[self._index[name]].visible = visible
+
+    def show(self,names:Union[str,List[str]]):
+        """
+        Show traces.
+
+        Args:
+            names (Union[str, List[str]]): Name or names of the traces.
+
+        Returns:
+            None
+
+        Raises:
+            KeyError: If there is no trace with one of the names.
+        """
+        self._set_visible(names,True)
+
+    def hide(self,names:Union[str,List[str]]):
+        """
+        Hide traces, keeping them in the figure.
+
+        Args:
+            names (Union[str, List[str]]): Name or names of the traces.
+
+        Returns:
+            None
+
+        Raises:
+            KeyError: If there is no trace with one of the names.
+        """
+        self._set_visible(names,False)
+
+    def remove(self,names:Union[str,List[str]]):
+        """
+        Remove traces. Their slots are blanked and reused by the next additions.
+
+        Args:
+            names (Union[str, List[str]]): Name or names of the traces.
+
+        Returns:
+            None
+
+        Raises:
+            KeyError: If there is no trace with one of the names.
+        """
+        names = [names] if isinstance(names,str) else names
+        with self.figure.batch_update():
+            for name in names:
+                index = self._index.pop(name)
+                del self._spectra[name]
+                self.figure.data[index].update(
+                    x=[],y=[],name=None,visible=False,showlegend=False
+                    )
+                self._free.append(index)
+
+    def set_freqs_limit(self,freqs_limit:Tuple[float]):
+        """
+        Change the frequency range of the figure and decimate every trace for it again.
+
+        Args:
+            freqs_limit (tuple): Limits for the x-axis (in Hz), or None to show every frequency.
+
+        Returns:
+            None
+        """
+        self.freqs_limit = freqs_limit
+        with self.figure.batch_update():
+            if freqs_limit is None:
+                self.figure.update_xaxes(range=None,autorange=True)
+            else:
+                self.figure.update_xaxes(range=[freqs_limit[0], freqs_limit[1]])
+            for name,index in self._index.items():
+                freqs, psd = self._spectra[name]
+                x, y = _decimate(freqs,psd[None,:],freqs_limit,self.max_points)
+                self.figure.data[index].update(x=x[0],y=y[0])
+
+    def compact(self):
+        """
+        Drop the slots of removed traces from the figure data and renumber the index.
+
+        Returns:
+            None
+        """
+        if not self._free:
+            return
+        order = sorted(self._index,key=self._index.get)
+        self.figure.data = tuple(self.figure.data[self._index[name]] for name in order)
+        self._index = {name:index for index,name in enumerate(order)}
+        self._free = []
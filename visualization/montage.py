@@ -5,9 +5,11 @@ This module provides a utility class for creating and plotting montages using MN
 
 Classes:
     - Montage: A class for creating and plotting montages.
+
+Attributes:
+    - openBCImontage (Montage): The montage of the OpenBCI 16-channel layout, built on first
+    access.
 """
-import mne 
-import matplotlib.pyplot as plt
 from . import plot_globals
 
 class Montage:
@@ -37,6 +39,8 @@ class Montage:
         """
         self.ch_names = chs
         self.coordinates = coord
+        import mne
+
         self.ch_pos = dict(zip(self.ch_names,self.coordinates))
         self.montage = mne.channels.make_dig_montage(self.ch_pos)
     def plot(self,arguments):
@@ -49,12 +53,31 @@ class Montage:
         Returns:
             None
         """
+        import matplotlib.pyplot as plt
+
         plt.close()
         plt.figure()
         self.montage.plot(**arguments)
         plt.close()
 
-openBCImontage = Montage(
-    list(plot_globals.openBCIcoords.keys()),
-    list(plot_globals.openBCIcoords.values())
-    )
+def __getattr__(name:str):
+    """
+    Build the module-level montages on first access, since creating a DigMontage is slow.
+
+    Args:
+        name (str): The attribute name.
+
+    Returns:
+        Montage: The requested montage, cached in the module afterwards.
+
+    Raises:
+        AttributeError: If the module has no such attribute.
+    """
+    if name=='openBCImontage':
+        montage = Montage(
+            list(plot_globals.openBCIcoords.keys()),
+            list(plot_globals.openBCIcoords.values())
+            )
+        globals()[name] = montage
+        return montage
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
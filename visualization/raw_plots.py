@@ -1,88 +1,185 @@
+# mne, matplotlib and seaborn are imported by the functions using them, and annotations are
+# not evaluated, so that importing this module stays cheap
+from __future__ import annotations
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 import copy
-from typing import List, Tuple, Union
-import mne
-import matplotlib
-import matplotlib.pyplot as plt
-from matplotlib.colors import LinearSegmentedColormap
-from matplotlib.colors import Normalize
+import os
+from typing import TYPE_CHECKING, Callable, List, Tuple, Union
 import numpy as np
-import seaborn as sns
 import features_computation.frequency as frequency_features
+from features_computation.covariance import covariance_engine
 from . import plot_globals as viz_globals
+from .topomap import head_outline, topomap_images, topomap_interpolation
+
+if TYPE_CHECKING:
+    import matplotlib
+    import matplotlib.pyplot as plt
+
+supported_formats = ['png','svg','pdf']
+topomap_renderers = ['cached','mne']
 
 def suppress_extr_plot(func):
     def wrapper(*args, **kwargs):
+        import matplotlib.pyplot as plt
         plt.close('all')
         return func(*args,**kwargs)
         # plt.close('all')
     return wrapper
 
+# Batch rendering: with an 'output_dir', the figure generators below hand one job per
+# recording to '_render', which draws each figure with the Agg backend in a process pool,
+# saves it in every requested format, closes it, and returns the file paths. Only the inputs
+# of one figure travel to a worker, and at most two jobs per worker are in flight, so neither
+# the parent nor the workers keep more than a few figures alive.
+
+def _use_agg():
+    import matplotlib
+    matplotlib.use('Agg',force=True)
+
+def _save_figure(
+        figure_function:Callable,args:tuple,kwargs:dict,path_stem:str,formats:List[str]
+        )->List[str]:
+    import matplotlib.pyplot as plt
+
+    fig = figure_function(*args,**kwargs)
+    paths = []
+    for format_ in formats:
+        fig.savefig(f'{path_stem}.{format_}',format=format_)
+        paths.append(f'{path_stem}.{format_}')
+    plt.close(fig)
+    return paths
+
+def _recording_stem(recording_name:str)->str:
+    return os.path.splitext(os.path.basename(recording_name))[0]
+
+def _file_stem(prefix:str,row:int,recording_names:List[str]=None)->str:
+    # recordings sharing a file name (e.g. sub-01/night.edf and sub-02/night.edf) get their
+    # row appended, so that their figures do not overwrite each other
+    if recording_names is None:
+        return f'{prefix}_{row}'
+    stem = _recording_stem(recording_names[row])
+    if [_recording_stem(name) for name in recording_names].count(stem)>1:
+        return f'{prefix}_{stem}_{row}'
+    return f'{prefix}_{stem}'
+
+def _render(
+        figure_function:Callable,jobs:List[Tuple[str,tuple,dict]],output_dir:str,
+        formats:Union[str,List[str]]=('png',),n_workers:int=None
+        )->List[str]:
+    if isinstance(formats,str):
+        formats = [formats]
+    for format_ in formats:
+        if format_ not in supported_formats:
+            raise ValueError(f"Inpermissible format, {format_} is used")
+    stems = [stem for stem,_,_ in jobs]
+    if len(set(stems))<len(stems):
+        raise ValueError(f"Inpermissible file names, {stems} are not unique")
+    os.makedirs(output_dir,exist_ok=True)
+    jobs = [(os.path.join(output_dir,stem),args,kwargs) for stem,args,kwargs in jobs]
+
+    n_workers = n_workers or os.cpu_count() or 1
+    if n_workers==1:
+        # figures are saved and closed one by one, whatever backend the caller uses
+        return [
+            path for path_stem,args,kwargs in jobs
+            for path in _save_figure(figure_function,args,kwargs,path_stem,formats)
+            ]
+
+    paths = [None]*len(jobs)
+    pending_jobs = iter(enumerate(jobs))
+    in_flight = {}
+    with ProcessPoolExecutor(max_workers=n_workers,initializer=_use_agg) as executor:
+        while True:
+            while len(in_flight)<2*n_workers:
+                job = next(pending_jobs,None)
+                if job is None:
+                    break
+                index, (path_stem,args,kwargs) = job
+                future = executor.submit(
+                    _save_figure,figure_function,args,kwargs,path_stem,formats
+                    )
+                in_flight[future] = index
+            if len(in_flight)==0:
+                break
+            done, _ = wait(in_flight,return_when=FIRST_COMPLETED)
+            for future in done:
+                paths[in_flight.pop(future)] = future.result()
+    return [path for paths_ in paths for path in paths_]
+
 @suppress_extr_plot
 def plot_psd_topmap(raw,wargs):
     return raw.plot_psd_topomap(**wargs)
 
+def _psd_figure(freqs_:np.ndarray,spectrum_:np.ndarray,figsize_=None,record_name:str=None,
+                db_limit:Union[Tuple[float],List[float]]=(-50.0,50.0))->plt.figure:
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+    from matplotlib.lines import Line2D
+
+    if figsize_ is not None:
+        fig_, ax_ = plt.subplots(1,1,figsize=figsize_)
+    else:
+        fig_, ax_ = plt.subplots(1,1,figsize=(8,5))
+
+    # every channel is drawn by a single collection, and the axes are styled once
+    ch_names = viz_globals.channel_names
+    colors = [viz_globals.sensors_colors[ch_name][0] for ch_name in ch_names]
+    linestyles = ['solid' if int(ch_name[-1])%2==0 else 'dashed' for ch_name in ch_names]
+    assert spectrum_.shape[0]==len(ch_names)
+    segments = np.stack(np.broadcast_arrays(freqs_,spectrum_),axis=-1)
+    ax_.add_collection(LineCollection(segments,colors=colors,linestyles=linestyles))
+    ax_.autoscale_view()
+    for side in ('top','right','bottom','left'):
+        ax_.spines[side].set_visible(False)
+    ax_.set_ylim(ymin=db_limit[0], ymax=db_limit[1])  # Adjust according to your data
+    ax_.legend(handles=[
+        Line2D([],[],color=color,linestyle=linestyle,label=ch_name)
+        for ch_name,color,linestyle in zip(ch_names,colors,linestyles)
+        ])
+
+    if record_name is not None:
+        record_name = record_name[:-3]
+        if len(record_name)>15:
+            fig_.suptitle(record_name[:15]+'\n'+record_name[15:])
+        else:
+            fig_.suptitle(record_name)
+    return fig_
+
 @suppress_extr_plot
 def plot_psds(data:List[np.ndarray],fmin_:int,fmax_:int,
               figsize_=None,recording_names:List[str]=None,
-              db_limit:Union[Tuple[float],List[float]]=(-50.0,50.0))->plt.figure:
-
-    figures = []
+              db_limit:Union[Tuple[float],List[float]]=(-50.0,50.0),
+              output_dir:str=None,formats:Union[str,List[str]]=('png',),
+              n_workers:int=None,sampling_frequency:int=125,
+              freqs:np.ndarray=None)->Union[List[plt.figure],List[str]]:
+    # 'data' holds recordings of shape (channels, samples), or, when 'freqs' is given, their
+    # log10 spectra of shape (channels, frequencies), e.g. as returned by 'compute_psd'
+    jobs = []
     for row,data_ in enumerate(data):
-        if figsize_ is not None:
-            fig_, ax_ = plt.subplots(1,1,figsize=figsize_)
+        if freqs is None:
+            spectrum_, freqs_ = frequency_features.compute_psd(data_,sampling_frequency)
         else:
-            fig_, ax_ = plt.subplots(1,1,figsize=(8,5))
-        spectrum_, freqs_ = frequency_features.compute_psd(
-            data_,
-            125
-        )
-        for channel,ch_name in enumerate(globals.channel_names):
-            if int(ch_name[-1])%2==0:
-                ax_.plot(freqs_[(freqs_>fmin_) & (freqs_<fmax_)],spectrum_[channel][(freqs_>fmin_) & 
-                                                                               (freqs_<fmax_)],
-                         label=ch_name,color=globals.sensors_colors[ch_name][0])
-            else:
-                ax_.plot(freqs_[(freqs_>fmin_) & (freqs_<fmax_)],spectrum_[channel][(freqs_>fmin_) & 
-                                                                               (freqs_<fmax_)],
-                         label=ch_name,color=globals.sensors_colors[ch_name][0],linestyle='--')
-            ax_.spines['top'].set_visible(False)
-            ax_.spines['right'].set_visible(False)
-            ax_.spines['bottom'].set_visible(False)
-            ax_.spines['left'].set_visible(False)
-            ax_.set_ylim(ymin=db_limit[0], ymax=db_limit[1])  # Adjust according to your data
-            ax_.legend()
-
-            record_name = recording_names[row][:-3]
-            if len(record_name)>15:
-                fig_.suptitle(record_name[:15]+'\n'+record_name[15:])
-            else:
-                fig_.suptitle(record_name)
-        figures.append(fig_)
-
-    return figures
+            spectrum_, freqs_ = np.asarray(data_), np.asarray(freqs)
+            assert spectrum_.shape[-1]==freqs_.shape[0]
+        keep = (freqs_>fmin_) & (freqs_<fmax_)
+        jobs.append((
+            _file_stem('psd',row,recording_names),
+            (freqs_[keep],spectrum_[...,keep],figsize_,
+             None if recording_names is None else recording_names[row],db_limit),
+            {}
+        ))
+    if output_dir is not None:
+        return _render(_psd_figure,jobs,output_dir,formats,n_workers)
+    return [_psd_figure(*args) for _,args,_ in jobs]
 
-@suppress_extr_plot
-def head_plots(data:Union[List[np.ndarray],np.ndarray],pos:Union[list,np.ndarray],
-               no_rows:int,no_columns:int,colorbar_orientation:str='vertical',
-               axis:int=1,figsize_:Tuple[int,int]=None,
-               recording_names:List[str]=None,band_names:List[str]=None)->plt.figure:
-
-    assert data.ndim in (2,3)
-    assert len(band_names)==no_columns
-    assert len(recording_names)==no_rows
-
-    figures = []
+def _head_plots_rows(data:np.ndarray,axis:int,no_rows:int,no_columns:int)->np.ndarray:
+    # brings the data to shape (no_rows, no_columns, channels)
     data_ = copy.deepcopy(data)
-
-    min_val = np.min(data_)
-    max_val = np.max(data_)
-    norm = Normalize(vmin=min_val, vmax=max_val)
-    new_cmap = LinearSegmentedColormap.from_list('white_to_red', viz_globals.white_to_red_color, N=256)
-
     if data_.ndim==2:
-        if axis==1: 
+        if axis==1:
             data_ = np.moveaxis(data_,range(data_.ndim),[1,0])
         assert data_.shape[0]==(no_rows*no_columns)
+        data_ = data_.reshape(no_rows,no_columns,-1)
     elif data_.ndim==3:
         if axis==1:
             data_ = np.moveaxis(data_,range(data_.ndim),[1,0,2])
@@ -90,26 +187,83 @@ def head_plots(data:Union[List[np.ndarray],np.ndarray],pos:Union[list,np.ndarray
             data_ = np.moveaxis(data_,range(data_.ndim),[2,0,1])
         # print(data_.shape)
         assert data_.shape[0]==no_rows and data_.shape[1]==no_columns
+    return data_
+
+def _head_grid(images:np.ndarray,extent:Tuple[float])->Tuple[np.ndarray,Tuple[float],np.ndarray]:
+    # tiles the maps of a row side by side, leaving room for the nose and ears, so that the
+    # whole row is blitted as one image
+    outlines = head_outline()
+    no_columns, resolution = images.shape[0], images.shape[-1]
+    pixel = (extent[1]-extent[0])/resolution
+    half_width = max(np.abs(outline[:,0]).max() for outline in outlines)+2*pixel
+    gap = max(0,int(np.ceil(2*half_width/pixel))-resolution)
+    grid = np.full((resolution,no_columns*(resolution+gap)-gap),np.nan)
+    for column in range(no_columns):
+        grid[:,column*(resolution+gap):column*(resolution+gap)+resolution] = images[column]
+    offsets = np.arange(no_columns)*(resolution+gap)*pixel
+    grid_extent = (extent[0],extent[0]+grid.shape[1]*pixel,extent[2],extent[3])
+    return grid, grid_extent, offsets
+
+def _head_figure(row_data:np.ndarray,pos:Union[list,np.ndarray],
+                 colorbar_orientation:str='vertical',figsize_:Tuple[int,int]=None,
+                 record_name:str=None,band_names:List[str]=None,
+                 vmin:float=None,vmax:float=None,extent:Tuple[float]=None)->plt.figure:
+    # 'row_data' holds the sensor values of each column, drawn by mne in one axes each, or,
+    # when 'extent' is given, the images interpolated by 'topomap_images', which are blitted
+    # into one axes sharing a single colorbar
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+    from matplotlib.colors import LinearSegmentedColormap, Normalize
 
-    for row in range(no_rows):
+    no_columns = row_data.shape[0]
+    norm = Normalize(vmin=vmin, vmax=vmax)
+    new_cmap = LinearSegmentedColormap.from_list('white_to_red', viz_globals.white_to_red_color, N=256)
+
+    if extent is not None:
+        grid, grid_extent, offsets = _head_grid(row_data,extent)
+        fig_, ax_ = plt.subplots(
+            1,1,figsize=figsize_ if figsize_ is not None else (no_columns*2,2)
+            )
+        pt_ = ax_.imshow(
+            grid,origin='lower',extent=grid_extent,
+            cmap=new_cmap,norm=norm,interpolation='bilinear'
+            )
+        outlines = head_outline()
+        ax_.add_collection(LineCollection(
+            [outline+[offset,0] for offset in offsets for outline in outlines],
+            colors='k',linewidths=1
+            ))
+        pos_ = np.asarray(pos)[:,:2]
+        ax_.scatter(
+            (pos_[:,0][None,:]+offsets[:,None]).ravel(),np.tile(pos_[:,1],no_columns),s=2,c='k'
+            )
+        top = max(outline[:,1].max() for outline in outlines)
+        bottom = min(outline[:,1].min() for outline in outlines)
+        ax_.set_xlim(grid_extent[0]-extent[1]*0.1,grid_extent[1]+extent[1]*0.1)
+        ax_.set_ylim(bottom-extent[1]*0.05,top+extent[1]*0.05)
+        ax_.set_aspect('equal')
+        ax_.set_axis_off()
+        if band_names is not None:
+            for column in range(no_columns):
+                ax_.text(offsets[column],top,band_names[column],ha='center',va='bottom')
+        plt.colorbar(
+            pt_,
+            orientation = colorbar_orientation,
+            use_gridspec=True,
+            label='uV^2 /Hz (dB)'
+            )
+    else:
+        import mne
         if figsize_ is not None:
             fig_, ax_ = plt.subplots(1,no_columns,figsize=figsize_)
         else:
             fig_, ax_ = plt.subplots(1,no_columns,figsize=(no_columns*2,2))
         for column in range(no_columns):
-            index_ = (row*no_columns)+column
-            if data_.ndim==2:
-                pt_ = mne.viz.plot_topomap(
-                    data_[index_,:],pos,
-                    axes=ax_.flatten()[column],show=False,
-                    cmap=new_cmap,cnorm=norm
-                    )
-            elif data_.ndim==3:
-                pt_ = mne.viz.plot_topomap(
-                    data_[row,column,:],pos,
-                    axes=ax_.flatten()[column],show=False,
-                    cmap=new_cmap,cnorm=norm
-                    )
+            pt_ = mne.viz.plot_topomap(
+                row_data[column,:],pos,
+                axes=np.ravel(ax_)[column],show=False,
+                cmap=new_cmap,cnorm=norm
+                )
             plt.colorbar(
                 pt_[0],
                 orientation = colorbar_orientation,
@@ -117,32 +271,73 @@ def head_plots(data:Union[List[np.ndarray],np.ndarray],pos:Union[list,np.ndarray
                 label='uV^2 /Hz (dB)'
                 )
             if band_names is not None:
-                ax_.flatten()[column].set_title(band_names[column])
-        record_name = recording_names[row][:-3]
-        if len(record_name)>15:
-            fig_.suptitle(record_name[:15]+'\n'+record_name[15:])
-        else:
-            fig_.suptitle(record_name)
-        fig_.tight_layout()
-        figures.append(fig_)
+                np.ravel(ax_)[column].set_title(band_names[column])
+    record_name = record_name[:-3]
+    if len(record_name)>15:
+        fig_.suptitle(record_name[:15]+'\n'+record_name[15:])
+    else:
+        fig_.suptitle(record_name)
+    fig_.tight_layout()
+    return fig_
 
-    return figures
+@suppress_extr_plot
+def head_plots(data:Union[List[np.ndarray],np.ndarray],pos:Union[list,np.ndarray],
+               no_rows:int,no_columns:int,colorbar_orientation:str='vertical',
+               axis:int=1,figsize_:Tuple[int,int]=None,
+               recording_names:List[str]=None,band_names:List[str]=None,
+               output_dir:str=None,formats:Union[str,List[str]]=('png',),
+               n_workers:int=None,renderer:str='cached',
+               resolution:int=64)->Union[List[plt.figure],List[str]]:
+    assert data.ndim in (2,3)
+    assert len(band_names)==no_columns
+    assert len(recording_names)==no_rows
+    if renderer not in topomap_renderers:
+        raise ValueError(f"Inpermissible renderer, {renderer} is used")
+
+    data_ = _head_plots_rows(data,axis,no_rows,no_columns)
+    # every row shares the color scale of the whole data
+    min_val = np.min(data_)
+    max_val = np.max(data_)
+
+    extent = None
+    if renderer=='cached':
+        # the maps of every recording and band are interpolated by one matrix product
+        interpolation = topomap_interpolation(np.asarray(pos)[:,:2],resolution)
+        data_ = topomap_images(data_,interpolation)
+        extent = interpolation.extent
+
+    jobs = [
+        (
+            _file_stem('head',row,recording_names),
+            (data_[row],pos,colorbar_orientation,figsize_,recording_names[row],band_names,
+             min_val,max_val,extent),
+            {}
+        )
+        for row in range(no_rows)
+    ]
+    if output_dir is not None:
+        return _render(_head_figure,jobs,output_dir,formats,n_workers)
+    return [_head_figure(*args) for _,args,_ in jobs]
 
 @suppress_extr_plot
 def covariance_plot(
     data:np.ndarray,ch_names:List[str],
     axes:matplotlib.axes=None,method:str='cov',
     record_name:str=None,
-    vmin:float=None,vmax:float=None):
+    vmin:float=None,vmax:float=None,
+    cov_corr:np.ndarray=None):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
     assert len(ch_names) == data.shape[0]
 
     new_cmap = 'RdBu'
 
-    if method=='cov':
-        cov_corr = np.cov(data)
-    elif method=='corr':
-        cov_corr = np.corrcoef(data)
+    # a matrix precomputed by 'covariance_engine' (e.g. in 'covariance_plots') is drawn as is
+    if cov_corr is None:
+        covariance, correlation = covariance_engine(data)
+        cov_corr = covariance if method=='cov' else correlation
+    if method=='corr':
         vmin = -1
         vmax = 1
         # new_cmap = 'RdBu'
@@ -165,62 +360,93 @@ def covariance_plot(
                 axes.set_title(record_name)
         return
 
+def _covariance_figure(cov_corr:np.ndarray,ch_names:List[str],method:str='cov',
+                       record_name:str=None,vmin:float=None,vmax:float=None)->plt.figure:
+    import matplotlib.pyplot as plt
+
+    fig, ax_ = plt.subplots(1,1,figsize=(10,4))
+    # the matrix stands in for the recording, which is only needed for its number of channels
+    covariance_plot(
+        cov_corr,ch_names,axes=ax_,
+        method=method,record_name=record_name,
+        vmin=vmin,vmax=vmax,cov_corr=cov_corr
+        )
+    return fig
+
 @suppress_extr_plot
 def covariance_plots(
     data:List[np.array],ch_names:List[str],
     no_rows:int,method:str='cov',
-    recording_names:List[str]=None)->plt.figure:
-
+    recording_names:List[str]=None,
+    output_dir:str=None,formats:Union[str,List[str]]=('png',),
+    n_workers:int=None)->Union[List[plt.figure],List[str]]:
     assert no_rows==len(recording_names)
-    figures = []
 
-    min_val = np.min(np.array([np.cov(data_) for data_ in data]))
-    max_val = np.max(np.array([np.cov(data_) for data_ in data]))
+    # every matrix is computed once, as one batched operation, and shared with the figures
+    covariances, correlations = covariance_engine(data)
+    cov_corr = covariances if method=='cov' else correlations
+    min_val = np.min(covariances)
+    max_val = np.max(covariances)
 
-    for row in range(no_rows):
-        fig, ax_ = plt.subplots(1,1,figsize=(10,4))
-        if recording_names is None:
-            covariance_plot(data[row],ch_names,axes=ax_,method=method,vmin=min_val,vmax=max_val)
-        else:
-            covariance_plot(
-                data[row],ch_names,axes=ax_,
-                method=method,record_name=recording_names[row],
-                vmin=min_val,vmax=max_val
-                )
-        figures.append(fig)
-    return figures
-
-@suppress_extr_plot
-def hjorth_plot(hjorth_values,recording_names=None):
-
-    all_values = []
+    jobs = [
+        (
+            _file_stem(method,row,recording_names),
+            (cov_corr[row],ch_names,method,
+             None if recording_names is None else recording_names[row],min_val,max_val),
+            {}
+        )
+        for row in range(no_rows)
+    ]
+    if output_dir is not None:
+        return _render(_covariance_figure,jobs,output_dir,formats,n_workers)
+    return [_covariance_figure(*args) for _,args,_ in jobs]
 
-    for values in hjorth_values:
-        all_values += values.values.flatten().tolist()
+def _hjorth_figure(hjorth_,record_name:str=None)->plt.figure:
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from matplotlib.colors import LinearSegmentedColormap
 
     new_cmap = LinearSegmentedColormap.from_list('white_to_red', viz_globals.white_to_red_color, N=256)
 
-    if isinstance(hjorth_values,list):
+    fig, ax_ = plt.subplots(1,2,figsize=(14,6))
+    sns.heatmap(
+        hjorth_[['mean_activity','mean_mobility','mean_complexity']].T,
+        ax=ax_[0],cmap=new_cmap
+        )
+    sns.heatmap(
+        hjorth_[['std_activity','std_mobility','std_complexity']].T,
+        ax=ax_[1],cmap=new_cmap
+        )
+    if record_name is not None:
+        fig.suptitle(record_name)
+    fig.tight_layout()
+    return fig
 
-        no_rows = len(hjorth_values)
+@suppress_extr_plot
+def hjorth_plot(hjorth_values,recording_names=None,
+                output_dir:str=None,formats:Union[str,List[str]]=('png',),
+                n_workers:int=None)->Union[List[plt.figure],List[str]]:
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from matplotlib.colors import LinearSegmentedColormap
 
-        figures = []
-        for row in range(no_rows):
-            fig, ax_ = plt.subplots(1,2,figsize=(14,6))
-            hjorth_ = hjorth_values[row]
-            sns.heatmap(
-                hjorth_[['mean_activity','mean_mobility','mean_complexity']].T,
-                ax=ax_[0],cmap=new_cmap
-                )
-            sns.heatmap(
-                hjorth_[['std_activity','std_mobility','std_complexity']].T,
-                ax=ax_[1],cmap=new_cmap
-                )
-            if recording_names is not None:
-                fig.suptitle(recording_names[row])
-            fig.tight_layout()
-            figures.append(fig)
+    if isinstance(hjorth_values,list):
+        jobs = [
+            (
+                _file_stem('hjorth',row,recording_names),
+                (hjorth_,None if recording_names is None else recording_names[row]),
+                {}
+            )
+            for row,hjorth_ in enumerate(hjorth_values)
+        ]
+        if output_dir is not None:
+            return _render(_hjorth_figure,jobs,output_dir,formats,n_workers)
+        figures = [_hjorth_figure(*args) for _,args,_ in jobs]
     else:
+        if output_dir is not None:
+            raise ValueError("Inpermissible hjorth_values, batch rendering needs a list")
+        new_cmap = LinearSegmentedColormap.from_list('white_to_red', viz_globals.white_to_red_color, N=256)
+        figures = []
         fig, ax_ = plt.subplots(1,2,figsize=(14,6))
         hjorth_ = hjorth_values[0]
         sns.heatmap(hjorth_.iloc[:][0:3].T,ax=ax_[0],cmap=new_cmap)
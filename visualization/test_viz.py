@@ -0,0 +1,418 @@
+"""
+Visualization Tests
+
+This module contains tests for the figure generators of the visualization package.
+
+Tests:
+    - test_plot_psds: Test that 'plot_psds' draws one figure per recording, from recordings
+    or precomputed spectra.
+    - test_covariance_plots: Test that 'covariance_plots' draws the matrices of np.cov and
+    np.corrcoef.
+    - test_topomap_interpolation: Test the cached interpolation of 'topomap_interpolation'.
+    - test_head_plots: Test that 'head_plots' blits the cached maps of each recording.
+    - test_psd_figure: Test the trace index, visibility, removal and decimation of 'PSDFigure'.
+    - test_unplot_psd_by_name: Test 'find_trace_index' and 'unplot_psd_by_name' on 'plot_psd'
+    traces.
+    - test_batch_rendering: Test that the figure generators write files in batch mode.
+    - test_batch_rendering_names: Test that recordings sharing a file name get distinct files.
+    - test_lazy_imports: Test that importing a figure module does not load plotting libraries.
+    - test_lazy_montage: Test that 'openBCImontage' is built on first access only.
+
+Dependencies:
+    - os
+    - subprocess
+    - sys
+    - pytest
+    - numpy
+    - matplotlib
+    - raw_plots (from .raw_plots)
+    - topomap (from .topomap)
+    - frequency_plots (from .frequency_plots)
+    - plot_globals (from .plot_globals)
+    - time (from features_computation.time)
+    - frequency (from features_computation.frequency)
+
+"""
+
+import os
+import subprocess
+import sys
+import pytest
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from . import plot_globals
+from .raw_plots import plot_psds, head_plots, covariance_plots, hjorth_plot
+from .topomap import topomap_interpolation, topomap_images
+from .frequency_plots import (
+    PSDFigure, create_subplots, plot_psd, find_trace_index, unplot_psd_by_name, _decimate
+)
+from features_computation.time import hjorth_2D
+from features_computation.frequency import compute_psd
+
+def test_plot_psds(sampling_frequency):
+    """
+    Test that 'plot_psds' draws one figure per recording, with one line per OpenBCI channel
+    drawn by a single collection and one legend entry per channel, and that precomputed spectra
+    and other sampling frequencies give the spectra of 'compute_psd'.
+
+    Args:
+        sampling_frequency: The sampling frequency of the EEG data.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the number of figures, lines or legend entries, or the drawn
+        spectra, are unexpected, or if recordings without one row per channel are accepted.
+    """
+    data = [np.random.randn(16,sampling_frequency*10) for _ in range(2)]
+    names = ['first.csv','second.csv']
+    figures = plot_psds(data,1,40,recording_names=names)
+    assert len(figures)==len(data)
+    for fig_ in figures:
+        assert len(fig_.axes[0].collections)==1
+        assert len(fig_.axes[0].collections[0].get_segments())==len(plot_globals.channel_names)
+        assert len(fig_.axes[0].get_legend().get_texts())==len(plot_globals.channel_names)
+
+    for fs_ in (sampling_frequency,250):
+        sig = np.random.randn(16,fs_*10)
+        spectrum, freqs = compute_psd(sig,fs_)
+        keep = (freqs>1) & (freqs<40)
+        for fig_ in (
+                plot_psds([sig],1,40,recording_names=names[:1],sampling_frequency=fs_)[0],
+                plot_psds([spectrum],1,40,recording_names=names[:1],freqs=freqs)[0]
+                ):
+            segments = fig_.axes[0].collections[0].get_segments()
+            assert np.allclose(segments[3][:,0],freqs[keep])
+            assert np.allclose(segments[3][:,1],spectrum[3,keep])
+    with pytest.raises(AssertionError):
+        plot_psds([np.random.randn(8,sampling_frequency*10)],1,40)
+    plt.close('all')
+
+@pytest.mark.parametrize("method_, reference_",[("cov",np.cov),("corr",np.corrcoef)])
+def test_covariance_plots(method_,reference_):
+    """
+    Test that 'covariance_plots' draws one heatmap per recording holding the matrix of np.cov
+    or np.corrcoef, on a color scale shared by all recordings.
+
+    Args:
+        method_ (str): 'cov' or 'corr'.
+        reference_ (Callable): The numpy function computing the expected matrix.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the figures or the matrices they draw are unexpected.
+    """
+    data = [np.random.randn(16,1000)*(row+1) for row in range(2)]
+    figures = covariance_plots(
+        data,plot_globals.channel_names,len(data),method=method_,
+        recording_names=['first.csv','second.csv']
+        )
+    assert len(figures)==len(data)
+    limits = set()
+    for fig_,data_ in zip(figures,data):
+        mesh = fig_.axes[0].collections[0]
+        assert np.allclose(np.asarray(mesh.get_array()).reshape(16,16),reference_(data_))
+        limits.add(mesh.get_clim())
+    assert len(limits)==1
+    plt.close('all')
+
+def test_topomap_interpolation():
+    """
+    Test that the interpolation of a montage is built once per resolution, reproduces a
+    constant field, passes through the sensor values, and leaves the pixels outside the head
+    empty.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the interpolation is rebuilt or the maps are unexpected.
+    """
+    pos = plot_globals.openBCIcoordsArray[:,:2]
+    interpolation = topomap_interpolation(pos,32)
+    assert topomap_interpolation(pos.copy(),32) is interpolation
+    assert topomap_interpolation(pos,64) is not interpolation
+    assert interpolation.matrix.shape == (interpolation.inside.sum(),len(pos))
+    assert np.allclose(interpolation.matrix.sum(axis=1),1,atol=1e-6)
+
+    values = np.random.rand(3,2,len(pos))
+    images = topomap_images(values,interpolation)
+    assert images.shape == (3,2,32,32)
+    assert np.isnan(images[...,~interpolation.inside]).all()
+    assert np.allclose(images[...,interpolation.inside],values@interpolation.matrix.T)
+
+    # a map of a single sensor peaks closer to that sensor than to any other
+    fine = topomap_interpolation(pos,201)
+    axis = np.linspace(fine.extent[0],fine.extent[1],201)
+    images = topomap_images(np.eye(len(pos)),fine)
+    for sensor,image in enumerate(images):
+        row, column = np.unravel_index(np.nanargmax(image),image.shape)
+        assert np.argmin(np.hypot(axis[column]-pos[:,0],axis[row]-pos[:,1])) == sensor
+    with pytest.raises(ValueError):
+        topomap_interpolation(pos[:3])
+
+@pytest.mark.parametrize("renderer_",["cached","mne"])
+def test_head_plots(renderer_):
+    """
+    Test that 'head_plots' draws one figure per recording, blitting every band of the cached
+    renderer into a single image with one colorbar, or drawing one mne topomap per band.
+
+    Args:
+        renderer_ (str): The topomap renderer.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the figures or their images are unexpected.
+    """
+    powers = np.random.rand(2,3,16)
+    figures = head_plots(
+        powers,plot_globals.openBCIcoordsArray[:,:2],2,3,axis=0,
+        recording_names=['first.csv','second.csv'],band_names=['alpha','beta','gamma'],
+        renderer=renderer_,resolution=32
+        )
+    assert len(figures)==2
+    for fig_ in figures:
+        images = [image for ax_ in fig_.axes for image in ax_.images]
+        if renderer_=='cached':
+            assert len(fig_.axes)==2 and len(images)==1
+            assert images[0].get_array().shape[0]==32
+        else:
+            assert len(images)==3
+        assert all(image.get_clim()==(powers.min(),powers.max()) for image in images)
+    with pytest.raises(ValueError):
+        head_plots(
+            powers,plot_globals.openBCIcoordsArray[:,:2],2,3,axis=0,
+            recording_names=['first.csv','second.csv'],band_names=['alpha','beta','gamma'],
+            renderer='vtk'
+            )
+    plt.close('all')
+
+def test_psd_figure():
+    """
+    Test that 'PSDFigure' adds WebGL traces in batches across subplots, finds, hides and
+    removes them by name, reuses the slots of removed traces, and decimates the spectra to the
+    viewport, or to every frequency once the range is cleared, while keeping their extrema,
+    even for spectra with missing values.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If a trace is misplaced, if the decimated spectra are unexpected, or if
+        fewer than 2 points per trace are accepted.
+    """
+    freqs = np.linspace(0,62.5,4097)
+    psds = np.random.randn(3,16,4097)
+    names = [[f'rec{row}/{ch_name}' for ch_name in plot_globals.channel_names] for row in range(3)]
+    figure = PSDFigure(2,1,db_limit=(-5,5),freqs_limit=(1,40),figsize_=(400,None))
+    for row in range(3):
+        figure.add_psds(psds[row],freqs,names[row],row=1+row%2,ch_names=plot_globals.channel_names)
+    assert len(figure)==len(figure.figure.data)==48
+    for row in range(3):
+        for column,name in enumerate(names[row]):
+            trace = figure.figure.data[figure.trace_index(name)]
+            assert trace.type=='scattergl' and trace.name==name
+            assert trace.yaxis==('y' if row%2==0 else 'y2')
+            assert len(trace.x)<=figure.max_points==800
+            assert trace.x[0]<1.5 and trace.x[-1]>39.5
+            visible = (freqs>=trace.x[0]) & (freqs<=trace.x[-1])
+            assert np.isclose(np.max(trace.y),psds[row,column,visible].max())
+            assert np.isclose(np.min(trace.y),psds[row,column,visible].min())
+
+    figure.hide(names[0][:2])
+    assert [figure.figure.data[figure.trace_index(name)].visible for name in names[0][:3]] == [False,False,True]
+    figure.show(names[0][0])
+    assert figure.figure.data[figure.trace_index(names[0][0])].visible
+    figure.remove(names[1])
+    assert len(figure)==32 and names[1][0] not in figure
+    figure.add_psds(psds[1,:2],freqs,['new/Fp1','new/Fp2'],row=2,ch_names=['Fp1','Fp2'])
+    assert len(figure.figure.data)==48 and figure.figure.data[figure.trace_index('new/Fp1')].yaxis=='y2'
+    figure.compact()
+    assert len(figure.figure.data)==34
+    assert all(figure.figure.data[figure.trace_index(name)].name==name for name in figure.names)
+
+    figure.set_freqs_limit((8,12))
+    trace = figure.figure.data[figure.trace_index(names[2][0])]
+    assert np.allclose(trace.x,freqs[(freqs>=trace.x[0]) & (freqs<=trace.x[-1])])
+    assert trace.x[0]<8 and trace.x[-1]>12
+    figure.set_freqs_limit(None)
+    trace = figure.figure.data[figure.trace_index(names[2][0])]
+    assert trace.x[0]<1 and trace.x[-1]>62 and len(trace.x)<=figure.max_points
+    assert figure.figure.layout.xaxis.range is None
+    with pytest.raises(ValueError):
+        figure.add_psds(psds[2,:1],freqs,[names[2][0]])
+
+    dead = psds[0,:2].copy()
+    dead[0] = np.nan
+    dead[1,100:300] = np.nan
+    figure.add_psds(dead,freqs,['dead/Fp1','dead/Fp2'],ch_names=['Fp1','Fp2'])
+    assert np.isnan(figure.figure.data[figure.trace_index('dead/Fp1')].y).all()
+    trace = figure.figure.data[figure.trace_index('dead/Fp2')]
+    assert np.isclose(np.nanmax(trace.y),np.nanmax(dead[1]))
+
+    with pytest.raises(ValueError):
+        PSDFigure(max_points=1)
+    with pytest.raises(ValueError):
+        _decimate(freqs,psds[0],max_points=1)
+
+def test_unplot_psd_by_name():
+    """
+    Test that 'find_trace_index' finds the traces added by 'plot_psd', and that
+    'unplot_psd_by_name' removes them.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If a trace is not found or not removed.
+    """
+    freqs = np.linspace(0,62.5,100)
+    fig_ = create_subplots(1,1)
+    for ch_name in plot_globals.channel_names[:3]:
+        plot_psd(np.random.randn(100),freqs,1,1,fig_,ch_name,freqs_limit=(1,40))
+    assert find_trace_index(fig_,plot_globals.channel_names[1])==1
+    assert unplot_psd_by_name(fig_,plot_globals.channel_names[1])
+    assert [trace.name for trace in fig_.data]==[plot_globals.channel_names[0],plot_globals.channel_names[2]]
+    assert find_trace_index(fig_,plot_globals.channel_names[1]) is None
+    assert not unplot_psd_by_name(fig_,plot_globals.channel_names[1])
+
+@pytest.mark.parametrize("n_workers_",[1,2])
+def test_batch_rendering(sampling_frequency,tmp_path,n_workers_):
+    """
+    Test that, given an output directory, 'plot_psds', 'head_plots', 'covariance_plots' and
+    'hjorth_plot' save one file per recording and format, return their paths in the order of
+    the recordings, and leave no figure open.
+
+    Args:
+        sampling_frequency: The sampling frequency of the EEG data.
+        tmp_path: Temporary directory provided by pytest.
+        n_workers_ (int): The number of rendering processes.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If a file is missing or empty, or if a figure is left open.
+    """
+    names = ['first.csv','second.csv','third.csv']
+    data = [np.random.randn(16,sampling_frequency*10) for _ in names]
+    powers = np.random.rand(len(names),2,16)
+    hjorth_values = [hjorth_2D(data_,10,plot_globals.channel_names) for data_ in data]
+    plt.close('all')
+
+    paths = {
+        'psd':plot_psds(
+            data,1,40,recording_names=names,output_dir=tmp_path,formats=['png','svg'],
+            n_workers=n_workers_
+            ),
+        'head':head_plots(
+            powers,plot_globals.openBCIcoordsArray[:,:2],len(names),2,axis=0,
+            recording_names=names,band_names=['alpha','beta'],output_dir=tmp_path,
+            formats=['png','svg'],n_workers=n_workers_
+            ),
+        'corr':covariance_plots(
+            data,plot_globals.channel_names,len(names),method='corr',recording_names=names,
+            output_dir=tmp_path,formats=['png','svg'],n_workers=n_workers_
+            ),
+        'hjorth':hjorth_plot(
+            hjorth_values,names,output_dir=tmp_path,formats=['png','svg'],n_workers=n_workers_
+            ),
+    }
+    for prefix,paths_ in paths.items():
+        assert paths_ == [
+            os.path.join(tmp_path,f'{prefix}_{name[:-4]}.{format_}')
+            for name in names for format_ in ('png','svg')
+            ]
+        for path in paths_:
+            assert os.path.getsize(path)>0
+    assert plt.get_fignums() == []
+    with pytest.raises(ValueError):
+        plot_psds(data,1,40,recording_names=names,output_dir=tmp_path,formats='bmp')
+
+def test_batch_rendering_names(sampling_frequency,tmp_path):
+    """
+    Test that, in batch mode, recordings sharing a file name in different directories are
+    saved to distinct files.
+
+    Args:
+        sampling_frequency: The sampling frequency of the EEG data.
+        tmp_path: Temporary directory provided by pytest.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If two recordings are saved to the same file.
+    """
+    names = ['sub-01/night.edf','sub-02/night.edf','sub-02/day.edf']
+    data = [np.random.randn(16,sampling_frequency*10) for _ in names]
+    paths = plot_psds(data,1,40,recording_names=names,output_dir=tmp_path,n_workers=1)
+    assert paths == [
+        os.path.join(tmp_path,'psd_night_0.png'),
+        os.path.join(tmp_path,'psd_night_1.png'),
+        os.path.join(tmp_path,'psd_day.png'),
+        ]
+    assert all(os.path.getsize(path)>0 for path in paths)
+
+def _fresh_interpreter(probe:str)->str:
+    """
+    Run a probe in a fresh interpreter from the repository root and return its output.
+    """
+    return subprocess.run(
+        [sys.executable,'-c',probe],cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True,text=True,check=True
+        ).stdout.strip()
+
+@pytest.mark.parametrize(
+        "module_, heavy_",
+        [
+            ("visualization.raw_plots",["matplotlib","seaborn","mne","pandas","neurodsp"]),
+            ("visualization.montage",["matplotlib","mne"]),
+            ("visualization.frequency_plots",["plotly"]),
+        ]
+        )
+def test_lazy_imports(module_,heavy_):
+    """
+    Test that importing a figure module in a fresh interpreter does not load the plotting
+    libraries, which are only needed once a figure is drawn.
+
+    Args:
+        module_ (str): The dotted module name.
+        heavy_ (List[str]): The modules that must not be loaded on import.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If a heavy dependency is loaded on import.
+    """
+    loaded = _fresh_interpreter(
+        f"import sys, {module_}; print(','.join(name for name in {heavy_!r} if name in sys.modules))"
+        )
+    assert loaded == ''
+
+def test_lazy_montage():
+    """
+    Test that 'openBCImontage' is only built, and mne only loaded, when the attribute is first
+    accessed, and that the built montage is cached on the module.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: If the montage is built on import or rebuilt on later accesses.
+    """
+    output = _fresh_interpreter(
+        "import sys; from visualization import montage; "
+        "print('mne' in sys.modules, 'openBCImontage' in vars(montage)); "
+        "first = montage.openBCImontage; "
+        "print('mne' in sys.modules, montage.openBCImontage is first, len(first.ch_names))"
+        )
+    assert output.splitlines() == ['False False','True True 16']
@@ -0,0 +1,184 @@
+"""
+Topomap Interpolation Module
+
+This module renders scalp topographies without rebuilding the interpolation for every map.
+Interpolating sensor values onto a pixel grid with the Clough-Tocher scheme used by
+mne.viz.plot_topomap is linear in the values, so it is written once per montage and
+resolution as a matrix from sensors to the pixels inside the head. Every map is then a
+matrix-vector product, and the maps of a whole cohort grid a single matrix product.
+
+The interpolation follows the 'head' extrapolation of MNE: extra points are placed on a
+circle just outside the head, each taking the mean value of its neighbouring sensors, so the
+map reaches the head outline.
+
+Functions:
+    - topomap_interpolation: Return the cached interpolation of a montage at a resolution.
+    - topomap_images: Interpolate the values of many maps at once.
+    - head_outline: Return the coordinates of the head, nose and ears outlines.
+
+Classes:
+    - TopomapInterpolation: The interpolation of a montage onto a pixel grid.
+
+Dependencies:
+    - numpy
+    - scipy (imported when an interpolation is first built)
+
+Typical usage example:
+
+    from custom_module import topomap_interpolation, topomap_images
+
+    interpolation = topomap_interpolation(plot_globals.openBCIcoordsArray[:, :2], 64)
+    images = topomap_images(powers, interpolation)  # shape (..., 64, 64)
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+from typing import List, Tuple, Union
+import numpy as np
+
+TopomapInterpolation = namedtuple('TopomapInterpolation',['matrix','inside','extent'])
+TopomapInterpolation.__doc__ = """
+    The interpolation of a montage onto a pixel grid.
+
+    Attributes:
+        matrix (np.ndarray): Array of shape (n_inside, n_sensors) mapping the sensor values to
+        the pixels inside the head.
+        inside (np.ndarray): Boolean array of shape (resolution, resolution), True for the
+        pixels inside the head, in row-major order with the first row at the bottom.
+        extent (Tuple[float]): The (left, right, bottom, top) limits of the grid, as expected by
+        matplotlib's imshow.
+"""
+
+@lru_cache(maxsize=16)
+def _interpolation(
+        pos_key:Tuple[Tuple[float,float],...],resolution:int,head_radius:float
+        )->TopomapInterpolation:
+    from scipy.interpolate import CloughTocher2DInterpolator
+    from scipy.spatial import Delaunay
+
+    pos = np.array(pos_key)
+    n_sensors = pos.shape[0]
+
+    # median distance between neighbouring sensors, as in MNE
+    tri = Delaunay(pos,incremental=True)
+    idx1, idx2, idx3 = tri.simplices.T
+    distance = np.median(np.concatenate([
+        np.linalg.norm(pos[idx1]-pos[idx2],axis=1),np.linalg.norm(pos[idx2]-pos[idx3],axis=1)
+        ]))
+    angle = np.arcsin(min(distance/head_radius,1))
+    n_extra = max(12,int(np.round(2*np.pi/angle)))
+    angles = np.linspace(0,2*np.pi,n_extra,endpoint=False)
+    extra = (head_radius*1.1+distance)*np.stack([np.cos(angles),np.sin(angles)],axis=1)
+    # added to the triangulation of the sensors, which is not unique for symmetric montages
+    tri.add_points(extra)
+
+    # each extra point takes the mean of its neighbouring sensors, or the mean of the extra
+    # points that have such neighbours
+    border = np.zeros((n_extra,n_sensors))
+    indptr, indices = tri.vertex_neighbor_vertices
+    for extra_index in range(n_extra):
+        neighbours = indices[indptr[n_sensors+extra_index]:indptr[n_sensors+extra_index+1]]
+        neighbours = neighbours[neighbours<n_sensors]
+        if len(neighbours)>0:
+            border[extra_index,neighbours] = 1/len(neighbours)
+    used = border.any(axis=1)
+    border[~used] = border[used].mean(axis=0)
+
+    # the grid reaches slightly beyond the outermost sensor when it lies on the head outline
+    clip_radius = head_radius*max(1.0,np.linalg.norm(pos,axis=1).max()*1.01/head_radius)
+    axis = np.linspace(-clip_radius,clip_radius,resolution)
+    grid_x, grid_y = np.meshgrid(axis,axis)
+    inside = grid_x**2+grid_y**2<=clip_radius**2
+    pixels = np.stack([grid_x[inside],grid_y[inside]],axis=1)
+
+    # interpolating the identity gives the weight of every point in every pixel
+    weights = CloughTocher2DInterpolator(tri,np.eye(n_sensors+n_extra))(pixels)
+    matrix = weights[:,:n_sensors]+weights[:,n_sensors:]@border
+    matrix.setflags(write=False)
+    inside.setflags(write=False)
+    return TopomapInterpolation(
+        matrix,inside,(-clip_radius,clip_radius,-clip_radius,clip_radius)
+        )
+
+def topomap_interpolation(
+        pos:Union[np.ndarray,List],resolution:int=64,head_radius:float=0.095
+        )->TopomapInterpolation:
+    """
+    Return the interpolation of a montage onto a square pixel grid covering the head.
+
+    The interpolation is built on the first call for a montage, resolution and head radius,
+    and returned from a cache afterwards.
+
+    Args:
+        pos (Union[np.ndarray, List]): The 2D positions of the sensors, of shape (n_sensors, 2),
+        in the head coordinates of MNE (meters, origin at the center of the head).
+        resolution (int, optional): The number of pixels along each side. Default is 64, as in
+        mne.viz.plot_topomap.
+        head_radius (float, optional): The radius of the head. Default is 0.095, as in MNE.
+
+    Returns:
+        TopomapInterpolation: The interpolation matrix, the mask of the pixels inside the head
+        and the extent of the grid.
+
+    Raises:
+        ValueError: If the positions are not 2D or there are fewer than 4 sensors.
+
+    Example:
+        >>> from custom_module import topomap_interpolation
+        >>> interpolation = topomap_interpolation(plot_globals.openBCIcoordsArray[:, :2])
+        >>> interpolation.matrix.shape  # (3209, 16)
+    """
+    pos = np.asarray(pos,dtype=float)
+    if pos.ndim!=2 or pos.shape[1]!=2 or pos.shape[0]<4:
+        raise ValueError(f"Inpermissible positions, of shape {pos.shape}")
+    return _interpolation(tuple(map(tuple,pos.tolist())),int(resolution),float(head_radius))
+
+def topomap_images(
+        values:Union[np.ndarray,List],interpolation:TopomapInterpolation
+        )->np.ndarray:
+    """
+    Interpolate the sensor values of any number of maps onto the pixel grid at once.
+
+    Args:
+        values (Union[np.ndarray, List]): Sensor values of shape (..., n_sensors).
+        interpolation (TopomapInterpolation): The interpolation of the montage, as returned by
+        'topomap_interpolation'.
+
+    Returns:
+        np.ndarray: Array of shape (..., resolution, resolution) holding the maps, with NaN
+        outside the head.
+
+    Example:
+        >>> from custom_module import topomap_interpolation, topomap_images
+        >>> interpolation = topomap_interpolation(plot_globals.openBCIcoordsArray[:, :2])
+        >>> powers = np.random.rand(20, 5, 16)  # recordings x bands x channels
+        >>> topomap_images(powers, interpolation).shape  # (20, 5, 64, 64)
+    """
+    values = np.asarray(values,dtype=float)
+    images = np.full(values.shape[:-1]+interpolation.inside.shape,np.nan)
+    images[...,interpolation.inside] = values@interpolation.matrix.T
+    return images
+
+@lru_cache(maxsize=4)
+def head_outline(head_radius:float=0.095)->Tuple[np.ndarray,np.ndarray,np.ndarray,np.ndarray]:
+    """
+    Return the coordinates of the head, nose and ears outlines, as drawn by MNE.
+
+    Args:
+        head_radius (float, optional): The radius of the head. Default is 0.095.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: The head, the nose, the left
+        ear and the right ear, each of shape (n_points, 2).
+    """
+    angles = np.linspace(0,2*np.pi,101)
+    head = head_radius*np.stack([np.cos(angles),np.sin(angles)],axis=1)
+    nose_x, nose_y = np.cos(np.arccos(np.deg2rad(12))), np.sin(np.arccos(np.deg2rad(12)))
+    nose = head_radius*np.array([[-nose_x,nose_y],[0,1.15],[nose_x,nose_y]])
+    ear_x = np.array([0.497,0.510,0.518,0.5299,0.5419,0.54,0.547,0.532,0.510,0.489])
+    ear_y = np.array([0.0555,0.0775,0.0783,0.0746,0.0555,-0.0055,-0.0932,-0.1313,-0.1384,-0.1199])
+    right_ear = head_radius*2*np.stack([ear_x,ear_y],axis=1)
+    left_ear = right_ear*[-1,1]
+    for outline in (head,nose,left_ear,right_ear):
+        outline.setflags(write=False)
+    return head, nose, left_ear, right_ear